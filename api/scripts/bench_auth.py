@@ -0,0 +1,88 @@
+"""Per-request auth overhead: full Auth0 SDK verification vs. the verified-token cache.
+
+Signs a token with a throwaway RSA key and serves discovery/JWKS from memory, so it runs offline.
+Usage: python scripts/bench_auth.py [--iterations N]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+from auth0_api_python.api_client import ApiClient, ApiClientOptions
+from authlib.jose import JsonWebKey, JsonWebToken
+
+from src.auth.token_cache import VerifiedTokenCache
+
+DOMAIN = "bench.example.com"
+AUDIENCE = "https://bench.example.com/api"
+
+
+def _signed_token() -> tuple[str, dict]:
+    key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+    key_dict = key.as_dict(is_private=True)
+    key_dict["kid"] = "bench"
+    now = int(time.time())
+    token = JsonWebToken(["RS256"]).encode(
+        {"alg": "RS256", "kid": "bench"},
+        {"iss": f"https://{DOMAIN}/", "aud": AUDIENCE, "sub": "auth0|bench", "iat": now, "exp": now + 3600},
+        key_dict,
+    )
+    public = key.as_dict(is_private=False)
+    public.update(kid="bench", alg="RS256", use="sig")
+    return token.decode("ascii"), {"keys": [public]}
+
+
+def _timed(label: str, iterations: int, run) -> float:
+    started = time.perf_counter()
+    asyncio.run(run())
+    per_request_us = (time.perf_counter() - started) / iterations * 1e6
+    print(f"{label:<28} {per_request_us:10.1f} us/request")
+    return per_request_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    token, jwks = _signed_token()
+    documents = {
+        f"https://{DOMAIN}/.well-known/openid-configuration": {
+            "issuer": f"https://{DOMAIN}/",
+            "jwks_uri": f"https://{DOMAIN}/.well-known/jwks.json",
+        },
+        f"https://{DOMAIN}/.well-known/jwks.json": jwks,
+    }
+
+    async def fetch(url: str) -> dict:
+        return documents[url]
+
+    client = ApiClient(ApiClientOptions(domain=DOMAIN, audience=AUDIENCE, custom_fetch=fetch))
+    headers = {"authorization": f"Bearer {token}"}
+    cache = VerifiedTokenCache(max_entries=1000, max_ttl_seconds=300)
+
+    async def verify_every_time() -> None:
+        for _ in range(args.iterations):
+            await client.verify_request(headers=headers, http_method="GET", http_url="https://api.test/")
+
+    async def verify_with_cache() -> None:
+        for _ in range(args.iterations):
+            claims = cache.get(headers["authorization"])
+            if claims is None:
+                claims = await client.verify_request(headers=headers, http_method="GET", http_url="https://api.test/")
+                cache.put(headers["authorization"], claims)
+
+    before = _timed("SDK verification", args.iterations, verify_every_time)
+    after = _timed("verified-token cache", args.iterations, verify_with_cache)
+    print(f"speedup: {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
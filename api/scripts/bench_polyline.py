@@ -0,0 +1,95 @@
+"""Benchmark the shared polyline decoder on long synthetic transit legs.
+
+Usage (from api/):
+    python scripts/bench_polyline.py --points 5000 --repeat 200
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+from src.routing.polyline import decode_polyline, decode_polyline_array, encode_polyline, np
+
+
+def _legacy_decode(encoded: str) -> list[tuple[float, float]]:
+    # The char-by-char decoder routing/service.py and the seed scripts used to carry.
+    coordinates: list[tuple[float, float]] = []
+    index = 0
+    lat = 0
+    lng = 0
+    length = len(encoded)
+    while index < length:
+        shift = 0
+        result = 0
+        while True:
+            value = ord(encoded[index]) - 63
+            index += 1
+            result |= (value & 0x1F) << shift
+            shift += 5
+            if value < 0x20:
+                break
+        lat += ~(result >> 1) if (result & 1) else (result >> 1)
+        shift = 0
+        result = 0
+        while True:
+            value = ord(encoded[index]) - 63
+            index += 1
+            result |= (value & 0x1F) << shift
+            shift += 5
+            if value < 0x20:
+                break
+        lng += ~(result >> 1) if (result & 1) else (result >> 1)
+        coordinates.append((lat / 1e5, lng / 1e5))
+    return coordinates
+
+
+def _synthetic_leg(points: int, seed: int) -> list[tuple[float, float]]:
+    rng = random.Random(seed)
+    lat, lng = 42.3601, -71.0589
+    coordinates = []
+    for _ in range(points):
+        lat += rng.uniform(-0.002, 0.002)
+        lng += rng.uniform(-0.002, 0.002)
+        coordinates.append((round(lat, 5), round(lng, 5)))
+    return coordinates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=5000, help="Points per leg.")
+    parser.add_argument("--repeat", type=int, default=200, help="Decodes per timing.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    encoded = encode_polyline(_synthetic_leg(args.points, args.seed))
+    assert decode_polyline(encoded) == _legacy_decode(encoded)
+
+    candidates = {
+        "legacy char loop": lambda: _legacy_decode(encoded),
+        "decode_polyline": lambda: decode_polyline(encoded),
+        "decode_polyline (bytes in)": (lambda data=encoded.encode("ascii"): decode_polyline(data)),
+    }
+    if np is not None:
+        candidates["decode_polyline_array"] = lambda: decode_polyline_array(encoded)
+    coordinates = decode_polyline(encoded)
+    candidates["encode_polyline"] = lambda: encode_polyline(coordinates)
+
+    print(f"{args.points} points, {len(encoded)} chars, {args.repeat} runs each")
+    baseline = None
+    for name, func in candidates.items():
+        seconds = min(timeit.repeat(func, number=args.repeat, repeat=3)) / args.repeat
+        baseline = baseline or seconds
+        print(f"  {name:<28} {seconds * 1e3:8.3f} ms/leg  {baseline / seconds:5.2f}x vs legacy")
+    if np is None:
+        print("  (numpy not installed; decode_polyline_array skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Build the local walking graph from the bundled OSM extract.
+
+Needs the optional pyosmium package (`pip install osmium`) and the real extract
+(`git lfs pull` for otp/mass.osm.pbf). The API loads the result at startup when
+WALK_ROUTER_MODE is "fallback" or "prefer".
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+from src.config import settings
+from src.routing.walk_graph import build_walk_graph_from_pbf
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the local walking graph from an OSM extract")
+    parser.add_argument("--source", type=Path, default=settings.OSM_EXTRACT_PATH, help="OSM .pbf/.osm file")
+    parser.add_argument("--output", type=Path, default=settings.WALK_GRAPH_PATH, help="Graph cache file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = build_walk_graph_from_pbf(args.source)
+    graph.save(args.output)
+    elapsed = time.perf_counter() - started
+    size_mb = args.output.stat().st_size / 1_000_000
+    print(f"walk graph: {graph.node_count} nodes, {graph.edge_count} edges, {size_mb:.1f} MB in {elapsed:.0f}s")
+    print(f"written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Delete users and all data that references them, e.g. for a batch of GDPR erasure requests.
+
+Reads Auth0 ids, one per line, from a file (or stdin with "-"). Auth0 identities are queued in
+pending_auth0_deletions and removed by the API's deletion worker (at its next startup if needed).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+from src.db.mongodb import close_db, init_db
+from src.users.auth0_management import stop_auth0_deletion_worker
+from src.users.service import delete_users_bulk
+
+
+async def _run(auth0_ids: list[str], batch_size: int) -> int:
+    await init_db()
+    try:
+        return await delete_users_bulk(auth0_ids, batch_size=batch_size)
+    finally:
+        # Unfinished Auth0 deletions stay recorded for the API to pick up.
+        await stop_auth0_deletion_worker()
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-delete users by Auth0 id")
+    parser.add_argument("ids_file", help="File with one Auth0 id per line, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=500, help="Users per cascade transaction")
+    args = parser.parse_args()
+
+    handle = sys.stdin if args.ids_file == "-" else open(args.ids_file, encoding="utf-8")
+    with handle:
+        auth0_ids = [line.strip() for line in handle if line.strip()]
+    deleted = asyncio.run(_run(auth0_ids, args.batch_size))
+    print(f"users deleted: {deleted} of {len(auth0_ids)} requested")
+
+
+if __name__ == "__main__":
+    main()
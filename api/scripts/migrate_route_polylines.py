@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import bson
+import pymongo
+from pymongo import MongoClient, UpdateOne
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+from src.routing.geometry import legacy_route_segments, segments_for_storage
+
+
+class MigrationSettings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=(".env", "api/.env"),
+        env_file_encoding="utf-8",
+        extra="ignore",
+    )
+    MONGO_URI: str
+
+
+LEGACY_FILTER = {
+    "$or": [
+        {"route_coordinates": {"$exists": True}},
+        {"route_segments.coordinates": {"$exists": True}},
+    ]
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rewrite commute route geometry from coordinate arrays to encoded polylines"
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    parser.add_argument("--dry-run", action="store_true", help="Report savings without writing")
+    args = parser.parse_args()
+
+    settings = MigrationSettings()
+    client = MongoClient(settings.MONGO_URI, server_api=pymongo.server_api.ServerApi(version="1"))
+    commutes = client.get_database("commutebuddy").commutes
+
+    migrated = 0
+    bytes_before = 0
+    bytes_after = 0
+    operations: list[UpdateOne] = []
+
+    def flush() -> None:
+        if operations and not args.dry_run:
+            commutes.bulk_write(operations, ordered=False)
+        operations.clear()
+
+    for document in commutes.find(LEGACY_FILTER):
+        # Routes stored only as the flat array become a single segment.
+        route_segments = segments_for_storage(
+            document.get("route_segments")
+            or legacy_route_segments(document.get("transport_mode"), document.get("route_coordinates") or [])
+        )
+        migrated_document = {key: value for key, value in document.items() if key != "route_coordinates"}
+        migrated_document["route_segments"] = route_segments
+        bytes_before += len(bson.encode(document))
+        bytes_after += len(bson.encode(migrated_document))
+        operations.append(
+            UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"route_segments": route_segments}, "$unset": {"route_coordinates": ""}},
+            )
+        )
+        migrated += 1
+        if len(operations) >= max(1, args.batch_size):
+            flush()
+    flush()
+    client.close()
+
+    action = "would migrate" if args.dry_run else "migrated"
+    print(f"commutes {action}: {migrated}")
+    if migrated:
+        saved = 100 * (1 - bytes_after / bytes_before)
+        print(f"document bytes: {bytes_before} -> {bytes_after} ({saved:.1f}% smaller)")
+
+
+if __name__ == "__main__":
+    main()
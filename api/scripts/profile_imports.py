@@ -0,0 +1,76 @@
+"""Import-time profile of the API, as a cold-start regression check.
+
+Runs `python -X importtime -c "import src.main"` in a fresh interpreter and prints the slowest
+imports. Fails if the total exceeds --max-ms or if a module meant to load lazily was imported.
+Usage: python scripts/profile_imports.py [--top N] [--max-ms MS] [--forbid MODULE ...]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parents[1]
+
+# Loaded on first use; importing them from src.main is a cold-start regression.
+LAZY_MODULES = ("google.genai", "auth0.management", "auth0.authentication", "yaml")
+
+
+def _profile(module: str) -> list[tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every import, in import order."""
+    env = dict(os.environ)
+    # Settings refuse to load without these; the values are never used.
+    env.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    env.setdefault("GEMINI_API_KEY", "profile")
+    env.setdefault("DEV_AUTH_BYPASS", "true")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=API_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the total import time is higher")
+    parser.add_argument("--forbid", nargs="*", default=list(LAZY_MODULES), help="modules that must not be imported")
+    args = parser.parse_args()
+
+    rows = _profile(args.module)
+    total_ms = next((cumulative for name, _, cumulative in rows if name == args.module), 0) / 1000
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[: args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+    print(f"\nimport {args.module}: {total_ms:.1f} ms")
+
+    failures = []
+    imported = {name for name, _, _ in rows}
+    for module in args.forbid:
+        if module in imported:
+            failures.append(f"{module} is imported at startup")
+    if args.max_ms is not None and total_ms > args.max_ms:
+        failures.append(f"import took {total_ms:.1f} ms, budget is {args.max_ms:.1f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import itertools
+import math
+import random
 import re
 import sys
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import pymongo
 from pymongo import MongoClient, UpdateOne
@@ -15,7 +19,9 @@ API_DIR = Path(__file__).resolve().parents[1]
 if str(API_DIR) not in sys.path:
     sys.path.insert(0, str(API_DIR))
 
-from src.routing.otp_client import OtpClient, OtpClientError
+from src.routing.otp_client import OtpClient, OtpClientError, create_otp_http_client
+from src.routing.geometry import segments_for_storage
+from src.routing.polyline import decode_polyline
 
 
 class SeedSettings(BaseSettings):
@@ -35,42 +41,6 @@ def _m(hour: int, minute: int) -> int:
     return (hour * 60) + minute
 
 
-def _decode_polyline(encoded: str) -> list[tuple[float, float]]:
-    coordinates: list[tuple[float, float]] = []
-    index = 0
-    lat = 0
-    lng = 0
-
-    while index < len(encoded):
-        shift = 0
-        result = 0
-        while True:
-            value = ord(encoded[index]) - 63
-            index += 1
-            result |= (value & 0x1F) << shift
-            shift += 5
-            if value < 0x20:
-                break
-        delta_lat = ~(result >> 1) if (result & 1) else (result >> 1)
-        lat += delta_lat
-
-        shift = 0
-        result = 0
-        while True:
-            value = ord(encoded[index]) - 63
-            index += 1
-            result |= (value & 0x1F) << shift
-            shift += 5
-            if value < 0x20:
-                break
-        delta_lng = ~(result >> 1) if (result & 1) else (result >> 1)
-        lng += delta_lng
-
-        coordinates.append((lat / 1e5, lng / 1e5))
-
-    return coordinates
-
-
 def _build_departure_iso(start_minute: int) -> str:
     now = datetime.now().astimezone()
     hour, minute = divmod(start_minute, 60)
@@ -141,7 +111,7 @@ def _normalize_otp_plan(plan_data: dict) -> tuple[list[dict], list[tuple[float,
         encoded = geometry.get("points") if isinstance(geometry, dict) else None
         if not isinstance(encoded, str) or not encoded:
             continue
-        coordinates = _decode_polyline(encoded)
+        coordinates = decode_polyline(encoded)
         if len(coordinates) < 2:
             continue
 
@@ -207,6 +177,96 @@ async def _fetch_route_from_otp(
     return _normalize_otp_plan(response_data)
 
 
+Route = tuple[list[dict], list[tuple[float, float]], int]
+RouteKey = tuple[float, float, float, float, int, str]
+
+METERS_PER_DEGREE_LAT = 111_320.0
+FILLER_ID_PREFIX = "auth0|demo_filler_"
+
+
+def _route_key(spec: dict) -> RouteKey:
+    return (
+        round(spec["start"][0], 6),
+        round(spec["start"][1], 6),
+        round(spec["end"][0], 6),
+        round(spec["end"][1], 6),
+        int(spec["start_minute"]),
+        str(spec["transport_mode"]),
+    )
+
+
+async def _fetch_routes(
+    *,
+    settings: SeedSettings,
+    route_keys: Iterable[RouteKey],
+    concurrency: int,
+) -> dict[RouteKey, Route]:
+    """Fetch each distinct spec route once, at most `concurrency` OTP calls at a time."""
+    keys = list(dict.fromkeys(route_keys))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with create_otp_http_client(
+        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+        connect_timeout_seconds=min(5.0, settings.OTP_TIMEOUT_SECONDS),
+        max_connections=max(1, concurrency),
+        max_keepalive_connections=max(1, concurrency),
+        keepalive_expiry_seconds=30.0,
+    ) as http_client:
+        otp_client = OtpClient(
+            base_url=settings.OTP_BASE_URL,
+            graphql_path=settings.OTP_GRAPHQL_PATH,
+            timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+            http_client=http_client,
+        )
+
+        async def fetch(key: RouteKey) -> Route:
+            async with semaphore:
+                return await _fetch_route_from_otp(
+                    otp_client=otp_client,
+                    start=(key[0], key[1]),
+                    end=(key[2], key[3]),
+                    start_minute=key[4],
+                    transport_mode=key[5],
+                )
+
+        routes = await asyncio.gather(*(fetch(key) for key in keys))
+    return dict(zip(keys, routes))
+
+
+def _jitter_offset(rng: random.Random, lat: float, jitter_meters: float) -> tuple[float, float]:
+    if jitter_meters <= 0:
+        return 0.0, 0.0
+    meters_per_degree_lng = METERS_PER_DEGREE_LAT * max(0.01, math.cos(math.radians(lat)))
+    return (
+        rng.uniform(-jitter_meters, jitter_meters) / METERS_PER_DEGREE_LAT,
+        rng.uniform(-jitter_meters, jitter_meters) / meters_per_degree_lng,
+    )
+
+
+def _shift(point: tuple[float, float], offset: tuple[float, float]) -> tuple[float, float]:
+    return round(point[0] + offset[0], 6), round(point[1] + offset[1], 6)
+
+
+def _shift_segments(route_segments: list[dict], offset: tuple[float, float]) -> list[dict]:
+    if offset == (0.0, 0.0):
+        return route_segments
+    return [
+        {**segment, "coordinates": [_shift(tuple(point), offset) for point in segment["coordinates"]]}
+        for segment in route_segments
+    ]
+
+
+def _bulk_upsert(db, ops: Iterable[tuple[UpdateOne, UpdateOne]], batch_size: int) -> int:
+    """Upsert (user, commute) op pairs in unordered batches so large seeds never hold every op in memory."""
+    written = 0
+    iterator = iter(ops)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        user_ops, commute_ops = zip(*batch)
+        db.users.bulk_write(list(user_ops), ordered=False)
+        db.commutes.bulk_write(list(commute_ops), ordered=False)
+        written += len(batch)
+    return written
+
+
 def _commute_doc(
     *,
     user_auth0_id: str,
@@ -221,7 +281,6 @@ def _commute_doc(
     group_size_min: int,
     group_size_max: int,
     route_segments: list[dict],
-    route_coordinates: list[tuple[float, float]],
     otp_total_duration_minutes: int,
 ) -> dict:
     return {
@@ -237,8 +296,7 @@ def _commute_doc(
         "enable_queue_flow": False,
         "enable_suggestions_flow": True,
         "queue_days_of_week": [0, 1, 2, 3, 4],
-        "route_segments": route_segments,
-        "route_coordinates": route_coordinates,
+        "route_segments": segments_for_storage(route_segments),
         "otp_total_duration_minutes": otp_total_duration_minutes,
     }
 
@@ -267,18 +325,23 @@ def main() -> None:
         action="store_true",
         help="Delete existing users/commutes for these demo users before upserting",
     )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=0,
+        help="Total users to seed; users beyond the curated set are jittered copies of it",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for filler users")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Upserts per bulk_write call")
+    parser.add_argument("--otp-concurrency", type=int, default=4, help="Concurrent OTP route fetches")
+    parser.add_argument("--jitter-meters", type=float, default=100.0, help="Max shift applied to filler routes")
+    parser.add_argument("--jitter-minutes", type=int, default=3, help="Max shift applied to filler departures")
     args = parser.parse_args()
 
     settings = SeedSettings()
     if not settings.OTP_BASE_URL:
         raise RuntimeError("OTP_BASE_URL is required for curated demo seed route generation")
     now = datetime.now(timezone.utc)
-    otp_client = OtpClient(
-        base_url=settings.OTP_BASE_URL,
-        graphql_path=settings.OTP_GRAPHQL_PATH,
-        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
-    )
-
     me = settings.DEV_AUTH_DEFAULT_USER_ID
     users = [
         {
@@ -566,96 +629,104 @@ def main() -> None:
             "group_size_max": 2,
         },
     ]
-    route_cache: dict[tuple, tuple[list[dict], list[tuple[float, float]], int]] = {}
-    commutes: list[dict] = []
-    for spec in commute_specs:
+    route_cache = asyncio.run(
+        _fetch_routes(
+            settings=settings,
+            route_keys=(_route_key(spec) for spec in commute_specs if "route_segments" not in spec),
+            concurrency=args.otp_concurrency,
+        )
+    )
+
+    def build_commute(spec: dict, *, user_auth0_id: str, offset: tuple[float, float], minute_shift: int) -> dict:
         manual_segments = spec.get("route_segments")
         manual_duration = spec.get("otp_total_duration_minutes")
         if isinstance(manual_segments, list) and isinstance(manual_duration, int):
             route_segments = manual_segments
-            route_coordinates = _route_coordinates_from_segments(route_segments)
+            # Validates the hand-written geometry; storage derives the flattened route itself.
+            _route_coordinates_from_segments(route_segments)
             otp_total_duration_minutes = manual_duration
         else:
-            route_key = (
-                round(spec["start"][0], 6),
-                round(spec["start"][1], 6),
-                round(spec["end"][0], 6),
-                round(spec["end"][1], 6),
-                int(spec["start_minute"]),
-                str(spec["transport_mode"]),
-            )
-            if route_key not in route_cache:
-                route_cache[route_key] = asyncio.run(
-                    _fetch_route_from_otp(
-                        otp_client=otp_client,
-                        start=spec["start"],
-                        end=spec["end"],
-                        start_minute=spec["start_minute"],
-                        transport_mode=spec["transport_mode"],
-                    )
-                )
-            route_segments, route_coordinates, otp_total_duration_minutes = route_cache[route_key]
-        computed_end_minute = max(spec["end_minute"], spec["start_minute"] + otp_total_duration_minutes)
-        commutes.append(
-            _commute_doc(
-                user_auth0_id=spec["user_auth0_id"],
-                start_name=spec["start_name"],
-                start=spec["start"],
-                end_name=spec["end_name"],
-                end=spec["end"],
-                start_minute=spec["start_minute"],
-                end_minute=min(1440, computed_end_minute),
-                transport_mode=spec["transport_mode"],
-                match_preference=spec["match_preference"],
-                group_size_min=spec["group_size_min"],
-                group_size_max=spec["group_size_max"],
-                route_segments=route_segments,
-                route_coordinates=route_coordinates,
-                otp_total_duration_minutes=otp_total_duration_minutes,
-            )
+            route_segments, _, otp_total_duration_minutes = route_cache[_route_key(spec)]
+        start_minute = min(1439, max(0, spec["start_minute"] + minute_shift))
+        end_minute = min(1440, max(spec["end_minute"] + minute_shift, start_minute + otp_total_duration_minutes))
+        return _commute_doc(
+            user_auth0_id=user_auth0_id,
+            start_name=spec["start_name"],
+            start=_shift(spec["start"], offset),
+            end_name=spec["end_name"],
+            end=_shift(spec["end"], offset),
+            start_minute=start_minute,
+            end_minute=end_minute,
+            transport_mode=spec["transport_mode"],
+            match_preference=spec["match_preference"],
+            group_size_min=spec["group_size_min"],
+            group_size_max=spec["group_size_max"],
+            route_segments=_shift_segments(route_segments, offset),
+            otp_total_duration_minutes=otp_total_duration_minutes,
         )
 
+    commutes = [
+        build_commute(spec, user_auth0_id=spec["user_auth0_id"], offset=(0.0, 0.0), minute_shift=0)
+        for spec in commute_specs
+    ]
+    spec_by_user = {spec["user_auth0_id"]: spec for spec in commute_specs}
+    filler_count = max(0, args.count - len(users))
+    rng = random.Random(args.seed)
+
+    def filler_pairs() -> Iterator[tuple[dict, dict]]:
+        """Load-test users cloned round-robin from the curated set, each with a shifted route."""
+        for i in range(filler_count):
+            template_user = users[i % len(users)]
+            spec = spec_by_user[template_user["auth0_id"]]
+            auth0_id = f"{FILLER_ID_PREFIX}{i:06d}"
+            user = {**template_user, "auth0_id": auth0_id, "name": f"{template_user['name']} {i + 1}"}
+            offset = _jitter_offset(rng, spec["start"][0], args.jitter_meters)
+            minute_shift = rng.randint(-args.jitter_minutes, args.jitter_minutes) if args.jitter_minutes > 0 else 0
+            yield user, build_commute(spec, user_auth0_id=auth0_id, offset=offset, minute_shift=minute_shift)
+
     client = MongoClient(settings.MONGO_URI, server_api=pymongo.server_api.ServerApi(version="1"))
     db = client.get_database("commutebuddy")
 
+    filler_pattern = {"$regex": f"^{re.escape(FILLER_ID_PREFIX)}"}
     if args.reset:
-        db.commutes.delete_many({"user_auth0_id": {"$in": user_ids}})
-        db.users.delete_many({"auth0_id": {"$in": user_ids}})
+        db.commutes.delete_many({"$or": [{"user_auth0_id": {"$in": user_ids}}, {"user_auth0_id": filler_pattern}]})
+        db.users.delete_many({"$or": [{"auth0_id": {"$in": user_ids}}, {"auth0_id": filler_pattern}]})
 
-    existing_matches = list(
-        db.matches.find({"participants": {"$in": user_ids}}, {"_id": 1})
-    )
+    match_filter = {"participants": {"$in": user_ids}}
+    if filler_count:
+        match_filter = {"$or": [match_filter, {"participants": filler_pattern}]}
+    existing_matches = list(db.matches.find(match_filter, {"_id": 1}))
     match_ids = [str(item["_id"]) for item in existing_matches]
     if match_ids:
         db.chat_messages.delete_many({"chat_room_id": {"$in": [str(room["_id"]) for room in db.chat_rooms.find({"match_id": {"$in": match_ids}}, {"_id": 1})]}})
         db.chat_rooms.delete_many({"match_id": {"$in": match_ids}})
-    db.matches.delete_many({"participants": {"$in": user_ids}})
-
-    user_ops = [
-        UpdateOne(
-            {"auth0_id": user["auth0_id"]},
-            {"$set": {**user, "updated_at": now}, "$setOnInsert": {"created_at": now}},
-            upsert=True,
-        )
-        for user in users
-    ]
-    commute_ops = [
-        UpdateOne(
-            {"user_auth0_id": commute["user_auth0_id"]},
-            {"$set": {**commute, "updated_at": now}, "$setOnInsert": {"created_at": now}},
-            upsert=True,
-        )
-        for commute in commutes
-    ]
+    db.matches.delete_many(match_filter)
+
+    def upsert_ops() -> Iterator[tuple[UpdateOne, UpdateOne]]:
+        for user, commute in itertools.chain(zip(users, commutes, strict=True), filler_pairs()):
+            yield (
+                UpdateOne(
+                    {"auth0_id": user["auth0_id"]},
+                    {"$set": {**user, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                ),
+                UpdateOne(
+                    {"user_auth0_id": commute["user_auth0_id"]},
+                    {
+                        "$set": {**commute, "updated_at": now},
+                        "$setOnInsert": {"created_at": now},
+                        "$unset": {"route_coordinates": ""},
+                    },
+                    upsert=True,
+                ),
+            )
 
-    if user_ops:
-        db.users.bulk_write(user_ops, ordered=False)
-    if commute_ops:
-        db.commutes.bulk_write(commute_ops, ordered=False)
+    upserted = _bulk_upsert(db, upsert_ops(), max(1, args.batch_size))
+    client.close()
 
     print("Curated demo seed complete")
-    print(f"users upserted: {len(users)}")
-    print(f"commutes upserted: {len(commutes)}")
+    print(f"users upserted: {upserted}")
+    print(f"commutes upserted: {upserted}")
     print("matches inserted: 0 (generated by UI matching trigger)")
     print(f"default demo user: {me}")
     print("commutes queued: 0 (all seeded as paused)")
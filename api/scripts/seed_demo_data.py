@@ -2,11 +2,14 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import itertools
+import math
 import random
 import re
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import sys
+from typing import Iterable, Iterator
 
 import pymongo
 from pymongo import MongoClient, UpdateOne
@@ -16,7 +19,9 @@ API_DIR = Path(__file__).resolve().parents[1]
 if str(API_DIR) not in sys.path:
     sys.path.insert(0, str(API_DIR))
 
-from src.routing.otp_client import OtpClient, OtpClientError
+from src.routing.otp_client import OtpClient, OtpClientError, create_otp_http_client
+from src.routing.geometry import segments_for_storage
+from src.routing.polyline import decode_polyline
 
 
 class SeedSettings(BaseSettings):
@@ -93,42 +98,6 @@ TRANSIT_TEMPLATES = [
 ]
 
 
-def _decode_polyline(encoded: str) -> list[tuple[float, float]]:
-    coordinates: list[tuple[float, float]] = []
-    index = 0
-    lat = 0
-    lng = 0
-
-    while index < len(encoded):
-        shift = 0
-        result = 0
-        while True:
-            value = ord(encoded[index]) - 63
-            index += 1
-            result |= (value & 0x1F) << shift
-            shift += 5
-            if value < 0x20:
-                break
-        delta_lat = ~(result >> 1) if (result & 1) else (result >> 1)
-        lat += delta_lat
-
-        shift = 0
-        result = 0
-        while True:
-            value = ord(encoded[index]) - 63
-            index += 1
-            result |= (value & 0x1F) << shift
-            shift += 5
-            if value < 0x20:
-                break
-        delta_lng = ~(result >> 1) if (result & 1) else (result >> 1)
-        lng += delta_lng
-
-        coordinates.append((lat / 1e5, lng / 1e5))
-
-    return coordinates
-
-
 def _build_departure_iso(start_minute: int) -> str:
     now = datetime.now().astimezone()
     hour, minute = divmod(start_minute, 60)
@@ -199,7 +168,7 @@ def _normalize_otp_plan(plan_data: dict) -> tuple[list[dict], list[tuple[float,
         if not isinstance(encoded, str) or not encoded:
             continue
 
-        coordinates = _decode_polyline(encoded)
+        coordinates = decode_polyline(encoded)
         if len(coordinates) < 2:
             continue
 
@@ -261,6 +230,95 @@ async def _fetch_route_from_otp(
     return _normalize_otp_plan(response_data)
 
 
+Route = tuple[list[dict], list[tuple[float, float]], int]
+RouteKey = tuple[float, float, float, float, int, str]
+
+METERS_PER_DEGREE_LAT = 111_320.0
+
+
+def _route_key(start: tuple[float, float], end: tuple[float, float], start_minute: int, transport_mode: str) -> RouteKey:
+    return (
+        round(start[0], 6),
+        round(start[1], 6),
+        round(end[0], 6),
+        round(end[1], 6),
+        start_minute,
+        transport_mode,
+    )
+
+
+async def _fetch_routes(
+    *,
+    settings: SeedSettings,
+    route_keys: Iterable[RouteKey],
+    concurrency: int,
+) -> dict[RouteKey, Route]:
+    """Fetch each distinct template route once, at most `concurrency` OTP calls at a time."""
+    keys = list(dict.fromkeys(route_keys))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with create_otp_http_client(
+        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+        connect_timeout_seconds=min(5.0, settings.OTP_TIMEOUT_SECONDS),
+        max_connections=max(1, concurrency),
+        max_keepalive_connections=max(1, concurrency),
+        keepalive_expiry_seconds=30.0,
+    ) as http_client:
+        otp_client = OtpClient(
+            base_url=settings.OTP_BASE_URL,
+            graphql_path=settings.OTP_GRAPHQL_PATH,
+            timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+            http_client=http_client,
+        )
+
+        async def fetch(key: RouteKey) -> Route:
+            async with semaphore:
+                return await _fetch_route_from_otp(
+                    otp_client=otp_client,
+                    start=(key[0], key[1]),
+                    end=(key[2], key[3]),
+                    start_minute=key[4],
+                    transport_mode=key[5],
+                )
+
+        routes = await asyncio.gather(*(fetch(key) for key in keys))
+    return dict(zip(keys, routes))
+
+
+def _jitter_offset(rng: random.Random, lat: float, jitter_meters: float) -> tuple[float, float]:
+    if jitter_meters <= 0:
+        return 0.0, 0.0
+    meters_per_degree_lng = METERS_PER_DEGREE_LAT * max(0.01, math.cos(math.radians(lat)))
+    return (
+        rng.uniform(-jitter_meters, jitter_meters) / METERS_PER_DEGREE_LAT,
+        rng.uniform(-jitter_meters, jitter_meters) / meters_per_degree_lng,
+    )
+
+
+def _shift(point: tuple[float, float], offset: tuple[float, float]) -> tuple[float, float]:
+    return round(point[0] + offset[0], 6), round(point[1] + offset[1], 6)
+
+
+def _shift_segments(route_segments: list[dict], offset: tuple[float, float]) -> list[dict]:
+    if offset == (0.0, 0.0):
+        return route_segments
+    return [
+        {**segment, "coordinates": [_shift(point, offset) for point in segment["coordinates"]]}
+        for segment in route_segments
+    ]
+
+
+def _bulk_upsert(db, ops: Iterable[tuple[UpdateOne, UpdateOne]], batch_size: int) -> int:
+    """Upsert (user, commute) op pairs in unordered batches so large seeds never hold every op in memory."""
+    written = 0
+    iterator = iter(ops)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        user_ops, commute_ops = zip(*batch)
+        db.users.bulk_write(list(user_ops), ordered=False)
+        db.commutes.bulk_write(list(commute_ops), ordered=False)
+        written += len(batch)
+    return written
+
+
 def _make_user_doc(auth0_id: str, idx: int, rng: random.Random) -> dict:
     first = FIRST_NAMES[idx % len(FIRST_NAMES)]
     last = LAST_NAMES[(idx * 7) % len(LAST_NAMES)]
@@ -275,73 +333,77 @@ def _make_user_doc(auth0_id: str, idx: int, rng: random.Random) -> dict:
     }
 
 
+def _commute_spec(idx: int) -> dict:
+    cohort = idx % 4
+    if cohort in (0, 1):
+        match_preference = "individual" if cohort == 0 else "group"
+        return {
+            "transport_mode": "walk",
+            "template": WALK_TEMPLATES[idx % len(WALK_TEMPLATES)],
+            "start_minute": 450 + (idx % 5) * 3,
+            "match_preference": match_preference,
+            "group_size_pref": {"min": 2, "max": 2} if match_preference == "individual" else {"min": 3, "max": 4},
+            "status": "queued",
+        }
+    if cohort == 2:
+        return {
+            "transport_mode": "transit",
+            "template": TRANSIT_TEMPLATES[idx % len(TRANSIT_TEMPLATES)],
+            "start_minute": 445 + (idx % 4) * 4,
+            "match_preference": "individual",
+            "group_size_pref": {"min": 2, "max": 2},
+            "status": "queued",
+        }
+    return {
+        "transport_mode": "walk",
+        "template": WALK_TEMPLATES[(idx + 1) % len(WALK_TEMPLATES)],
+        "start_minute": 600,
+        "match_preference": "group",
+        "group_size_pref": {"min": 3, "max": 4},
+        "status": "paused",
+    }
+
+
+def _spec_route_key(spec: dict) -> RouteKey:
+    template = spec["template"]
+    return _route_key(template["start"], template["end"], spec["start_minute"], spec["transport_mode"])
+
+
 def _make_commute_doc(
     *,
     user_auth0_id: str,
-    idx: int,
-    otp_client: OtpClient,
-    route_cache: dict[tuple, tuple[list[dict], list[tuple[float, float]], int]],
+    spec: dict,
+    route: Route,
+    rng: random.Random,
+    jitter_meters: float,
+    jitter_minutes: int,
+    now: datetime,
 ) -> dict:
-    cohort = idx % 4
-    now = datetime.now(timezone.utc)
-    if cohort in (0, 1):
-        transport_mode = "walk"
-        template = WALK_TEMPLATES[idx % len(WALK_TEMPLATES)]
-        start_minute = 450 + (idx % 5) * 3
-        match_preference = "individual" if cohort == 0 else "group"
-        group_size_pref = {"min": 2, "max": 2} if match_preference == "individual" else {"min": 3, "max": 4}
-        status = "queued"
-    elif cohort == 2:
-        transport_mode = "transit"
-        template = TRANSIT_TEMPLATES[idx % len(TRANSIT_TEMPLATES)]
-        start_minute = 445 + (idx % 4) * 4
-        match_preference = "individual"
-        group_size_pref = {"min": 2, "max": 2}
-        status = "queued"
-    else:
-        transport_mode = "walk"
-        template = WALK_TEMPLATES[(idx + 1) % len(WALK_TEMPLATES)]
-        start_minute = 600
-        match_preference = "group"
-        group_size_pref = {"min": 3, "max": 4}
-        status = "paused"
-
-    cache_key = (
-        round(template["start"][0], 6),
-        round(template["start"][1], 6),
-        round(template["end"][0], 6),
-        round(template["end"][1], 6),
-        start_minute,
-        transport_mode,
-    )
-    if cache_key not in route_cache:
-        route_cache[cache_key] = asyncio.run(
-            _fetch_route_from_otp(
-                otp_client=otp_client,
-                start=template["start"],
-                end=template["end"],
-                start_minute=start_minute,
-                transport_mode=transport_mode,
-            )
-        )
-    route_segments, route_coordinates, otp_total_duration_minutes = route_cache[cache_key]
+    """Reuse the template's route for one commute, shifted in space and time by a small random amount."""
+    template = spec["template"]
+    route_segments, _, otp_total_duration_minutes = route
+    offset = _jitter_offset(rng, template["start"][0], jitter_meters)
+    start = _shift(template["start"], offset)
+    end = _shift(template["end"], offset)
+    start_minute = spec["start_minute"]
+    if jitter_minutes > 0:
+        start_minute = min(1439, max(0, start_minute + rng.randint(-jitter_minutes, jitter_minutes)))
     end_minute = min(1440, start_minute + otp_total_duration_minutes)
 
     return {
         "user_auth0_id": user_auth0_id,
-        "start": {"name": template["start_name"], "lat": template["start"][0], "lng": template["start"][1]},
-        "end": {"name": template["end_name"], "lat": template["end"][0], "lng": template["end"][1]},
+        "start": {"name": template["start_name"], "lat": start[0], "lng": start[1]},
+        "end": {"name": template["end_name"], "lat": end[0], "lng": end[1]},
         "time_window": {"start_minute": start_minute, "end_minute": end_minute},
-        "transport_mode": transport_mode,
-        "match_preference": match_preference,
-        "group_size_pref": group_size_pref,
+        "transport_mode": spec["transport_mode"],
+        "match_preference": spec["match_preference"],
+        "group_size_pref": spec["group_size_pref"],
         "gender_preference": "any",
-        "status": status,
+        "status": spec["status"],
         "enable_queue_flow": True,
         "enable_suggestions_flow": True,
         "queue_days_of_week": [0, 1, 2, 3, 4],
-        "route_segments": route_segments,
-        "route_coordinates": route_coordinates,
+        "route_segments": segments_for_storage(_shift_segments(route_segments, offset)),
         "otp_total_duration_minutes": otp_total_duration_minutes,
         "updated_at": now,
     }
@@ -352,6 +414,15 @@ def main() -> None:
     parser.add_argument("--count", type=int, default=40, help="Total demo users to seed")
     parser.add_argument("--seed", type=int, default=42, help="Random seed")
     parser.add_argument("--reset", action="store_true", help="Delete existing users/commutes/matches/chats first")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Upserts per bulk_write call")
+    parser.add_argument("--otp-concurrency", type=int, default=4, help="Concurrent OTP route fetches")
+    parser.add_argument(
+        "--jitter-meters",
+        type=float,
+        default=100.0,
+        help="Max shift applied to each reused template route (the default dev user is never shifted)",
+    )
+    parser.add_argument("--jitter-minutes", type=int, default=3, help="Max shift applied to each departure time")
     args = parser.parse_args()
 
     settings = SeedSettings()
@@ -359,12 +430,19 @@ def main() -> None:
     if not settings.OTP_BASE_URL:
         raise RuntimeError("OTP_BASE_URL is required for realistic seeded route geometry")
 
-    otp_client = OtpClient(
-        base_url=settings.OTP_BASE_URL,
-        graphql_path=settings.OTP_GRAPHQL_PATH,
-        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+    count = max(0, args.count)
+    user_ids = [settings.DEV_AUTH_DEFAULT_USER_ID] + [f"auth0|demo_user_{i:03d}" for i in range(max(0, count - 1))]
+    user_ids = user_ids[:count]
+
+    # Only a handful of distinct (template, departure, mode) routes exist however many users are
+    # seeded, so fetch them all up front and reuse them.
+    route_cache = asyncio.run(
+        _fetch_routes(
+            settings=settings,
+            route_keys=(_spec_route_key(_commute_spec(idx)) for idx in range(len(user_ids))),
+            concurrency=args.otp_concurrency,
+        )
     )
-    route_cache: dict[tuple, tuple[list[dict], list[tuple[float, float]], int]] = {}
 
     client = MongoClient(settings.MONGO_URI, server_api=pymongo.server_api.ServerApi(version="1"))
     db = client.get_database("commutebuddy")
@@ -376,48 +454,45 @@ def main() -> None:
         db.commutes.delete_many({})
         db.users.delete_many({})
 
-    user_ids = [settings.DEV_AUTH_DEFAULT_USER_ID] + [f"auth0|demo_user_{i:03d}" for i in range(max(0, args.count - 1))]
-
     now = datetime.now(timezone.utc)
-    user_ops = []
-    commute_ops = []
-    for idx, auth0_id in enumerate(user_ids):
-        user = _make_user_doc(auth0_id, idx, rng)
-        user["updated_at"] = now
-        user_ops.append(
-            UpdateOne(
-                {"auth0_id": auth0_id},
-                {"$set": user, "$setOnInsert": {"created_at": now}},
-                upsert=True,
-            )
-        )
 
-        commute = _make_commute_doc(
-            user_auth0_id=auth0_id,
-            idx=idx,
-            otp_client=otp_client,
-            route_cache=route_cache,
-        )
-        commute_ops.append(
-            UpdateOne(
-                {"user_auth0_id": auth0_id},
-                {"$set": commute, "$setOnInsert": {"created_at": now}},
-                upsert=True,
+    def upsert_ops() -> Iterator[tuple[UpdateOne, UpdateOne]]:
+        for idx, auth0_id in enumerate(user_ids):
+            user = _make_user_doc(auth0_id, idx, rng)
+            user["updated_at"] = now
+            spec = _commute_spec(idx)
+            commute = _make_commute_doc(
+                user_auth0_id=auth0_id,
+                spec=spec,
+                route=route_cache[_spec_route_key(spec)],
+                rng=rng,
+                jitter_meters=args.jitter_meters if idx else 0.0,
+                jitter_minutes=args.jitter_minutes if idx else 0,
+                now=now,
+            )
+            yield (
+                UpdateOne(
+                    {"auth0_id": auth0_id},
+                    {"$set": user, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                ),
+                UpdateOne(
+                    {"user_auth0_id": auth0_id},
+                    {"$set": commute, "$setOnInsert": {"created_at": now}, "$unset": {"route_coordinates": ""}},
+                    upsert=True,
+                ),
             )
-        )
 
-    if user_ops:
-        db.users.bulk_write(user_ops, ordered=False)
-    if commute_ops:
-        db.commutes.bulk_write(commute_ops, ordered=False)
+    upserted = _bulk_upsert(db, upsert_ops(), max(1, args.batch_size))
 
     queued_count = db.commutes.count_documents({"status": "queued"})
     walk_queued = db.commutes.count_documents({"status": "queued", "transport_mode": "walk"})
     transit_queued = db.commutes.count_documents({"status": "queued", "transport_mode": "transit"})
+    client.close()
 
     print("Seed complete")
-    print(f"users upserted: {len(user_ids)}")
-    print(f"commutes upserted: {len(user_ids)}")
+    print(f"users upserted: {upserted}")
+    print(f"commutes upserted: {upserted}")
     print(f"queued users: {queued_count}")
     print(f"queued walk: {walk_queued}")
     print(f"queued transit: {transit_queued}")
@@ -427,4 +502,3 @@ def main() -> None:
 
 if __name__ == "__main__":
     main()
-
@@ -1,12 +1,13 @@
 # https://auth0.com/docs/quickstart/backend/fastapi
 from typing import Annotated
 
-from fastapi import Depends, Header, HTTPException
-from fastapi_plugin.fast_api_client import Auth0FastAPI
+from fastapi import Depends, Header, HTTPException, Request
 
 from src.auth.schemas import TokenClaims
 from src.config import settings
 
+jwks_refresher = None
+
 if settings.DEV_AUTH_BYPASS:
     async def get_token_claims(
         x_dev_auth0_id: Annotated[str | None, Header(alias="x-dev-auth0-id")] = None,
@@ -16,19 +17,52 @@ else:
     if not settings.AUTH0_DOMAIN or not settings.AUTH0_AUDIENCE:
         raise RuntimeError("AUTH0_DOMAIN and AUTH0_AUDIENCE are required when DEV_AUTH_BYPASS is false")
 
+    # Imported here so the dev bypass does not pay for the Auth0 SDK (and its crypto stack) at startup.
+    from auth0_api_python.cache import InMemoryCache
+    from fastapi_plugin.fast_api_client import Auth0FastAPI
+
+    from src.auth.token_cache import JwksRefresher, VerifiedTokenCache
+
+    # Shared with the refresher so signing keys are re-fetched off the request path.
+    _jwks_cache = InMemoryCache(max_entries=16)
     auth0 = Auth0FastAPI(
         domain=settings.AUTH0_DOMAIN,
         audience=settings.AUTH0_AUDIENCE,
+        cache_adapter=_jwks_cache,
+        cache_ttl_seconds=int(settings.AUTH_JWKS_REFRESH_SECONDS * 2),
+    )
+    jwks_refresher = JwksRefresher(
+        domain=settings.AUTH0_DOMAIN,
+        cache=_jwks_cache,
+        interval_seconds=settings.AUTH_JWKS_REFRESH_SECONDS,
+    )
+    _require_auth = auth0.require_auth()
+    _verified_tokens = VerifiedTokenCache(
+        max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+        max_ttl_seconds=settings.AUTH_TOKEN_CACHE_MAX_SECONDS,
     )
 
-    async def get_token_claims(
-        claims: dict = Depends(auth0.require_auth()),
-    ) -> TokenClaims:
+    async def get_token_claims(request: Request) -> TokenClaims:
+        authorization = request.headers.get("authorization", "")
+        claims = _verified_tokens.get(authorization)
+        if claims is None:
+            claims = await _require_auth(request)
+            _verified_tokens.put(authorization, claims)
         sub = claims.get("sub")
         if not sub:
             raise HTTPException(status_code=401, detail="Invalid auth claims")
         return TokenClaims(user_id=sub)
 
 
+async def start_jwks_refresh() -> None:
+    if jwks_refresher is not None:
+        jwks_refresher.start()
+
+
+async def stop_jwks_refresh() -> None:
+    if jwks_refresher is not None:
+        await jwks_refresher.stop()
+
+
 # to use in endpoints: from src.auth.dependencies import AuthenticatedUser
-AuthenticatedUser = Annotated[TokenClaims, Depends(get_token_claims)]
\ No newline at end of file
+AuthenticatedUser = Annotated[TokenClaims, Depends(get_token_claims)]
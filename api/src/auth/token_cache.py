@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Callable
+
+from auth0_api_python.cache import CacheAdapter
+from auth0_api_python.utils import fetch_jwks, fetch_oidc_metadata, normalize_domain
+
+from src.cache import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+
+class VerifiedTokenCache:
+    """Claims of Bearer tokens that already passed verification, kept until the token's exp.
+
+    Keys are SHA-256 digests so raw tokens are never held. DPoP requests are not cached:
+    their proof differs per request and has to be checked every time.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        max_ttl_seconds: float,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_ttl_seconds = max_ttl_seconds
+        self._clock = clock
+        self._entries: TtlLruCache[str, dict[str, Any]] = TtlLruCache(
+            max_entries=max_entries,
+            ttl_seconds=max_ttl_seconds,
+        )
+
+    @staticmethod
+    def cache_key(authorization: str) -> str | None:
+        parts = authorization.split(None, 1)
+        if len(parts) != 2 or parts[0].lower() != "bearer":
+            return None
+        return hashlib.sha256(parts[1].strip().encode("utf-8")).hexdigest()
+
+    def get(self, authorization: str) -> dict[str, Any] | None:
+        key = self.cache_key(authorization)
+        if key is None:
+            return None
+        claims = self._entries.get(key)
+        if claims is not None and claims.get("exp", 0) <= self._clock():
+            self._entries.pop(key)
+            return None
+        return claims
+
+    def put(self, authorization: str, claims: dict[str, Any]) -> None:
+        key = self.cache_key(authorization)
+        expires = claims.get("exp")
+        if key is None or not isinstance(expires, (int, float)):
+            return
+        ttl = min(self.max_ttl_seconds, expires - self._clock())
+        if ttl > 0:
+            self._entries.put(key, claims, ttl_seconds=ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class JwksRefresher:
+    """Re-fetches OIDC metadata and the JWKS on an interval into the SDK's cache.
+
+    Entries are written with a TTL longer than the interval, so verification always finds
+    warm keys and never fetches them on the request path.
+    """
+
+    def __init__(
+        self,
+        *,
+        domain: str,
+        cache: CacheAdapter,
+        interval_seconds: float,
+        custom_fetch: Callable[..., Any] | None = None,
+    ) -> None:
+        self.domain = domain
+        self.cache = cache
+        self.interval_seconds = interval_seconds
+        self.custom_fetch = custom_fetch
+        self._task: asyncio.Task | None = None
+
+    async def refresh_once(self) -> None:
+        ttl = int(self.interval_seconds * 2)
+        metadata, _ = await fetch_oidc_metadata(domain=self.domain, custom_fetch=self.custom_fetch)
+        self.cache.set(normalize_domain(f"https://{self.domain}"), metadata, ttl_seconds=ttl)
+        jwks_uri = metadata["jwks_uri"]
+        jwks, _ = await fetch_jwks(jwks_uri=jwks_uri, custom_fetch=self.custom_fetch)
+        self.cache.set(jwks_uri, jwks, ttl_seconds=ttl)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as exc:
+                # The cached keys stay valid until their TTL; verification fetches on its own after that.
+                logger.warning("JWKS refresh failed: %s", exc)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="jwks-refresh")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
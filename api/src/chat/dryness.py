@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from statistics import median
+from threading import Lock
+
+
+@dataclass(frozen=True)
+class DrynessThresholds:
+    window_size: int = 12
+    idle_gap_seconds: float = 180.0
+    slowdown_ratio: float = 3.0
+    min_slowdown_gap_seconds: float = 45.0
+    short_message_chars: int = 15
+    short_streak: int = 3
+    one_sided_streak: int = 3
+
+
+DEFAULT_THRESHOLDS = DrynessThresholds()
+
+
+@dataclass(frozen=True)
+class ConversationSample:
+    sender: str
+    body: str
+    created_at: datetime | None = None
+    is_system: bool = False
+
+
+@dataclass(frozen=True)
+class DrynessVerdict:
+    stalled: bool
+    reasons: tuple[str, ...]
+
+
+def _as_aware_utc(value: datetime) -> datetime:
+    if value.tzinfo is None or value.tzinfo.utcoffset(value) is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def trailing_window(items: list, size: int = DEFAULT_THRESHOLDS.window_size) -> list:
+    if size <= 0:
+        return []
+    return items[-size:]
+
+
+def _gaps_seconds(samples: list[ConversationSample]) -> list[float]:
+    timestamps = [_as_aware_utc(sample.created_at) for sample in samples if sample.created_at is not None]
+    return [
+        (later - earlier).total_seconds()
+        for earlier, later in zip(timestamps, timestamps[1:])
+    ]
+
+
+def assess_dryness(
+    samples: list[ConversationSample],
+    *,
+    now: datetime | None = None,
+    thresholds: DrynessThresholds = DEFAULT_THRESHOLDS,
+) -> DrynessVerdict:
+    """Cheap local check for a stalled chat; only stalled chats are worth a Gemini call.
+
+    Signals: time since the last message, the latest reply gap versus the chat's usual
+    cadence, a run of very short replies, and one participant talking to themselves.
+    Timing signals are skipped for samples without created_at.
+    """
+    window = trailing_window(samples, thresholds.window_size)
+    if not window:
+        return DrynessVerdict(stalled=False, reasons=())
+
+    reasons: list[str] = []
+    current_time = _as_aware_utc(now) if now else datetime.now(timezone.utc)
+    last = window[-1]
+    if last.created_at is not None:
+        idle_seconds = (current_time - _as_aware_utc(last.created_at)).total_seconds()
+        if idle_seconds >= thresholds.idle_gap_seconds:
+            reasons.append("idle")
+
+    gaps = _gaps_seconds(window)
+    if len(gaps) >= 3:
+        usual_gap = median(gaps[:-1])
+        latest_gap = gaps[-1]
+        if (
+            latest_gap >= thresholds.min_slowdown_gap_seconds
+            and latest_gap >= thresholds.slowdown_ratio * max(usual_gap, 1.0)
+        ):
+            reasons.append("slowing")
+
+    user_messages = [sample for sample in window if not sample.is_system]
+    recent = user_messages[-thresholds.short_streak:]
+    if len(recent) >= thresholds.short_streak and all(
+        len(sample.body.strip()) < thresholds.short_message_chars for sample in recent
+    ):
+        reasons.append("short_replies")
+
+    recent_senders = {sample.sender for sample in user_messages[-thresholds.one_sided_streak:]}
+    if len(user_messages) >= thresholds.one_sided_streak and len(recent_senders) == 1:
+        reasons.append("one_sided")
+
+    return DrynessVerdict(stalled=bool(reasons), reasons=tuple(reasons))
+
+
+class ContinuationStats:
+    """Counts continuation checks answered locally versus forwarded to Gemini."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.skipped = 0
+        self.forwarded = 0
+
+    def record(self, *, forwarded: bool) -> None:
+        with self._lock:
+            if forwarded:
+                self.forwarded += 1
+            else:
+                self.skipped += 1
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {"skipped": self.skipped, "forwarded": self.forwarded}
+
+
+CONTINUATION_STATS = ContinuationStats()
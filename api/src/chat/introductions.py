@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from beanie import PydanticObjectId
+from beanie.odm.operators.find.comparison import In
+
+from src.cache import TtlLruCache
+from src.chat.service import post_system_message
+from src.config import settings
+from src.db.models.chat_message import ChatMessage
+from src.db.models.chat_room import ChatRoom
+from src.db.models.introduction_cache import IntroductionCacheEntry
+from src.db.models.match_suggestion import MatchSuggestion
+from src.db.models.user import User
+from src.gemini.gemini import INTRODUCTION_PROMPT_VERSION, GeminiClient
+from src.metrics import track_matching_stage
+
+logger = logging.getLogger(__name__)
+
+
+_memory_cache: TtlLruCache[str, str] = TtlLruCache(
+    max_entries=settings.INTRO_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.INTRO_CACHE_TTL_SECONDS,
+)
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _normalized_users(users: list[dict]) -> list[dict]:
+    normalized = []
+    for user in users:
+        interests = {
+            interest.strip().casefold()
+            for interest in user.get("interests", [])
+            if isinstance(interest, str) and interest.strip()
+        }
+        normalized.append(
+            {
+                "name": str(user.get("name") or "").strip(),
+                "occupation": str(user.get("occupation") or "").strip(),
+                "interests": sorted(interests),
+            }
+        )
+    return sorted(normalized, key=lambda item: (item["name"].casefold(), item["occupation"].casefold()))
+
+
+def introduction_cache_key(users: list[dict]) -> str:
+    """Content hash of the participant profiles and prompt version; order-insensitive."""
+    payload = {
+        "prompt_version": INTRODUCTION_PROMPT_VERSION,
+        "users": _normalized_users(users),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _as_aware_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+async def _load_persisted(key: str) -> str | None:
+    try:
+        entry = await IntroductionCacheEntry.find_one(IntroductionCacheEntry.key == key)
+    except Exception as exc:
+        logger.warning("introduction cache lookup failed: %s", exc)
+        return None
+    if not entry:
+        return None
+    remaining = (_as_aware_utc(entry.expires_at) - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        return None
+    _memory_cache.put(key, entry.introduction, ttl_seconds=remaining)
+    return entry.introduction
+
+
+async def _persist(key: str, introduction: str) -> None:
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=settings.INTRO_CACHE_TTL_SECONDS)
+    try:
+        await IntroductionCacheEntry.find_one(IntroductionCacheEntry.key == key).upsert(
+            {
+                "$set": {
+                    IntroductionCacheEntry.introduction: introduction,
+                    IntroductionCacheEntry.prompt_version: INTRODUCTION_PROMPT_VERSION,
+                    IntroductionCacheEntry.created_at: now,
+                    IntroductionCacheEntry.expires_at: expires_at,
+                }
+            },
+            on_insert=IntroductionCacheEntry(
+                key=key,
+                prompt_version=INTRODUCTION_PROMPT_VERSION,
+                introduction=introduction,
+                created_at=now,
+                expires_at=expires_at,
+            ),
+        )
+    except Exception as exc:
+        logger.warning("introduction cache write failed: %s", exc)
+
+
+async def get_cached_introduction(users: list[dict]) -> str | None:
+    key = introduction_cache_key(users)
+    return _memory_cache.get(key) or await _load_persisted(key)
+
+
+async def store_introduction(users: list[dict], introduction: str) -> None:
+    if not introduction:
+        return
+    key = introduction_cache_key(users)
+    _memory_cache.put(key, introduction)
+    await _persist(key, introduction)
+
+
+async def get_or_generate_introduction(users: list[dict]) -> str:
+    """Return a cached introduction for these profiles, generating and caching it on a miss."""
+    cached = await get_cached_introduction(users)
+    if cached:
+        return cached
+
+    client = GeminiClient()
+    introduction = await asyncio.to_thread(client.generate_initial_introduction, users)
+    await store_introduction(users, introduction)
+    return introduction
+
+
+@dataclass(frozen=True)
+class IntroductionDeadLetter:
+    match_id: str
+    chat_room_id: str
+    error: str
+    attempts: int
+    failed_at: datetime
+
+
+@dataclass(frozen=True)
+class IntroductionBatchResult:
+    posted: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+INTRO_DEAD_LETTERS: deque[IntroductionDeadLetter] = deque(maxlen=1000)
+
+
+def drain_dead_letters() -> list[IntroductionDeadLetter]:
+    drained = list(INTRO_DEAD_LETTERS)
+    INTRO_DEAD_LETTERS.clear()
+    return drained
+
+
+async def _rooms_with_system_message(room_ids: list[str]) -> set[str]:
+    if not room_ids:
+        return set()
+    messages = await ChatMessage.find(
+        In(ChatMessage.chat_room_id, room_ids),
+        ChatMessage.is_system == True,
+    ).to_list()
+    return {message.chat_room_id for message in messages}
+
+
+async def claim_room_introduction(room_id: str) -> datetime | None:
+    """Stamp intro_posted_at if it is unset; None means another run already claimed the room."""
+    claimed_at = datetime.now(timezone.utc)
+    result = await ChatRoom.get_pymongo_collection().update_one(
+        {"_id": PydanticObjectId(room_id), "intro_posted_at": None},
+        {"$set": {"intro_posted_at": claimed_at}},
+    )
+    return claimed_at if result.matched_count else None
+
+
+async def release_room_introduction(room_id: str, claimed_at: datetime) -> None:
+    await ChatRoom.get_pymongo_collection().update_one(
+        {"_id": PydanticObjectId(room_id), "intro_posted_at": claimed_at},
+        {"$set": {"intro_posted_at": None}},
+    )
+
+
+async def _post_introduction_with_retries(
+    match: MatchSuggestion,
+    users: list[dict],
+    *,
+    semaphore: asyncio.Semaphore,
+    max_attempts: int,
+) -> Literal["posted", "skipped", "failed"]:
+    attempts = 0
+    while True:
+        attempts += 1
+        claimed_at: datetime | None = None
+        try:
+            async with semaphore:
+                introduction = await get_or_generate_introduction(users)
+            if not introduction:
+                raise RuntimeError("Gemini returned an empty introduction")
+            claimed_at = await claim_room_introduction(match.chat_room_id)
+            if claimed_at is None:
+                return "skipped"
+            await post_system_message(match.chat_room_id, introduction)
+            return "posted"
+        except Exception as exc:
+            if claimed_at is not None:
+                # Give the room back so the next attempt (or a later cycle) can post.
+                try:
+                    await release_room_introduction(match.chat_room_id, claimed_at)
+                except Exception as release_exc:
+                    logger.warning(
+                        "could not release introduction claim on room %s: %s", match.chat_room_id, release_exc
+                    )
+            if attempts >= max_attempts:
+                logger.warning("introduction for match %s failed after %s attempts: %s", match.id, attempts, exc)
+                INTRO_DEAD_LETTERS.append(
+                    IntroductionDeadLetter(
+                        match_id=str(match.id),
+                        chat_room_id=match.chat_room_id,
+                        error=str(exc),
+                        attempts=attempts,
+                        failed_at=datetime.now(timezone.utc),
+                    )
+                )
+                return "failed"
+            await asyncio.sleep(settings.INTRO_BATCH_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+
+
+async def post_introductions_for_matches(matches: list[MatchSuggestion]) -> IntroductionBatchResult:
+    """Write a Gemini introduction as the first system message of each newly active match's room.
+
+    Rooms that already have a system message are skipped, and each post first claims the room's
+    intro_posted_at so overlapping runs post at most once. Gemini calls run with bounded
+    concurrency, and matches that still fail after retries land in INTRO_DEAD_LETTERS.
+    """
+    pending = {
+        match.chat_room_id: match
+        for match in matches
+        if match.status == "active" and match.chat_room_id
+    }
+    already_introduced = await _rooms_with_system_message(list(pending))
+    skipped = len(matches) - len(pending) + len(already_introduced)
+    targets = [match for room_id, match in pending.items() if room_id not in already_introduced]
+    if not targets:
+        return IntroductionBatchResult(skipped=skipped)
+
+    participant_ids = sorted({user_id for match in targets for user_id in match.participants})
+    users = await User.find(In(User.auth0_id, participant_ids)).to_list()
+    profiles_by_id = {
+        user.auth0_id: {"name": user.name, "occupation": user.occupation, "interests": user.interests}
+        for user in users
+    }
+
+    semaphore = asyncio.Semaphore(max(1, settings.INTRO_BATCH_CONCURRENCY))
+    jobs = []
+    for match in targets:
+        profiles = [profiles_by_id[user_id] for user_id in match.participants if user_id in profiles_by_id]
+        if len(profiles) < 2:
+            skipped += 1
+            continue
+        jobs.append(
+            _post_introduction_with_retries(
+                match,
+                profiles,
+                semaphore=semaphore,
+                max_attempts=max(1, settings.INTRO_BATCH_MAX_ATTEMPTS),
+            )
+        )
+    outcomes = await asyncio.gather(*jobs)
+    return IntroductionBatchResult(
+        posted=outcomes.count("posted"),
+        skipped=skipped + outcomes.count("skipped"),
+        failed=outcomes.count("failed"),
+    )
+
+
+async def _post_introductions_in_background(matches: list[MatchSuggestion]) -> None:
+    try:
+        with track_matching_stage("introductions"):
+            await post_introductions_for_matches(matches)
+    except Exception as exc:
+        logger.warning("background introduction posting failed: %s", exc)
+
+
+def schedule_introductions(matches: list[MatchSuggestion]) -> None:
+    """Post introductions without holding up the request that activated the matches."""
+    task = asyncio.create_task(_post_introductions_in_background(list(matches)))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
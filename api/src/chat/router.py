@@ -1,33 +1,56 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
+from collections.abc import AsyncIterator
 
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 
 logger = logging.getLogger(__name__)
 
 from src.auth.dependencies import AuthenticatedUser
+from src.chat.dryness import (
+    CONTINUATION_STATS,
+    DEFAULT_THRESHOLDS,
+    ConversationSample,
+    assess_dryness,
+    trailing_window,
+)
+from src.chat.introductions import (
+    claim_room_introduction,
+    get_cached_introduction,
+    get_or_generate_introduction,
+    release_room_introduction,
+    store_introduction,
+)
 from src.chat.schemas import (
     ChatMessageResponse,
     ChatRoomDetailResponse,
     ChatRoomSummaryResponse,
     ContinuationRequest,
     ContinuationResponse,
+    ContinuationStatsResponse,
     IntroductionRequest,
     IntroductionResponse,
+    IntroductionStreamRequest,
     QuestionsRequest,
     QuestionsResponse,
+    QuestionsStreamRequest,
     SendMessageRequest,
 )
 from src.chat.service import (
     get_room_for_user,
     get_room_last_message,
     list_messages_for_room,
+    list_recent_messages_for_room,
     list_rooms_for_user,
+    post_system_message,
     send_message_for_room,
 )
-from src.gemini.gemini import GeminiClient
+from src.gemini.gemini import QUESTIONS_FALLBACK, GeminiClient
+from src.users.loader import UserLoader
 
 router = APIRouter(tags=["chat"])
 
@@ -57,6 +80,101 @@ def _to_room_summary_response(room, last_message) -> ChatRoomSummaryResponse:
     )
 
 
+def _sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _relay_stream(
+    chunks: AsyncIterator[str],
+    *,
+    room_id: str | None,
+    fallback: str | None = None,
+    on_complete=None,
+    introduction: bool = False,
+) -> AsyncIterator[str]:
+    """Relay Gemini chunks as SSE `message` events, then emit `done` with the full text.
+
+    The final text is saved as a system message when room_id is set; an introduction is only
+    posted if this stream wins the room's intro_posted_at claim, so it never duplicates the
+    one the matching cycle posts (the `done` message is then null). Failures after the
+    stream has started are reported as an `error` event since the status code is already sent;
+    the partial text is neither cached nor posted. The fallback only stands in for a stream
+    that produced nothing.
+    """
+    parts: list[str] = []
+    failed = False
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield _sse_event({"text": chunk})
+    except Exception as e:
+        logger.exception("Gemini stream failed: %s", e)
+        if parts or fallback is None:
+            yield _sse_event({"detail": f"Generation failed: {str(e)}"}, event="error")
+            return
+        failed = True
+    text = "".join(parts).strip()
+    if not text and fallback is not None:
+        text = fallback
+        yield _sse_event({"text": text})
+    if on_complete is not None and text and not failed:
+        await on_complete(text)
+    message = None
+    if room_id and text:
+        claimed_at = await claim_room_introduction(room_id) if introduction else None
+        if not introduction or claimed_at is not None:
+            try:
+                message = await post_system_message(room_id, text)
+            except Exception:
+                if claimed_at is not None:
+                    await release_room_introduction(room_id, claimed_at)
+                raise
+    yield _sse_event(
+        {
+            "text": text,
+            "message": _to_message_response(message).model_dump() if message else None,
+        },
+        event="done",
+    )
+
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def _require_room(claims, room_id: str | None) -> None:
+    if room_id and not await get_room_for_user(claims.user_id, room_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
+
+
+async def _continuation_if_stalled(
+    samples: list[ConversationSample],
+    messages_dict: list[dict],
+) -> str | None:
+    if any(sample.created_at is None for sample in samples):
+        # Without timestamps the heuristic only sees message text and would wave through
+        # conversations that went quiet, so leave the call to Gemini.
+        CONTINUATION_STATS.record(forwarded=True)
+    else:
+        verdict = assess_dryness(samples)
+        if not verdict.stalled:
+            CONTINUATION_STATS.record(forwarded=False)
+            return None
+        CONTINUATION_STATS.record(forwarded=True)
+        logger.info("continuation: conversation flagged as stalled (%s)", ", ".join(verdict.reasons))
+    client = GeminiClient()
+    return await asyncio.to_thread(client.get_chat_continuation, trailing_window(messages_dict))
+
+
 @router.get("/chats", response_model=list[ChatRoomSummaryResponse])
 async def list_chats(claims: AuthenticatedUser) -> list[ChatRoomSummaryResponse]:
     rooms = await list_rooms_for_user(claims.user_id)
@@ -91,6 +209,7 @@ async def post_chat_message(
     room_id: str,
     payload: SendMessageRequest,
     claims: AuthenticatedUser,
+    users: UserLoader,
 ) -> ChatMessageResponse:
     if not payload.body.strip():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message body is required")
@@ -98,6 +217,7 @@ async def post_chat_message(
         auth0_id=claims.user_id,
         room_id=room_id,
         body=payload.body,
+        users=users,
     )
     if not message:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
@@ -113,12 +233,11 @@ async def generate_introduction(body: IntroductionRequest) -> IntroductionRespon
             detail="At least 2 users required for introduction",
         )
     try:
-        client = GeminiClient()
         users_dict = [
             {"name": u.name, "occupation": u.occupation, "interests": u.interests}
             for u in body.users
         ]
-        intro = client.generate_initial_introduction(users_dict)
+        intro = await get_or_generate_introduction(users_dict)
         return IntroductionResponse(introduction=intro)
     except Exception as e:
         raise HTTPException(
@@ -127,18 +246,92 @@ async def generate_introduction(body: IntroductionRequest) -> IntroductionRespon
         ) from e
 
 
+@router.post("/chat/introduction/stream")
+async def stream_introduction(body: IntroductionStreamRequest, claims: AuthenticatedUser) -> StreamingResponse:
+    """Server-sent events variant of /chat/introduction; cached introductions arrive as one chunk."""
+    if not body.users or len(body.users) < 2:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least 2 users required for introduction",
+        )
+    await _require_room(claims, body.room_id)
+    users_dict = [
+        {"name": u.name, "occupation": u.occupation, "interests": u.interests}
+        for u in body.users
+    ]
+    cached = await get_cached_introduction(users_dict)
+    if cached:
+        return _sse_response(_relay_stream(_single_chunk(cached), room_id=body.room_id, introduction=True))
+
+    async def cache_introduction(text: str) -> None:
+        await store_introduction(users_dict, text)
+
+    return _sse_response(
+        _relay_stream(
+            GeminiClient().stream_initial_introduction(users_dict),
+            room_id=body.room_id,
+            on_complete=cache_introduction,
+            introduction=True,
+        )
+    )
+
+
 @router.post("/chat/continuation", response_model=ContinuationResponse)
 async def get_continuation(body: ContinuationRequest) -> ContinuationResponse:
     """Check if conversation is dry; return intervention or None."""
     if not body.messages:
         return ContinuationResponse(continuation=None)
     try:
-        client = GeminiClient()
+        samples = [
+            ConversationSample(
+                sender=m.name,
+                body=m.content,
+                created_at=m.created_at,
+                is_system=m.role == "model",
+            )
+            for m in body.messages
+        ]
         messages_dict = [
             {"role": m.role, "name": m.name, "content": m.content}
             for m in body.messages
         ]
-        continuation = client.get_chat_continuation(messages_dict)
+        continuation = await _continuation_if_stalled(samples, messages_dict)
+        return ContinuationResponse(continuation=continuation)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get continuation: {str(e)}",
+        ) from e
+
+
+@router.post("/chats/{room_id}/continuation", response_model=ContinuationResponse)
+async def get_room_continuation(room_id: str, claims: AuthenticatedUser) -> ContinuationResponse:
+    """Like /chat/continuation, but reads the room's recent messages and their timestamps from the DB."""
+    room = await get_room_for_user(claims.user_id, room_id)
+    if not room:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
+    messages = await list_recent_messages_for_room(room_id, limit=DEFAULT_THRESHOLDS.window_size)
+    if not messages:
+        return ContinuationResponse(continuation=None)
+    try:
+        samples = [
+            ConversationSample(
+                sender=message.sender_auth0_id or message.sender_name,
+                body=message.body,
+                created_at=message.created_at,
+                is_system=message.is_system,
+            )
+            for message in messages
+        ]
+        messages_dict = [
+            {
+                "role": "model" if message.is_system else "user",
+                "name": message.sender_name,
+                "content": message.body,
+            }
+            for message in messages
+        ]
+        continuation = await _continuation_if_stalled(samples, messages_dict)
         return ContinuationResponse(continuation=continuation)
     except Exception as e:
         raise HTTPException(
@@ -147,6 +340,12 @@ async def get_continuation(body: ContinuationRequest) -> ContinuationResponse:
         ) from e
 
 
+@router.get("/chat/continuation/stats", response_model=ContinuationStatsResponse)
+async def get_continuation_stats(claims: AuthenticatedUser) -> ContinuationStatsResponse:
+    """Continuation checks answered by the local pre-filter vs. forwarded to Gemini."""
+    return ContinuationStatsResponse(**CONTINUATION_STATS.snapshot())
+
+
 @router.post("/chat/questions", response_model=QuestionsResponse)
 async def generate_questions(body: QuestionsRequest) -> QuestionsResponse:
     """Generate new questions based on conversation context."""
@@ -166,3 +365,18 @@ async def generate_questions(body: QuestionsRequest) -> QuestionsResponse:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate questions: {str(e)}",
         ) from e
+
+
+@router.post("/chat/questions/stream")
+async def stream_questions(body: QuestionsStreamRequest, claims: AuthenticatedUser) -> StreamingResponse:
+    """Server-sent events variant of /chat/questions."""
+    await _require_room(claims, body.room_id)
+    if not body.messages:
+        chunks = _single_chunk(QUESTIONS_FALLBACK)
+    else:
+        messages_dict = [
+            {"role": m.role, "name": m.name, "content": m.content}
+            for m in body.messages
+        ]
+        chunks = GeminiClient().stream_new_questions(messages_dict)
+    return _sse_response(_relay_stream(chunks, room_id=body.room_id, fallback=QUESTIONS_FALLBACK))
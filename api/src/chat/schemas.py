@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import datetime
+
 from pydantic import BaseModel, Field
 
 
@@ -13,6 +15,10 @@ class IntroductionRequest(BaseModel):
     users: list[UserForIntro]
 
 
+class IntroductionStreamRequest(IntroductionRequest):
+    room_id: str | None = None  # when set, the final text is saved as a system message
+
+
 class IntroductionResponse(BaseModel):
     introduction: str
 
@@ -21,6 +27,7 @@ class ChatMessageForApi(BaseModel):
     role: str  # "user" or "model"
     name: str
     content: str
+    created_at: datetime | None = None  # enables the timing signals in the dryness pre-filter
 
 
 class ContinuationRequest(BaseModel):
@@ -31,10 +38,19 @@ class ContinuationResponse(BaseModel):
     continuation: str | None  # None if conversation is flowing
 
 
+class ContinuationStatsResponse(BaseModel):
+    skipped: int
+    forwarded: int
+
+
 class QuestionsRequest(BaseModel):
     messages: list[ChatMessageForApi]
 
 
+class QuestionsStreamRequest(QuestionsRequest):
+    room_id: str | None = None  # when set, the final text is saved as a system message
+
+
 class QuestionsResponse(BaseModel):
     questions: str
 
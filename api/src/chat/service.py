@@ -4,12 +4,14 @@ from datetime import datetime, timezone
 
 from src.db.models.chat_message import ChatMessage
 from src.db.models.chat_room import ChatRoom
-from src.users.service import get_by_auth0_id
+from src.db.mongodb import find_for_list
+from src.users.loader import UserProfileLoader
+
+SYSTEM_SENDER_NAME = "Flock"
 
 
 async def list_rooms_for_user(auth0_id: str) -> list[ChatRoom]:
-    rooms = await ChatRoom.find_all().to_list()
-    return [room for room in rooms if auth0_id in room.participants]
+    return await find_for_list(ChatRoom.find({"participants": auth0_id}))
 
 
 async def get_room_for_user(auth0_id: str, room_id: str) -> ChatRoom | None:
@@ -20,15 +22,25 @@ async def get_room_for_user(auth0_id: str, room_id: str) -> ChatRoom | None:
 
 
 async def list_messages_for_room(room_id: str) -> list[ChatMessage]:
-    messages = await ChatMessage.find(ChatMessage.chat_room_id == room_id).to_list()
+    messages = await find_for_list(ChatMessage.find(ChatMessage.chat_room_id == room_id))
     return sorted(messages, key=lambda message: message.created_at)
 
 
+async def list_recent_messages_for_room(room_id: str, limit: int) -> list[ChatMessage]:
+    messages = (
+        await ChatMessage.find(ChatMessage.chat_room_id == room_id)
+        .sort(-ChatMessage.created_at)
+        .limit(limit)
+        .to_list()
+    )
+    return list(reversed(messages))
+
+
 async def get_room_last_message(room_id: str) -> ChatMessage | None:
-    messages = await list_messages_for_room(room_id)
-    if not messages:
-        return None
-    return messages[-1]
+    messages = await find_for_list(
+        ChatMessage.find(ChatMessage.chat_room_id == room_id).sort(-ChatMessage.created_at).limit(1)
+    )
+    return messages[0] if messages else None
 
 
 async def send_message_for_room(
@@ -36,12 +48,13 @@ async def send_message_for_room(
     auth0_id: str,
     room_id: str,
     body: str,
+    users: UserProfileLoader | None = None,
 ) -> ChatMessage | None:
     room = await get_room_for_user(auth0_id, room_id)
     if not room:
         return None
 
-    user = await get_by_auth0_id(auth0_id)
+    user = await (users or UserProfileLoader()).load(auth0_id)
     sender_name = user.name if user else "Commuter"
     message = ChatMessage(
         chat_room_id=room_id,
@@ -56,3 +69,20 @@ async def send_message_for_room(
     await room.save()
     return message
 
+
+async def post_system_message(room_id: str, body: str) -> ChatMessage | None:
+    room = await ChatRoom.get(room_id)
+    if not room:
+        return None
+    message = ChatMessage(
+        chat_room_id=room_id,
+        sender_auth0_id=None,
+        sender_name=SYSTEM_SENDER_NAME,
+        body=body.strip(),
+        is_system=True,
+    )
+    await message.insert()
+
+    room.updated_at = datetime.now(timezone.utc)
+    await room.save()
+    return message
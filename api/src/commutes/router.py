@@ -3,21 +3,33 @@ from __future__ import annotations
 from fastapi import APIRouter, HTTPException, status
 
 from src.auth.dependencies import AuthenticatedUser
-from src.commutes.schemas import CommuteCreate, CommuteResponse, CommuteUpdate
+from src.commutes.schemas import (
+    CommuteBatchRequest,
+    CommuteBatchResponse,
+    CommuteCreate,
+    CommuteResponse,
+    CommuteUpdate,
+    OtpEndpointStats,
+    RouteGeometryFormat,
+)
 from src.commutes.service import (
     create_or_replace_commute,
     get_my_commute,
+    import_commutes_batch,
     patch_my_commute,
     pause_matching,
     set_queue_enabled,
     set_suggestions_enabled,
 )
+from src.config import settings
+from src.routing.otp_client import otp_stats
 from src.routing.service import RouteGenerationError
 
 router = APIRouter(prefix="/commutes", tags=["commutes"])
 
 
-def _to_response(commute) -> CommuteResponse:
+def _to_response(commute, geometry: RouteGeometryFormat = "coordinates") -> CommuteResponse:
+    as_polyline = geometry == "polyline"
     return CommuteResponse(
         id=str(commute.id),
         user_auth0_id=commute.user_auth0_id,
@@ -49,26 +61,32 @@ def _to_response(commute) -> CommuteResponse:
         route_segments=[
             {
                 "type": segment.type,
-                "coordinates": segment.coordinates,
+                "coordinates": None if as_polyline else segment.coordinates,
+                "polyline": segment.polyline if as_polyline else None,
                 "label": segment.label,
                 "transit_line": segment.transit_line,
                 "duration_minutes": segment.duration_minutes,
             }
             for segment in commute.route_segments
         ],
-        route_coordinates=commute.route_coordinates,
+        route_coordinates=None if as_polyline else commute.route_coordinates,
         otp_total_duration_minutes=commute.otp_total_duration_minutes,
+        route_status=commute.route_status,
+        route_error=commute.route_error,
         created_at=commute.created_at,
         updated_at=commute.updated_at,
     )
 
 
 @router.get("/me", response_model=CommuteResponse)
-async def get_me_commute(claims: AuthenticatedUser) -> CommuteResponse:
+async def get_me_commute(
+    claims: AuthenticatedUser,
+    geometry: RouteGeometryFormat = "coordinates",
+) -> CommuteResponse:
     commute = await get_my_commute(claims.user_id)
     if not commute:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Commute not found")
-    return _to_response(commute)
+    return _to_response(commute, geometry)
 
 
 @router.post("/me", response_model=CommuteResponse)
@@ -83,6 +101,23 @@ async def create_me_commute(claims: AuthenticatedUser, body: CommuteCreate) -> C
     return _to_response(commute)
 
 
+@router.post("/batch", response_model=CommuteBatchResponse)
+async def create_commutes_batch(claims: AuthenticatedUser, body: CommuteBatchRequest) -> CommuteBatchResponse:
+    if len(body.commutes) > settings.COMMUTE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.COMMUTE_BATCH_MAX_ITEMS} commutes per batch",
+        )
+    if claims.user_id not in settings.COMMUTE_BATCH_IMPORTER_IDS and any(
+        item.user_auth0_id != claims.user_id for item in body.commutes
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only commute importers may write other users' commutes",
+        )
+    return await import_commutes_batch(body.commutes)
+
+
 @router.patch("/me", response_model=CommuteResponse)
 async def patch_me_commute(claims: AuthenticatedUser, body: CommuteUpdate) -> CommuteResponse:
     try:
@@ -120,3 +155,7 @@ async def pause_me_matching(claims: AuthenticatedUser) -> CommuteResponse:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Commute not found")
     return _to_response(commute)
 
+
+@router.get("/routing/stats", response_model=list[OtpEndpointStats])
+async def get_routing_stats(claims: AuthenticatedUser) -> list[OtpEndpointStats]:
+    return [OtpEndpointStats(endpoint=endpoint, **stats) for endpoint, stats in otp_stats().items()]
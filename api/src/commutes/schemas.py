@@ -22,9 +22,14 @@ class TimeWindowPayload(BaseModel):
     end_minute: int = Field(ge=1, le=1440)
 
 
+RouteGeometryFormat = Literal["coordinates", "polyline"]
+
+
 class RouteSegmentPayload(BaseModel):
     type: Literal["walk", "transit"]
-    coordinates: list[tuple[float, float]]
+    # Exactly one of these is set, depending on the requested geometry format.
+    coordinates: list[tuple[float, float]] | None = None
+    polyline: str | None = None
     label: str | None = None
     transit_line: str | None = None
     duration_minutes: int | None = None
@@ -43,6 +48,42 @@ class CommuteCreate(BaseModel):
     queue_days_of_week: list[int] = Field(default_factory=list)
 
 
+class CommuteBatchItem(CommuteCreate):
+    user_auth0_id: str
+
+
+class CommuteBatchRequest(BaseModel):
+    commutes: list[CommuteBatchItem] = Field(min_length=1)
+
+
+class CommuteBatchItemResult(BaseModel):
+    index: int
+    user_auth0_id: str
+    status: Literal["created", "updated", "failed"]
+    commute_id: str | None = None
+    error: str | None = None
+
+
+class CommuteBatchResponse(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    routes_requested: int
+    results: list[CommuteBatchItemResult]
+
+
+class OtpEndpointStats(BaseModel):
+    endpoint: str
+    breaker_state: Literal["closed", "open", "half_open"]
+    requests: int
+    failures: int
+    error_rate: float
+    coalesced: int
+    short_circuited: int
+    latency_p50_ms: float
+    latency_p95_ms: float
+
+
 class CommuteUpdate(BaseModel):
     start: CommutePointPayload | None = None
     end: CommutePointPayload | None = None
@@ -71,8 +112,11 @@ class CommuteResponse(BaseModel):
     enable_suggestions_flow: bool
     queue_days_of_week: list[int]
     route_segments: list[RouteSegmentPayload]
-    route_coordinates: list[tuple[float, float]]
+    # Omitted in polyline format; clients join the segment polylines instead.
+    route_coordinates: list[tuple[float, float]] | None = None
     otp_total_duration_minutes: int | None = None
+    route_status: Literal["pending", "ready", "failed"] = "ready"
+    route_error: str | None = None
     created_at: datetime
     updated_at: datetime
 
@@ -1,11 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from src.commutes.schemas import CommuteCreate, CommuteUpdate
-from src.db.models.commute import Commute
+from beanie import PydanticObjectId
+from beanie.odm.operators.find.comparison import In
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from src.commutes.schemas import (
+    CommuteBatchItem,
+    CommuteBatchItemResult,
+    CommuteBatchResponse,
+    CommuteCreate,
+    CommuteUpdate,
+)
+from src.config import settings
+from src.db.models.commute import Commute, RouteAlternative, RouteSegment
 from src.db.models.match_suggestion import MatchSuggestion
-from src.routing.service import generate_route_for_commute
+from src.routing.geometry import NormalizedRouteGeometry
+from src.routing.route_cache import route_cache_key
+from src.routing.service import RouteGenerationError, generate_route_for_commute
+from src.worker import RetryingWorker
+
+logger = logging.getLogger(__name__)
 
 
 def _normalized_group_size(
@@ -60,6 +81,161 @@ async def _generate_route_geometry(
     )
 
 
+def _route_alternates(route_geometry: NormalizedRouteGeometry) -> list[RouteAlternative]:
+    return [
+        RouteAlternative(
+            route_segments=[RouteSegment.model_validate(segment) for segment in alternate.route_segments],
+            total_duration_minutes=alternate.total_duration_minutes,
+            departure_offset_minutes=alternate.departure_offset_minutes,
+        )
+        for alternate in route_geometry.alternates
+    ]
+
+
+def _route_fields(route_geometry: NormalizedRouteGeometry) -> dict:
+    return {
+        "route_segments": [
+            RouteSegment.model_validate(segment).model_dump() for segment in route_geometry.route_segments
+        ],
+        "otp_total_duration_minutes": route_geometry.total_duration_minutes,
+        "route_departure_offset_minutes": route_geometry.departure_offset_minutes,
+        "route_alternates": [alternate.model_dump() for alternate in _route_alternates(route_geometry)],
+        "route_status": "ready",
+        "route_error": None,
+    }
+
+
+def _pending_route_fields() -> dict:
+    return {
+        "route_segments": [],
+        "otp_total_duration_minutes": None,
+        "route_departure_offset_minutes": 0,
+        "route_alternates": [],
+        "route_status": "pending",
+        "route_error": None,
+    }
+
+
+def _apply_route_geometry(commute: Commute, route_geometry: NormalizedRouteGeometry | None) -> None:
+    """Store a planned route, or clear the old one and mark it pending for the worker."""
+    commute.route_request_id = uuid.uuid4().hex
+    if route_geometry is None:
+        commute.route_segments = []
+        commute.otp_total_duration_minutes = None
+        commute.route_departure_offset_minutes = 0
+        commute.route_alternates = []
+        commute.route_status = "pending"
+    else:
+        commute.route_segments = [RouteSegment.model_validate(segment) for segment in route_geometry.route_segments]
+        commute.otp_total_duration_minutes = route_geometry.total_duration_minutes
+        commute.route_departure_offset_minutes = route_geometry.departure_offset_minutes
+        commute.route_alternates = _route_alternates(route_geometry)
+        commute.route_status = "ready"
+    commute.route_error = None
+
+
+def _routes_in_background() -> bool:
+    return settings.ROUTE_GENERATION_MODE == "background"
+
+
+_ROUTE_FIELDS = {
+    "route_segments",
+    "otp_total_duration_minutes",
+    "route_departure_offset_minutes",
+    "route_alternates",
+    "route_status",
+    "route_error",
+    "route_request_id",
+}
+
+
+@dataclass(frozen=True)
+class RouteJob:
+    commute_id: str
+    route_request_id: str | None
+
+
+async def _pending_commute_for_job(job: RouteJob) -> Commute | None:
+    commute = await Commute.get(job.commute_id)
+    if not commute or commute.route_status != "pending":
+        return None
+    # The commute was edited again after this job was queued; the newer job owns it.
+    if commute.route_request_id != job.route_request_id:
+        return None
+    return commute
+
+
+async def _update_pending_route(job: RouteJob, fields: dict) -> bool:
+    result = await Commute.get_pymongo_collection().update_one(
+        {"_id": PydanticObjectId(job.commute_id), "route_status": "pending", "route_request_id": job.route_request_id},
+        {"$set": {**fields, "updated_at": datetime.now(timezone.utc)}, "$unset": {"route_coordinates": ""}},
+    )
+    return result.matched_count > 0
+
+
+async def _generate_pending_route(job: RouteJob) -> None:
+    commute = await _pending_commute_for_job(job)
+    if not commute:
+        return
+    route_geometry = await _generate_route_geometry(
+        start=commute.start,
+        end=commute.end,
+        time_window=commute.time_window,
+        transport_mode=commute.transport_mode,
+    )
+    if await _update_pending_route(job, _route_fields(route_geometry)):
+        return
+    if await _pending_commute_for_job(job):
+        # Still ours, so the write itself went missing; let the worker retry it.
+        raise RuntimeError(f"route for commute {job.commute_id} was not saved")
+    logger.info("discarding route for commute %s: it was edited or deleted meanwhile", job.commute_id)
+
+
+async def _mark_route_failed(job: RouteJob, exc: Exception) -> None:
+    commute = await _pending_commute_for_job(job)
+    if not commute:
+        return
+    await _update_pending_route(job, {"route_status": "failed", "route_error": str(exc)})
+
+
+_route_worker: RetryingWorker[RouteJob] = RetryingWorker(
+    name="route-generation",
+    handler=_generate_pending_route,
+    concurrency=settings.ROUTE_WORKER_CONCURRENCY,
+    max_attempts=settings.ROUTE_WORKER_MAX_ATTEMPTS,
+    retry_base_seconds=settings.ROUTE_WORKER_RETRY_BASE_SECONDS,
+    on_give_up=_mark_route_failed,
+)
+
+
+def _enqueue_route_job(job: RouteJob) -> None:
+    if not _route_worker.running:
+        _route_worker.start()
+    _route_worker.submit(job)
+
+
+def _enqueue_route_generation(commute: Commute) -> None:
+    _enqueue_route_job(RouteJob(commute_id=str(commute.id), route_request_id=commute.route_request_id))
+
+
+async def start_route_worker() -> None:
+    """Start the background route worker and requeue commutes left pending by a restart."""
+    if not _routes_in_background():
+        return
+    _route_worker.start()
+    try:
+        pending = await Commute.find(Commute.route_status == "pending").to_list()
+    except Exception as exc:
+        logger.warning("could not requeue pending routes: %s", exc)
+        return
+    for commute in pending:
+        _enqueue_route_generation(commute)
+
+
+async def stop_route_worker() -> None:
+    await _route_worker.stop()
+
+
 def _should_refresh_route(payload: CommuteUpdate) -> bool:
     return any(
         value is not None
@@ -79,12 +255,15 @@ async def create_or_replace_commute(auth0_id: str, payload: CommuteCreate) -> Co
         payload.group_size_pref.min,
         payload.group_size_pref.max,
     )
-    route_geometry = await _generate_route_geometry(
-        start=payload.start,
-        end=payload.end,
-        time_window=payload.time_window,
-        transport_mode=payload.transport_mode,
-    )
+    background = _routes_in_background()
+    route_geometry = None
+    if not background:
+        route_geometry = await _generate_route_geometry(
+            start=payload.start,
+            end=payload.end,
+            time_window=payload.time_window,
+            transport_mode=payload.transport_mode,
+        )
 
     if existing:
         existing.start = payload.start.model_dump()
@@ -97,11 +276,11 @@ async def create_or_replace_commute(auth0_id: str, payload: CommuteCreate) -> Co
         existing.enable_queue_flow = payload.enable_queue_flow
         existing.enable_suggestions_flow = payload.enable_suggestions_flow
         existing.queue_days_of_week = payload.queue_days_of_week
-        existing.route_segments = route_geometry.route_segments
-        existing.route_coordinates = route_geometry.route_coordinates
-        existing.otp_total_duration_minutes = route_geometry.total_duration_minutes
+        _apply_route_geometry(existing, route_geometry)
         existing.updated_at = datetime.now(timezone.utc)
         await existing.save()
+        if background:
+            _enqueue_route_generation(existing)
         return existing
 
     commute = Commute(
@@ -116,14 +295,187 @@ async def create_or_replace_commute(auth0_id: str, payload: CommuteCreate) -> Co
         enable_queue_flow=payload.enable_queue_flow,
         enable_suggestions_flow=payload.enable_suggestions_flow,
         queue_days_of_week=payload.queue_days_of_week,
-        route_segments=route_geometry.route_segments,
-        route_coordinates=route_geometry.route_coordinates,
-        otp_total_duration_minutes=route_geometry.total_duration_minutes,
     )
+    _apply_route_geometry(commute, route_geometry)
     await commute.insert()
+    if background:
+        _enqueue_route_generation(commute)
     return commute
 
 
+def _batch_route_key(item: CommuteBatchItem) -> str:
+    return route_cache_key(
+        start_lat=item.start.lat,
+        start_lng=item.start.lng,
+        end_lat=item.end.lat,
+        end_lng=item.end.lng,
+        start_minute=item.time_window.start_minute,
+        transport_mode=item.transport_mode,
+    ).as_string()
+
+
+def _batch_commute_fields(item: CommuteBatchItem, route_fields: dict) -> dict:
+    min_size, max_size = _normalized_group_size(
+        item.match_preference,
+        item.group_size_pref.min,
+        item.group_size_pref.max,
+    )
+    return {
+        "start": item.start.model_dump(),
+        "end": item.end.model_dump(),
+        "time_window": item.time_window.model_dump(),
+        "transport_mode": item.transport_mode,
+        "match_preference": item.match_preference,
+        "group_size_pref": {"min": min_size, "max": max_size},
+        "gender_preference": item.gender_preference,
+        "enable_queue_flow": item.enable_queue_flow,
+        "enable_suggestions_flow": item.enable_suggestions_flow,
+        "queue_days_of_week": item.queue_days_of_week,
+        **route_fields,
+        "route_request_id": uuid.uuid4().hex,
+    }
+
+
+async def _commute_ids_by_user(user_ids: list[str]) -> dict[str, str]:
+    if not user_ids:
+        return {}
+    commutes = await Commute.find(In(Commute.user_auth0_id, user_ids)).to_list()
+    return {commute.user_auth0_id: str(commute.id) for commute in commutes}
+
+
+async def import_commutes_batch(items: list[CommuteBatchItem]) -> CommuteBatchResponse:
+    """Create or replace many users' commutes in one pass.
+
+    Items with the same snapped endpoints, mode and departure slot share one OTP call,
+    route calls run with bounded concurrency, and the commutes are written with a single
+    unordered bulk upsert keyed by user. When a user appears more than once the last
+    item wins and the earlier ones are reported as failed. In background route mode no
+    OTP call is made here: the commutes are written as pending and each one is queued on
+    the route worker, so routes_requested is 0.
+    """
+    background = _routes_in_background()
+    results: list[CommuteBatchItemResult | None] = [None] * len(items)
+    last_index_by_user = {item.user_auth0_id: index for index, item in enumerate(items)}
+    route_keys: dict[int, str] = {}
+    unique_routes: dict[str, CommuteBatchItem] = {}
+    for index, item in enumerate(items):
+        if last_index_by_user[item.user_auth0_id] != index:
+            results[index] = CommuteBatchItemResult(
+                index=index,
+                user_auth0_id=item.user_auth0_id,
+                status="failed",
+                error=f"Superseded by item {last_index_by_user[item.user_auth0_id]}",
+            )
+            continue
+        key = _batch_route_key(item)
+        route_keys[index] = key
+        if not background:
+            unique_routes.setdefault(key, item)
+
+    semaphore = asyncio.Semaphore(max(1, settings.COMMUTE_BATCH_ROUTE_CONCURRENCY))
+
+    async def _route(item: CommuteBatchItem) -> NormalizedRouteGeometry:
+        async with semaphore:
+            return await _generate_route_geometry(
+                start=item.start,
+                end=item.end,
+                time_window=item.time_window,
+                transport_mode=item.transport_mode,
+            )
+
+    outcomes = await asyncio.gather(
+        *(_route(item) for item in unique_routes.values()),
+        return_exceptions=True,
+    )
+    routes = dict(zip(unique_routes, outcomes))
+
+    now = datetime.now(timezone.utc)
+    operations: list[UpdateOne] = []
+    operation_items: list[int] = []
+    operation_fields: list[dict] = []
+    for index, key in route_keys.items():
+        item = items[index]
+        if background:
+            route_fields = _pending_route_fields()
+        else:
+            outcome = routes[key]
+            if isinstance(outcome, NormalizedRouteGeometry):
+                route_fields = _route_fields(outcome)
+            elif isinstance(outcome, Exception):
+                if not isinstance(outcome, RouteGenerationError):
+                    logger.warning("batch route for item %s failed unexpectedly: %r", index, outcome)
+                results[index] = CommuteBatchItemResult(
+                    index=index,
+                    user_auth0_id=item.user_auth0_id,
+                    status="failed",
+                    error=f"Route generation failed: {outcome}",
+                )
+                continue
+            else:
+                # Cancellation and other BaseExceptions are not per-item failures.
+                raise outcome
+        fields = _batch_commute_fields(item, route_fields)
+        operations.append(
+            UpdateOne(
+                {"user_auth0_id": item.user_auth0_id},
+                {
+                    "$set": {**fields, "updated_at": now},
+                    "$setOnInsert": {"user_auth0_id": item.user_auth0_id, "status": "paused", "created_at": now},
+                    "$unset": {"route_coordinates": ""},
+                },
+                upsert=True,
+            )
+        )
+        operation_items.append(index)
+        operation_fields.append(fields)
+
+    upserted: set[int] = set()
+    write_errors: dict[int, str] = {}
+    if operations:
+        try:
+            write_result = await Commute.get_pymongo_collection().bulk_write(operations, ordered=False)
+            upserted = set(write_result.upserted_ids)
+        except BulkWriteError as exc:
+            upserted = {entry["index"] for entry in exc.details.get("upserted", [])}
+            write_errors = {entry["index"]: entry.get("errmsg", "write failed") for entry in exc.details.get("writeErrors", [])}
+
+    written_users = [
+        items[index].user_auth0_id
+        for position, index in enumerate(operation_items)
+        if position not in write_errors
+    ]
+    commute_ids = await _commute_ids_by_user(written_users)
+    for position, index in enumerate(operation_items):
+        item = items[index]
+        if position in write_errors:
+            results[index] = CommuteBatchItemResult(
+                index=index,
+                user_auth0_id=item.user_auth0_id,
+                status="failed",
+                error=write_errors[position],
+            )
+            continue
+        commute_id = commute_ids.get(item.user_auth0_id)
+        if background and commute_id:
+            route_request_id = operation_fields[position]["route_request_id"]
+            _enqueue_route_job(RouteJob(commute_id=commute_id, route_request_id=route_request_id))
+        results[index] = CommuteBatchItemResult(
+            index=index,
+            user_auth0_id=item.user_auth0_id,
+            status="created" if position in upserted else "updated",
+            commute_id=commute_id,
+        )
+
+    final_results = [result for result in results if result is not None]
+    return CommuteBatchResponse(
+        created=sum(1 for result in final_results if result.status == "created"),
+        updated=sum(1 for result in final_results if result.status == "updated"),
+        failed=sum(1 for result in final_results if result.status == "failed"),
+        routes_requested=len(unique_routes),
+        results=final_results,
+    )
+
+
 async def patch_my_commute(auth0_id: str, payload: CommuteUpdate) -> Commute | None:
     commute = await get_my_commute(auth0_id)
     if not commute:
@@ -165,19 +517,26 @@ async def patch_my_commute(auth0_id: str, payload: CommuteUpdate) -> Commute | N
         )
         commute.group_size_pref = {"min": min_size, "max": max_size}
 
-    if _should_refresh_route(payload):
-        route_geometry = await _generate_route_geometry(
-            start=commute.start,
-            end=commute.end,
-            time_window=commute.time_window,
-            transport_mode=commute.transport_mode,
-        )
-        commute.route_segments = route_geometry.route_segments
-        commute.route_coordinates = route_geometry.route_coordinates
-        commute.otp_total_duration_minutes = route_geometry.total_duration_minutes
+    changed = set(payload.model_dump(exclude_none=True)) | {"group_size_pref"}
+    refresh_route = _should_refresh_route(payload)
+    background = refresh_route and _routes_in_background()
+    if refresh_route:
+        route_geometry = None
+        if not background:
+            route_geometry = await _generate_route_geometry(
+                start=commute.start,
+                end=commute.end,
+                time_window=commute.time_window,
+                transport_mode=commute.transport_mode,
+            )
+        _apply_route_geometry(commute, route_geometry)
+        changed |= _ROUTE_FIELDS
 
     commute.updated_at = datetime.now(timezone.utc)
-    await commute.save()
+    # Only the edited fields are written, so a route the worker saves meanwhile survives.
+    await commute.set({name: getattr(commute, name) for name in changed | {"updated_at"}})
+    if background:
+        _enqueue_route_generation(commute)
     return commute
 
 
@@ -191,15 +550,14 @@ async def set_queue_enabled(auth0_id: str, enabled: bool) -> Commute | None:
         ).to_list()
         has_active_match = any(auth0_id in match.participants for match in active_matches)
         if has_active_match:
-            commute.enable_queue_flow = False
-            commute.status = "paused"
-            commute.updated_at = datetime.now(timezone.utc)
-            await commute.save()
-            return commute
-    commute.enable_queue_flow = enabled
-    commute.status = "queued" if enabled else "paused"
-    commute.updated_at = datetime.now(timezone.utc)
-    await commute.save()
+            enabled = False
+    await commute.set(
+        {
+            "enable_queue_flow": enabled,
+            "status": "queued" if enabled else "paused",
+            "updated_at": datetime.now(timezone.utc),
+        },
+    )
     return commute
 
 
@@ -207,10 +565,13 @@ async def set_suggestions_enabled(auth0_id: str, enabled: bool) -> Commute | Non
     commute = await get_my_commute(auth0_id)
     if not commute:
         return None
-    commute.enable_suggestions_flow = enabled
-    commute.status = "queued" if enabled else "paused"
-    commute.updated_at = datetime.now(timezone.utc)
-    await commute.save()
+    await commute.set(
+        {
+            "enable_suggestions_flow": enabled,
+            "status": "queued" if enabled else "paused",
+            "updated_at": datetime.now(timezone.utc),
+        },
+    )
     return commute
 
 
@@ -218,8 +579,5 @@ async def pause_matching(auth0_id: str) -> Commute | None:
     commute = await get_my_commute(auth0_id)
     if not commute:
         return None
-    commute.status = "paused"
-    commute.updated_at = datetime.now(timezone.utc)
-    await commute.save()
+    await commute.set({"status": "paused", "updated_at": datetime.now(timezone.utc)})
     return commute
-
@@ -1,10 +1,13 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 API_DIR = Path(__file__).resolve().parent.parent
 REPO_ROOT = API_DIR.parent
 
+MongoReadPreference = Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"]
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -17,12 +20,90 @@ class Settings(BaseSettings):
     AUTH0_AUDIENCE: str | None = None
     AUTH0_MGMT_CLIENT_ID: str | None = None
     AUTH0_MGMT_CLIENT_SECRET: str | None = None
+    # Verified Bearer tokens are reused until exp, capped at this many seconds.
+    AUTH_TOKEN_CACHE_MAX_SECONDS: float = 300.0
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10_000
+    AUTH_JWKS_REFRESH_SECONDS: float = 300.0
+    AUTH0_MGMT_TOKEN_REFRESH_MARGIN_SECONDS: float = 60.0
+    AUTH0_DELETION_WORKER_CONCURRENCY: int = 2
+    AUTH0_DELETION_MAX_ATTEMPTS: int = 5
+    AUTH0_DELETION_RETRY_BASE_SECONDS: float = 5.0
+    # Profiles shared across requests; a write in another process shows up after the TTL.
+    USER_PROFILE_CACHE_TTL_SECONDS: float = 30.0
+    USER_PROFILE_CACHE_MAX_ENTRIES: int = 4096
     MONGO_URI: str
+    # Driver pool and timeouts; None leaves the driver default. Options in MONGO_URI still apply.
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int | None = None
+    MONGO_CONNECT_TIMEOUT_MS: int = 10_000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10_000
+    MONGO_SOCKET_TIMEOUT_MS: int | None = None
+    # Wire compression in preference order, e.g. ["zstd", "snappy"]; each needs its Python package.
+    MONGO_COMPRESSORS: list[str] = []
+    MONGO_READ_PREFERENCE: MongoReadPreference = "primary"
+    # List endpoints (chat rooms and messages, match lists) can read from secondaries, at the cost
+    # of replication lag: a write made moments ago may not be listed yet.
+    MONGO_LIST_READ_PREFERENCE: MongoReadPreference = "primary"
     GEMINI_API_KEY: str
     DEV_AUTH_BYPASS: bool = False
     DEV_AUTH_DEFAULT_USER_ID: str = "auth0|demo_you"
     OTP_BASE_URL: str | None = None
     OTP_GRAPHQL_PATH: str = "/otp/routers/default/index/graphql"
     OTP_TIMEOUT_SECONDS: float = 15.0
+    OTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OTP_MAX_CONNECTIONS: int = 20
+    OTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    OTP_BREAKER_FAILURE_THRESHOLD: int = 5
+    OTP_BREAKER_RESET_SECONDS: float = 30.0
+    # Transit routes ask OTP for several itineraries at each offset from the commute start,
+    # all in one request; distinct ones are kept as alternates for matching.
+    OTP_NUM_ITINERARIES: int = 3
+    OTP_DEPARTURE_OFFSETS_MINUTES: list[int] = [0, 10]
+    ROUTE_MAX_ALTERNATES: int = 3
+    GTFS_FEED_PATH: Path = REPO_ROOT / "otp" / "mbta.gtfs.zip"
+    # Stop/line index used to compare transit legs by shared stops instead of geometry.
+    TRANSIT_INDEX_ENABLED: bool = True
+    TRANSIT_INDEX_CACHE_DIR: Path = API_DIR / ".cache"
+    # Overrides matching/config.yaml (e.g. a mounted config map); edits apply without a restart.
+    MATCHING_CONFIG_PATH: Path | None = None
+    MATCHING_SETTINGS_CHECK_SECONDS: float = 5.0
+    ROUTE_CACHE_ENABLED: bool = True
+    ROUTE_CACHE_GRID_DEGREES: float = 0.001
+    ROUTE_CACHE_SLOT_MINUTES: int = 15
+    ROUTE_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    ROUTE_CACHE_MAX_ENTRIES: int = 2048
+    ROUTE_CACHE_FEED_VERSION: str | None = None
+    # "background" saves commutes immediately and plans their routes on a worker queue.
+    ROUTE_GENERATION_MODE: Literal["sync", "background"] = "sync"
+    ROUTE_WORKER_CONCURRENCY: int = 4
+    ROUTE_WORKER_MAX_ATTEMPTS: int = 4
+    ROUTE_WORKER_RETRY_BASE_SECONDS: float = 2.0
+    # In-process walking router over the OSM extract: "prefer" answers walk commutes locally,
+    # "fallback" only when OTP fails or is not configured.
+    WALK_ROUTER_MODE: Literal["off", "fallback", "prefer"] = "off"
+    WALK_GRAPH_PATH: Path = API_DIR / ".cache" / "walk_graph.bin"
+    OSM_EXTRACT_PATH: Path = REPO_ROOT / "otp" / "mass.osm.pbf"
+    WALK_SPEED_METERS_PER_SECOND: float = 1.33
+    WALK_SNAP_MAX_METERS: float = 400.0
+    COMMUTE_BATCH_MAX_ITEMS: int = 500
+    COMMUTE_BATCH_ROUTE_CONCURRENCY: int = 8
+    # Token subjects (e.g. an Auth0 M2M client "<id>@clients") allowed to import commutes for
+    # other users. Everyone else may only include their own commute in a batch.
+    COMMUTE_BATCH_IMPORTER_IDS: list[str] = []
+    INTRO_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    INTRO_CACHE_MAX_ENTRIES: int = 512
+    INTRO_BATCH_CONCURRENCY: int = 8
+    INTRO_BATCH_MAX_ATTEMPTS: int = 3
+    INTRO_BATCH_RETRY_BASE_SECONDS: float = 1.0
+    # Serves Prometheus metrics at /metrics; keep that path off the public load balancer.
+    METRICS_ENABLED: bool = True
+    # Readiness probes: each dependency gets this long, and one result serves polls for a few seconds.
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 2.0
+    HEALTH_CHECK_CACHE_SECONDS: float = 5.0
+    HEALTH_CHECK_GEMINI: bool = False
+    # Failing these makes /api/health/ready return 503; the others only mark the instance degraded.
+    HEALTH_REQUIRED_CHECKS: list[str] = ["mongo"]
 
 settings = Settings()
\ No newline at end of file
@@ -11,6 +11,8 @@ class ChatRoom(Document):
     match_id: str
     participants: list[str]
     type: Literal["dm", "group"]
+    # Set when the introduction is claimed; the conditional $set keeps it to one post per room.
+    intro_posted_at: datetime | None = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -4,7 +4,10 @@ from datetime import datetime, timezone
 from typing import Literal
 
 from beanie import Document
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+
+from src.routing.geometry import flatten_segment_coordinates, legacy_route_segments
+from src.routing.polyline import decode_polyline, encode_polyline
 
 
 class CommutePoint(BaseModel):
@@ -25,10 +28,53 @@ class TimeWindow(BaseModel):
 
 class RouteSegment(BaseModel):
     type: Literal["walk", "transit"]
-    coordinates: list[tuple[float, float]]
+    polyline: str = ""
     label: str | None = None
     transit_line: str | None = None
     duration_minutes: int | None = None
+    # (polyline, coordinates) of the last decode; a new polyline invalidates it.
+    _decoded: tuple[str, list[tuple[float, float]]] | None = PrivateAttr(default=None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def encode_coordinates(cls, data: object) -> object:
+        # Routes arrive (and older documents are stored) as coordinate lists.
+        if isinstance(data, dict) and "coordinates" in data:
+            data = dict(data)
+            coordinates = data.pop("coordinates") or []
+            data.setdefault("polyline", encode_polyline(coordinates))
+        return data
+
+    @property
+    def coordinates(self) -> list[tuple[float, float]]:
+        """Decoded once per polyline value; treat the returned list as read-only."""
+        if self._decoded is None or self._decoded[0] != self.polyline:
+            self._decoded = (self.polyline, decode_polyline(self.polyline))
+        return self._decoded[1]
+
+
+def _flattened_route(owner: RouteAlternative | Commute) -> list[tuple[float, float]]:
+    # Keyed on the segments' polylines so replacing or editing a segment rebuilds it.
+    key = tuple(segment.polyline for segment in owner.route_segments)
+    cached = owner._flattened
+    if cached is None or cached[0] != key:
+        cached = (key, flatten_segment_coordinates(segment.coordinates for segment in owner.route_segments))
+        owner._flattened = cached
+    return cached[1]
+
+
+class RouteAlternative(BaseModel):
+    """Another itinerary OTP offered for the commute; matching may use it instead of the main route."""
+
+    route_segments: list[RouteSegment] = Field(default_factory=list)
+    total_duration_minutes: int | None = None
+    # Minutes after the commute's start_minute that this itinerary departs.
+    departure_offset_minutes: int = 0
+    _flattened: tuple[tuple[str, ...], list[tuple[float, float]]] | None = PrivateAttr(default=None)
+
+    @property
+    def route_coordinates(self) -> list[tuple[float, float]]:
+        return _flattened_route(self)
 
 
 class Commute(Document):
@@ -45,10 +91,33 @@ class Commute(Document):
     enable_suggestions_flow: bool = True
     queue_days_of_week: list[int] = Field(default_factory=list)
     route_segments: list[RouteSegment] = Field(default_factory=list)
-    route_coordinates: list[tuple[float, float]] = Field(default_factory=list)
     otp_total_duration_minutes: int | None = None
+    route_departure_offset_minutes: int = 0
+    route_alternates: list[RouteAlternative] = Field(default_factory=list)
+    route_status: Literal["pending", "ready", "failed"] = "ready"
+    route_error: str | None = None
+    # Changes only when a commute edit asks for a new route; background route jobs write their
+    # result only while it still matches, so unrelated updates cannot strand or clobber a route.
+    route_request_id: str | None = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    _flattened: tuple[tuple[str, ...], list[tuple[float, float]]] | None = PrivateAttr(default=None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def upgrade_legacy_route(cls, data: object) -> object:
+        # Documents not yet rewritten by scripts/migrate_route_polylines.py may only have the
+        # old flat route_coordinates array; read it as a single segment.
+        if isinstance(data, dict) and "route_coordinates" in data:
+            data = dict(data)
+            legacy = data.pop("route_coordinates") or []
+            if not data.get("route_segments"):
+                data["route_segments"] = legacy_route_segments(data.get("transport_mode"), legacy)
+        return data
+
+    @property
+    def route_coordinates(self) -> list[tuple[float, float]]:
+        return _flattened_route(self)
 
     class Settings:
         name = "commutes"
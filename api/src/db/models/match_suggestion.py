@@ -26,6 +26,16 @@ class ParticipantDecision(BaseModel):
     pass_cooldown_until: datetime | None = None
 
 
+class ParticipantRoute(BaseModel):
+    """The itinerary a participant was matched on."""
+
+    auth0_id: str
+    # Index into the commute's route_alternates; None is the main route.
+    alternate_index: int | None = None
+    # Minutes after the commute's start_minute that itinerary departs.
+    departure_offset_minutes: int = 0
+
+
 class MatchSuggestion(Document):
     source: Literal["suggested", "queue_assigned"]
     kind: Literal["individual", "group"]
@@ -38,8 +48,11 @@ class MatchSuggestion(Document):
     shared_segment_end: MatchPoint
     estimated_time_minutes: int
     decisions: list[ParticipantDecision] = Field(default_factory=list)
+    participant_routes: list[ParticipantRoute] = Field(default_factory=list)
     chat_room_id: str | None = None
     commute_date: date | None = None
+    # MatchingSettings.version of the cycle that created the match.
+    settings_version: str | None = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from beanie import Document, Indexed
+from pydantic import Field
+
+
+class PendingAuth0Deletion(Document):
+    """An Auth0 identity whose app data is gone but which still exists in Auth0."""
+
+    auth0_id: Indexed(str, unique=True)
+    attempts: int = 0
+    last_error: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "pending_auth0_deletions"
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any
+
+from beanie import Document, Indexed
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class RoutePlanCacheEntry(Document):
+    key: Indexed(str, unique=True)
+    feed_version: str
+    transport_mode: str
+    # Segments carry an encoded polyline instead of coordinates; see routing.geometry.
+    route_segments: list[dict[str, Any]]
+    total_duration_minutes: int | None = None
+    departure_offset_minutes: int = 0
+    # Each holds route_segments (stored the same way), total_duration_minutes and
+    # departure_offset_minutes.
+    route_alternates: list[dict[str, Any]] = Field(default_factory=list)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime
+
+    class Settings:
+        name = "route_plan_cache"
+        indexes = [
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ]
@@ -1,21 +1,106 @@
-import pymongo  
-from pymongo import AsyncMongoClient  
-from beanie import init_beanie  
+from typing import Any, TypeVar
+
+import pymongo
+from pymongo import AsyncMongoClient
+from pymongo.read_preferences import ReadPreference
+from beanie import Document, init_beanie
+from beanie.odm.queries.find import FindMany
+from beanie.odm.utils.parsing import parse_obj
 from src.config import settings
 from src.db.models.chat_message import ChatMessage
 from src.db.models.chat_room import ChatRoom
 from src.db.models.commute import Commute
+from src.db.models.introduction_cache import IntroductionCacheEntry
 from src.db.models.match_suggestion import MatchSuggestion
+from src.db.models.pending_auth0_deletion import PendingAuth0Deletion
+from src.db.models.route_plan_cache import RoutePlanCacheEntry
 from src.db.models.user import User
+from src.metrics import MongoCommandMetrics
+
+D = TypeVar("D", bound=Document)
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+_client: AsyncMongoClient | None = None
+
+
+def _client_options() -> dict[str, Any]:
+    options: dict[str, Any] = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+    }
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return {name: value for name, value in options.items() if value is not None}
+
 
 async def init_db():
+    """Connect and register the document models; the client lives until close_db()."""
+    global _client
+    if _client is not None:
+        return
     client = AsyncMongoClient(
         settings.MONGO_URI,
-        server_api=pymongo.server_api.ServerApi(version="1")
+        server_api=pymongo.server_api.ServerApi(version="1"),
+        event_listeners=[MongoCommandMetrics()] if settings.METRICS_ENABLED else [],
+        **_client_options(),
     )
     db = client.get_database("commutebuddy")
 
-    await init_beanie(
-        database=db,
-        document_models=[User, Commute, MatchSuggestion, ChatRoom, ChatMessage],
-    )
\ No newline at end of file
+    try:
+        await init_beanie(
+            database=db,
+            document_models=[
+                User,
+                Commute,
+                MatchSuggestion,
+                ChatRoom,
+                ChatMessage,
+                IntroductionCacheEntry,
+                RoutePlanCacheEntry,
+                PendingAuth0Deletion,
+            ],
+        )
+    except Exception:
+        await client.close()
+        raise
+    _client = client
+
+
+async def close_db() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close()
+
+
+async def find_for_list(query: FindMany[D]) -> list[D]:
+    """Run a Beanie find with MONGO_LIST_READ_PREFERENCE instead of the client default.
+
+    Beanie has no per-query read preference, so the query's filter, sort, skip and limit are
+    replayed on the raw collection. Projections are not supported.
+    """
+    if settings.MONGO_LIST_READ_PREFERENCE == settings.MONGO_READ_PREFERENCE:
+        return await query.to_list()
+    model = query.document_model
+    collection = model.get_pymongo_collection().with_options(
+        read_preference=_READ_PREFERENCES[settings.MONGO_LIST_READ_PREFERENCE]
+    )
+    cursor = collection.find(
+        query.get_filter_query(),
+        sort=query.sort_expressions or None,
+        skip=query.skip_number,
+        limit=query.limit_number,
+    )
+    return [parse_obj(model, document) async for document in cursor]
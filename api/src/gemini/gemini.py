@@ -1,15 +1,22 @@
 import logging
 
 from ..config import settings
-from google import genai
-from google.genai import types
-from typing import List, Dict, Optional
+from ..metrics import track_gemini
+from typing import AsyncIterator, List, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the introduction prompt or system instruction changes so cached
+# introductions generated from the old wording are not served.
+INTRODUCTION_PROMPT_VERSION = "1"
+QUESTIONS_FALLBACK = "What's something you've been meaning to try lately?"
+
 
 class GeminiClient:
     def __init__(self):
+        # google.genai takes about a second to import; keep it off the app's startup path.
+        from google import genai
+
         self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
         self.system_instruction = """
 You are a bubbly and lively friend who is outgoing and kind. 
@@ -19,29 +26,72 @@ If the conversation gets dry, you should automatically pick that up and offer en
 Always maintain your friendly, enthusiastic, and welcoming personality.
 """
 
-    def generate_initial_introduction(self, users: List[Dict]) -> str:
-        """
-        Generates an initial summary and introduction for mutuals.
-        Expected user dict format: {"name": str, "interests": list[str], "occupation": str}
-        """
+    async def ping(self) -> None:
+        """Look up the model's metadata; confirms the key and endpoint without spending tokens."""
+        with track_gemini("ping"):
+            await self.client.aio.models.get(model="gemini-2.5-flash")
+
+    def _config(self):
+        from google.genai import types
+
+        return types.GenerateContentConfig(system_instruction=self.system_instruction)
+
+    def _introduction_prompt(self, users: List[Dict]) -> str:
         users_info = []
         for u in users:
             interests = ", ".join(u.get("interests", []))
             info = f"Name: {u.get('name')}, Occupation: {u.get('occupation')}, Interests: {interests}"
             users_info.append(info)
+        return "Please introduce these mutual friends to each other and highlight what they have in common: \n\n" + "\n".join(users_info)
+
+    def _questions_prompt(self, messages: List[Dict]) -> str:
+        chat_history = "\n".join([f"{m.get('name', m['role'])}: {m['content']}" for m in messages])
+        return f"""
+        Based on this conversation:
+        {chat_history}
+
+        Write ONE brief question (1–2 short sentences max) that a participant could ask the other(s) to keep the conversation going.
+        Write it as if YOU are directly asking them—e.g. "What's your favorite spot in the city?"—not as a moderator or third party.
+        Do NOT phrase it as "You could ask..." or address both people at once. Keep it short and natural.
+        """
+
+    def _generate(self, prompt: str, operation: str):
+        with track_gemini(operation):
+            return self.client.models.generate_content(
+                model="gemini-2.5-flash",
+                config=self._config(),
+                contents=prompt,
+            )
+
+    async def _stream_text(self, prompt: str, operation: str) -> AsyncIterator[str]:
+        with track_gemini(operation):
+            stream = await self.client.aio.models.generate_content_stream(
+                model="gemini-2.5-flash",
+                config=self._config(),
+                contents=prompt,
+            )
+            async for chunk in stream:
+                text = getattr(chunk, "text", None)
+                if text:
+                    yield text
+
+    def generate_initial_introduction(self, users: List[Dict]) -> str:
+        """
+        Generates an initial summary and introduction for mutuals.
+        Expected user dict format: {"name": str, "interests": list[str], "occupation": str}
+        """
+        prompt = self._introduction_prompt(users)
         
-        prompt = "Please introduce these mutual friends to each other and highlight what they have in common: \n\n" + "\n".join(users_info)
-        
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            config=types.GenerateContentConfig(
-                system_instruction=self.system_instruction,
-            ),
-            contents=prompt,
-        )
+        response = self._generate(prompt, "introduction")
         text = getattr(response, "text", None) if response else None
         return (text or "").strip() or ""
 
+    def stream_initial_introduction(self, users: List[Dict]) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_initial_introduction; yields text chunks as Gemini produces them.
+        """
+        return self._stream_text(self._introduction_prompt(users), "introduction_stream")
+
     def get_chat_continuation(self, messages: List[Dict]) -> Optional[str]:
         """
         Analyzes the conversation history. If it feels dry or stalled, 
@@ -60,13 +110,7 @@ Always maintain your friendly, enthusiastic, and welcoming personality.
         """
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_instruction,
-                ),
-                contents=prompt,
-            )
+            response = self._generate(prompt, "continuation")
             text = (getattr(response, "text", None) or "").strip()
         except Exception:
             return None
@@ -80,32 +124,24 @@ Always maintain your friendly, enthusiastic, and welcoming personality.
         Output is framed as the sender directly addressing the recipient(s), not as an intermediary.
         Returns a generic icebreaker only when the conversation is empty or the model fails.
         """
-        fallback = "What's something you've been meaning to try lately?"
+        fallback = QUESTIONS_FALLBACK
         if not messages:
             logger.info("generate_new_questions: no messages, returning fallback")
             return fallback
 
-        chat_history = "\n".join([f"{m.get('name', m['role'])}: {m['content']}" for m in messages])
-        prompt = f"""
-        Based on this conversation:
-        {chat_history}
-
-        Write ONE brief question (1–2 short sentences max) that a participant could ask the other(s) to keep the conversation going.
-        Write it as if YOU are directly asking them—e.g. "What's your favorite spot in the city?"—not as a moderator or third party.
-        Do NOT phrase it as "You could ask..." or address both people at once. Keep it short and natural.
-        """
+        prompt = self._questions_prompt(messages)
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_instruction,
-                ),
-                contents=prompt,
-            )
+            response = self._generate(prompt, "questions")
             text = getattr(response, "text", None) if response else None
             if text and isinstance(text, str) and text.strip():
                 return text.strip()
             logger.warning("generate_new_questions: Gemini returned empty or no text (response=%s)", type(response).__name__)
         except Exception as e:
             logger.exception("generate_new_questions: Gemini call failed: %s", e)
-        return fallback
\ No newline at end of file
+        return fallback
+
+    def stream_new_questions(self, messages: List[Dict]) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_new_questions. Callers handle the empty-conversation fallback.
+        """
+        return self._stream_text(self._questions_prompt(messages), "questions_stream")
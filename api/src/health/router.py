@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+
+from fastapi import APIRouter, Response, status
+
+from src.health.schemas import DependencyCheckResponse, HealthResponse, LivenessResponse, ReadinessResponse
+from src.health.service import readiness_probe, startup_timings, uptime_seconds
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("", response_model=HealthResponse)
+def health() -> HealthResponse:
+    """No auth. Use this to confirm the API is up."""
+    return HealthResponse(status="ok", startup=startup_timings)
+
+
+@router.get("/live", response_model=LivenessResponse)
+def liveness() -> LivenessResponse:
+    """The process is serving requests; does not look at any dependency."""
+    return LivenessResponse(status="ok", uptime_seconds=uptime_seconds())
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness(response: Response) -> ReadinessResponse:
+    """Dependency checks with latencies; 503 while a required dependency is failing."""
+    report = await readiness_probe.check()
+    if report.status == "unavailable":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessResponse(
+        status=report.status,
+        checked_at=report.checked_at,
+        checks={name: DependencyCheckResponse(**asdict(result)) for name, result in report.checks.items()},
+    )
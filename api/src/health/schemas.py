@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class HealthResponse(BaseModel):
+    status: Literal["ok"]
+    startup: dict[str, float]
+
+
+class LivenessResponse(BaseModel):
+    status: Literal["ok"]
+    uptime_seconds: float
+
+
+class DependencyCheckResponse(BaseModel):
+    status: Literal["ok", "failed", "skipped"]
+    required: bool
+    latency_ms: float | None
+    detail: str | None
+
+
+class ReadinessResponse(BaseModel):
+    status: Literal["ok", "degraded", "unavailable"]
+    checked_at: datetime
+    checks: dict[str, DependencyCheckResponse]
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Literal
+
+from src.config import settings
+from src.db.models.user import User
+from src.routing.service import get_otp_client
+
+logger = logging.getLogger(__name__)
+
+CheckStatus = Literal["ok", "failed", "skipped"]
+ReadinessStatus = Literal["ok", "degraded", "unavailable"]
+
+# Filled in by the app lifespan: import and ready times, in seconds.
+startup_timings: dict[str, float] = {}
+
+_process_started = time.monotonic()
+
+
+def uptime_seconds() -> float:
+    return round(time.monotonic() - _process_started, 1)
+
+
+@dataclass(frozen=True)
+class CheckResult:
+    status: CheckStatus
+    required: bool
+    latency_ms: float | None = None
+    detail: str | None = None
+
+
+@dataclass(frozen=True)
+class ReadinessReport:
+    status: ReadinessStatus
+    checked_at: datetime
+    checks: dict[str, CheckResult]
+
+
+async def _ping_mongo() -> None:
+    # Raises before init_beanie has run, so a failed startup connection reads as not ready.
+    await User.get_pymongo_collection().database.command("ping")
+
+
+async def _ping_otp() -> None:
+    await get_otp_client().ping()
+
+
+async def _ping_gemini() -> None:
+    from src.gemini.gemini import GeminiClient
+
+    await GeminiClient().ping()
+
+
+def _enabled_probes() -> dict[str, Callable[[], Awaitable[None]] | None]:
+    """Probe per dependency; None means the dependency is not configured here."""
+    return {
+        "mongo": _ping_mongo,
+        "otp": _ping_otp if settings.OTP_BASE_URL else None,
+        "gemini": _ping_gemini if settings.HEALTH_CHECK_GEMINI else None,
+    }
+
+
+async def _run_check(
+    name: str,
+    probe: Callable[[], Awaitable[None]] | None,
+    *,
+    timeout_seconds: float,
+) -> CheckResult:
+    required = name in settings.HEALTH_REQUIRED_CHECKS
+    if probe is None:
+        return CheckResult(status="skipped", required=required)
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(probe(), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        status, detail = "failed", f"timed out after {timeout_seconds:g}s"
+    except Exception as exc:
+        status, detail = "failed", f"{type(exc).__name__}: {exc}"[:300]
+    else:
+        status, detail = "ok", None
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    if status == "failed":
+        logger.warning("Health check %s failed after %.0f ms: %s", name, latency_ms, detail)
+    return CheckResult(status=status, required=required, latency_ms=latency_ms, detail=detail)
+
+
+class ReadinessProbe:
+    """Runs every dependency check concurrently and reuses the report for cache_seconds.
+
+    Concurrent polls while a check is running wait for that check instead of starting another.
+    """
+
+    def __init__(
+        self,
+        *,
+        cache_seconds: float,
+        timeout_seconds: float,
+        probes: Callable[[], dict[str, Callable[[], Awaitable[None]] | None]] = _enabled_probes,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.cache_seconds = cache_seconds
+        self.timeout_seconds = timeout_seconds
+        self._probes = probes
+        self._clock = clock
+        self._report: ReadinessReport | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._report is not None and self._clock() - self._checked_at < self.cache_seconds
+
+    async def check(self) -> ReadinessReport:
+        if self._fresh():
+            return self._report
+        async with self._lock:
+            if not self._fresh():
+                self._report = await self._run()
+                self._checked_at = self._clock()
+            return self._report
+
+    async def _run(self) -> ReadinessReport:
+        probes = self._probes()
+        results = await asyncio.gather(
+            *(_run_check(name, probe, timeout_seconds=self.timeout_seconds) for name, probe in probes.items())
+        )
+        checks = dict(zip(probes, results))
+        failed = [result for result in checks.values() if result.status == "failed"]
+        if any(result.required for result in failed):
+            status: ReadinessStatus = "unavailable"
+        elif failed:
+            status = "degraded"
+        else:
+            status = "ok"
+        return ReadinessReport(status=status, checked_at=datetime.now(timezone.utc), checks=checks)
+
+
+readiness_probe = ReadinessProbe(
+    cache_seconds=settings.HEALTH_CHECK_CACHE_SECONDS,
+    timeout_seconds=settings.HEALTH_CHECK_TIMEOUT_SECONDS,
+)
@@ -1,17 +1,33 @@
 import logging
+import time
 from contextlib import asynccontextmanager
 
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.db.mongodb import init_db
+from src.auth.dependencies import start_jwks_refresh, stop_jwks_refresh
+from src.commutes.service import start_route_worker, stop_route_worker
+from src.config import settings
+from src.db.mongodb import close_db, init_db
+from src.health.service import startup_timings
+from src.metrics import MetricsMiddleware, metrics_endpoint
+from src.routing.gtfs_index import init_transit_index
+from src.routing.local_walk import init_walk_router
+from src.routing.service import close_otp_client, init_otp_client
+from src.users.auth0_management import start_auth0_deletion_worker, stop_auth0_deletion_worker
 from src.chat.router import router as chat_router
 from src.commutes.router import router as commutes_router
+from src.health.router import router as health_router
 from src.matching.router import router as matching_router
 from src.users.router import router as users_router
 
 logger = logging.getLogger(__name__)
 
+# Seconds spent importing the app, and from then until the lifespan finished starting up.
+startup_timings["import_seconds"] = round(time.perf_counter() - _import_started, 3)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -19,10 +35,23 @@ async def lifespan(app: FastAPI):
         await init_db()
         logger.info("MongoDB connected")
     except Exception as e:
-        logger.warning("MongoDB init failed (app will start; /api/users/* will fail): %s", e)
+        logger.warning("MongoDB init failed (app will start; /api/health/ready reports 503): %s", e)
         # Python 3.13 + Atlas often has SSL handshake errors; use Python 3.11 or 3.12 for the API venv
+    await start_jwks_refresh()
+    await init_otp_client()
+    await init_walk_router()
+    await init_transit_index()
+    await start_route_worker()
+    await start_auth0_deletion_worker()
+    startup_timings["ready_seconds"] = round(time.perf_counter() - _import_started, 3)
+    logger.info("Startup finished in %.3fs (imports %.3fs)", startup_timings["ready_seconds"], startup_timings["import_seconds"])
     yield
-    # shutdown: close DB connections if needed
+    await stop_route_worker()
+    await stop_auth0_deletion_worker()
+    await close_otp_client()
+    await stop_jwks_refresh()
+    # Last, so the workers above can finish their writes.
+    await close_db()
 
 
 app = FastAPI(title="Flock API", version="1.0.0", lifespan=lifespan)
@@ -41,16 +70,15 @@ app.add_middleware(
     allow_headers=["Content-Type", "Authorization", "x-dev-auth0-id"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 app.include_router(users_router, prefix="/api", tags=["users"])
 app.include_router(commutes_router, prefix="/api", tags=["commutes"])
 app.include_router(matching_router, prefix="/api", tags=["matching"])
 app.include_router(chat_router, prefix="/api", tags=["chat"])
-
-
-@app.get("/api/health")
-def health():
-    """No auth. Use this to confirm the API is up."""
-    return {"status": "ok"}
+app.include_router(health_router, prefix="/api", tags=["health"])
 
 
 # Endpoints: GET/POST/PATCH /api/users/me require Authorization: Bearer <Auth0 access token>.
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from itertools import combinations
-from typing import Literal
+from dataclasses import dataclass, field
+from itertools import combinations, product
+from typing import TYPE_CHECKING, Literal
 
 from src.matching.geospatial import (
+    OverlapPoint,
     OverlapSegment,
     polyline_length_meters,
     route_overlap_segment,
 )
 
+if TYPE_CHECKING:
+    from src.routing.gtfs_index import TransitInterval
+
 MatchKind = Literal["individual", "group"]
 MatchPreference = Literal["individual", "group", "both"]
 TransportMode = Literal["walk", "transit"]
@@ -23,6 +27,27 @@ class MatchingUser:
     interests: list[str]
 
 
+@dataclass(frozen=True)
+class MatchingSegment:
+    type: TransportMode
+    coordinates: list[tuple[float, float]]
+    # Set for transit legs that were placed on a GTFS line pattern.
+    interval: TransitInterval | None = None
+
+
+@dataclass(frozen=True)
+class MatchingRoute:
+    route_coordinates: list[tuple[float, float]]
+    segments: tuple[MatchingSegment, ...] = ()
+
+    @property
+    def transit_resolved(self) -> bool:
+        """Every transit leg is placed on a line pattern, so legs can be compared by stops."""
+        return any(segment.type == "transit" for segment in self.segments) and all(
+            segment.interval is not None for segment in self.segments if segment.type == "transit"
+        )
+
+
 @dataclass(frozen=True)
 class MatchingCommute:
     user_auth0_id: str
@@ -34,6 +59,14 @@ class MatchingCommute:
     start_minute: int
     end_minute: int
     route_coordinates: list[tuple[float, float]]
+    segments: tuple[MatchingSegment, ...] = ()
+    # Other itineraries for the same commute; a pair is scored on its best-overlapping choice.
+    alternates: tuple[MatchingRoute, ...] = ()
+
+    @property
+    def routes(self) -> tuple[MatchingRoute, ...]:
+        """Index 0 is the main route; index i > 0 is alternates[i - 1]."""
+        return (MatchingRoute(self.route_coordinates, self.segments), *self.alternates)
 
 
 @dataclass(frozen=True)
@@ -51,6 +84,15 @@ class MatchCandidate:
     scores: PairScore
     overlap: OverlapSegment
     estimated_shared_minutes: int
+    # Index into each participant's MatchingCommute.routes that the match was scored on.
+    route_indexes: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class _RouteOption:
+    score: PairScore
+    overlap: OverlapSegment
+    estimated_shared_minutes: int
 
 
 @dataclass(frozen=True)
@@ -61,6 +103,18 @@ class _PairCompatibility:
     overlap: OverlapSegment
     transport_mode: TransportMode
     estimated_shared_minutes: int
+    # The chosen (left, right) route indexes, and every usable pairing keyed the same way.
+    route_indexes: tuple[int, int] = (0, 0)
+    options: dict[tuple[int, int], _RouteOption] = field(default_factory=dict)
+
+    def option(self, user_id: str, user_index: int, other_index: int) -> _RouteOption | None:
+        if user_id == self.left_user_id:
+            return self.options.get((user_index, other_index))
+        return self.options.get((other_index, user_index))
+
+    def route_indexes_for(self, user_id: str) -> set[int]:
+        side = 0 if user_id == self.left_user_id else 1
+        return {indexes[side] for indexes in self.options}
 
 
 def _normalized_gender(gender: str) -> str:
@@ -112,6 +166,127 @@ def _overlap_score(
     return min(1.0, overlap_distance_meters / baseline)
 
 
+def _shared_ride(left: TransitInterval, right: TransitInterval) -> OverlapSegment | None:
+    """Stops both riders are on board between, measured along the left rider's pattern."""
+    if left.line_key != right.line_key:
+        return None
+    left_pattern = left.pattern
+    right_pattern = right.pattern
+    if left_pattern is right_pattern:
+        first = max(left.board_position, right.board_position)
+        last = min(left.alight_position, right.alight_position)
+    else:
+        # Branches of one line share a trunk; intersect by stop id.
+        right_stops = set(right_pattern.stop_ids[right.board_position : right.alight_position + 1])
+        shared = [
+            position
+            for position in range(left.board_position, left.alight_position + 1)
+            if left_pattern.stop_ids[position] in right_stops
+        ]
+        if len(shared) < 2:
+            return None
+        first, last = shared[0], shared[-1]
+    if first >= last:
+        return None
+    meet_lat, meet_lng = left_pattern.stop_points[first]
+    split_lat, split_lng = left_pattern.stop_points[last]
+    return OverlapSegment(
+        meet_point=OverlapPoint(lat=meet_lat, lng=meet_lng),
+        split_point=OverlapPoint(lat=split_lat, lng=split_lng),
+        overlap_distance_meters=left_pattern.stop_offsets_meters[last] - left_pattern.stop_offsets_meters[first],
+    )
+
+
+def transit_overlap_segment(
+    left: MatchingRoute,
+    right: MatchingRoute,
+    *,
+    tolerance_meters: float,
+) -> OverlapSegment | None:
+    """Overlap of two transit commutes: rides compared by shared stops, walks by geometry."""
+    pieces: list[OverlapSegment] = []
+    for left_segment in left.segments:
+        for right_segment in right.segments:
+            if left_segment.type != right_segment.type:
+                continue
+            if left_segment.interval is not None and right_segment.interval is not None:
+                piece = _shared_ride(left_segment.interval, right_segment.interval)
+            elif left_segment.type == "walk":
+                piece = route_overlap_segment(
+                    left_segment.coordinates,
+                    right_segment.coordinates,
+                    tolerance_meters=tolerance_meters,
+                )
+            else:
+                piece = None
+            if piece:
+                pieces.append(piece)
+    if not pieces:
+        return None
+    distance = sum(piece.overlap_distance_meters for piece in pieces)
+    if distance <= 0:
+        return None
+    # Pieces are in the left rider's travel order.
+    return OverlapSegment(
+        meet_point=pieces[0].meet_point,
+        split_point=pieces[-1].split_point,
+        overlap_distance_meters=distance,
+    )
+
+
+def _route_overlap(
+    transport_mode: TransportMode,
+    left: MatchingRoute,
+    right: MatchingRoute,
+    *,
+    tolerance_meters: float,
+) -> OverlapSegment | None:
+    if transport_mode == "transit" and left.transit_resolved and right.transit_resolved:
+        return transit_overlap_segment(left, right, tolerance_meters=tolerance_meters)
+    return route_overlap_segment(
+        left.route_coordinates,
+        right.route_coordinates,
+        tolerance_meters=tolerance_meters,
+    )
+
+
+def _route_pairings(left_count: int, right_count: int, max_route_pairs: int) -> list[tuple[int, int]]:
+    """Route index pairings to compare, main routes first, capped at max_route_pairs."""
+    pairings = sorted(product(range(left_count), range(right_count)), key=lambda pair: (max(pair), pair))
+    return pairings[: max(1, max_route_pairs)]
+
+
+def _route_overlaps(
+    left: MatchingCommute,
+    right: MatchingCommute,
+    *,
+    tolerance_meters: float,
+    max_route_pairs: int,
+) -> dict[tuple[int, int], tuple[OverlapSegment, float]]:
+    """Overlap and its score for each compared pairing of the two commutes' itineraries."""
+    left_routes = left.routes
+    right_routes = right.routes
+    overlaps: dict[tuple[int, int], tuple[OverlapSegment, float]] = {}
+    for left_index, right_index in _route_pairings(len(left_routes), len(right_routes), max_route_pairs):
+        left_route = left_routes[left_index]
+        right_route = right_routes[right_index]
+        overlap = _route_overlap(
+            left.transport_mode,
+            left_route,
+            right_route,
+            tolerance_meters=tolerance_meters,
+        )
+        if not overlap:
+            continue
+        score = _overlap_score(
+            overlap.overlap_distance_meters,
+            left_route.route_coordinates,
+            right_route.route_coordinates,
+        )
+        overlaps[(left_index, right_index)] = (overlap, score)
+    return overlaps
+
+
 def _supports_group_size(commute: MatchingCommute, size: int) -> bool:
     return commute.group_size_min <= size <= commute.group_size_max
 
@@ -125,6 +300,7 @@ def _build_pair_compatibility(
     overlap_weight: float,
     interest_weight: float,
     shared_meters_per_minute: float,
+    max_route_pairs: int,
 ) -> list[_PairCompatibility]:
     compatibilities: list[_PairCompatibility] = []
     user_ids = list(users_by_id.keys())
@@ -142,39 +318,47 @@ def _build_pair_compatibility(
         if not _can_match_gender(left_user, left_commute, right_user, right_commute):
             continue
 
-        overlap = route_overlap_segment(
-            left_commute.route_coordinates,
-            right_commute.route_coordinates,
+        interest_score = _interest_score(left_user, right_user)
+        meters_per_minute = max(1.0, shared_meters_per_minute)
+        options: dict[tuple[int, int], _RouteOption] = {}
+        for indexes, (overlap, overlap_score) in _route_overlaps(
+            left_commute,
+            right_commute,
             tolerance_meters=overlap_tolerance_meters,
-        )
-        if not overlap:
-            continue
-        if overlap.overlap_distance_meters < min_overlap_distance_meters:
+            max_route_pairs=max_route_pairs,
+        ).items():
+            if overlap.overlap_distance_meters < min_overlap_distance_meters:
+                continue
+            options[indexes] = _RouteOption(
+                score=PairScore(
+                    overlap_score=overlap_score,
+                    interest_score=interest_score,
+                    composite_score=(overlap_weight * overlap_score) + (interest_weight * interest_score),
+                ),
+                overlap=overlap,
+                estimated_shared_minutes=max(1, round(overlap.overlap_distance_meters / meters_per_minute)),
+            )
+        if not options:
             continue
-
-        overlap_score = _overlap_score(
-            overlap.overlap_distance_meters,
-            left_commute.route_coordinates,
-            right_commute.route_coordinates,
-        )
-        interest_score = _interest_score(left_user, right_user)
-        composite = (overlap_weight * overlap_score) + (interest_weight * interest_score)
-        score = PairScore(
-            overlap_score=overlap_score,
-            interest_score=interest_score,
-            composite_score=composite,
+        best_indexes = max(
+            options,
+            key=lambda indexes: (
+                options[indexes].score.overlap_score,
+                options[indexes].overlap.overlap_distance_meters,
+                -sum(indexes),
+            ),
         )
-
-        meters_per_minute = max(1.0, shared_meters_per_minute)
-        estimated_minutes = max(1, round(overlap.overlap_distance_meters / meters_per_minute))
+        best = options[best_indexes]
         compatibilities.append(
             _PairCompatibility(
                 left_user_id=left_user_id,
                 right_user_id=right_user_id,
-                score=score,
-                overlap=overlap,
+                score=best.score,
+                overlap=best.overlap,
                 transport_mode=left_commute.transport_mode,
-                estimated_shared_minutes=estimated_minutes,
+                estimated_shared_minutes=best.estimated_shared_minutes,
+                route_indexes=best_indexes,
+                options=options,
             )
         )
     return compatibilities
@@ -226,6 +410,10 @@ def _build_individual_matches(
                 scores=pair.score,
                 overlap=pair.overlap,
                 estimated_shared_minutes=pair.estimated_shared_minutes,
+                route_indexes={
+                    pair.left_user_id: pair.route_indexes[0],
+                    pair.right_user_id: pair.route_indexes[1],
+                },
             )
         )
     return selected
@@ -241,24 +429,45 @@ def _is_clique(members: tuple[str, ...], pair_lookup: dict[frozenset[str], _Pair
 def _aggregate_group_score(
     members: tuple[str, ...],
     pair_lookup: dict[frozenset[str], _PairCompatibility],
-) -> tuple[PairScore, OverlapSegment, TransportMode, int]:
-    pair_scores: list[PairScore] = []
-    pair_overlaps: list[OverlapSegment] = []
-    estimated_minutes: list[int] = []
-    mode: TransportMode | None = None
-
-    for left_user_id, right_user_id in combinations(members, 2):
-        pair = pair_lookup[frozenset((left_user_id, right_user_id))]
-        pair_scores.append(pair.score)
-        pair_overlaps.append(pair.overlap)
-        estimated_minutes.append(pair.estimated_shared_minutes)
-        mode = pair.transport_mode
-
-    overlap_average = sum(score.overlap_score for score in pair_scores) / len(pair_scores)
-    interest_average = sum(score.interest_score for score in pair_scores) / len(pair_scores)
-    composite_average = sum(score.composite_score for score in pair_scores) / len(pair_scores)
-    longest_overlap = max(pair_overlaps, key=lambda overlap: overlap.overlap_distance_meters)
-    average_minutes = max(1, round(sum(estimated_minutes) / len(estimated_minutes)))
+    route_counts: dict[str, int],
+) -> tuple[PairScore, OverlapSegment, TransportMode, int, dict[str, int]] | None:
+    """Score a group with one itinerary per member, trying each assignment of itineraries.
+
+    Every pair in the group must overlap on the routes its members were assigned; returns
+    None when no assignment achieves that.
+    """
+    member_pairs = [
+        (left_user_id, right_user_id, pair_lookup[frozenset((left_user_id, right_user_id))])
+        for left_user_id, right_user_id in combinations(members, 2)
+    ]
+    mode: TransportMode = member_pairs[0][2].transport_mode
+    # A member's itinerary is only worth trying if it overlaps someone on every pair.
+    usable: dict[str, set[int]] = {member: set(range(route_counts[member])) for member in members}
+    for left_user_id, right_user_id, pair in member_pairs:
+        usable[left_user_id] &= pair.route_indexes_for(left_user_id)
+        usable[right_user_id] &= pair.route_indexes_for(right_user_id)
+    best: tuple[float, list[_RouteOption], tuple[int, ...]] | None = None
+    for assignment in product(*(sorted(usable[member]) for member in members)):
+        chosen = dict(zip(members, assignment))
+        options: list[_RouteOption] = []
+        for left_user_id, right_user_id, pair in member_pairs:
+            option = pair.option(left_user_id, chosen[left_user_id], chosen[right_user_id])
+            if option is None:
+                break
+            options.append(option)
+        else:
+            composite = sum(option.score.composite_score for option in options) / len(options)
+            # Ties go to the assignment closest to everyone's main route.
+            if best is None or (composite, -sum(assignment)) > (best[0], -sum(best[2])):
+                best = (composite, options, assignment)
+    if best is None:
+        return None
+
+    composite_average, options, assignment = best
+    overlap_average = sum(option.score.overlap_score for option in options) / len(options)
+    interest_average = sum(option.score.interest_score for option in options) / len(options)
+    longest_overlap = max((option.overlap for option in options), key=lambda overlap: overlap.overlap_distance_meters)
+    average_minutes = max(1, round(sum(option.estimated_shared_minutes for option in options) / len(options)))
 
     return (
         PairScore(
@@ -267,8 +476,9 @@ def _aggregate_group_score(
             composite_score=composite_average,
         ),
         longest_overlap,
-        mode or "walk",
+        mode,
         average_minutes,
+        dict(zip(members, assignment)),
     )
 
 
@@ -284,6 +494,7 @@ def _build_group_matches(
         for commute in commutes_by_user_id.values()
         if commute.match_preference in {"group", "both"}
     }
+    route_counts = {user_id: len(commute.routes) for user_id, commute in commutes_by_user_id.items()}
     selected: list[MatchCandidate] = []
 
     while True:
@@ -301,7 +512,10 @@ def _build_group_matches(
                     continue
                 if not _is_clique(members, pair_lookup):
                     continue
-                score, overlap, mode, estimated_minutes = _aggregate_group_score(members, pair_lookup)
+                aggregate = _aggregate_group_score(members, pair_lookup, route_counts)
+                if aggregate is None:
+                    continue
+                score, overlap, mode, estimated_minutes, route_indexes = aggregate
                 candidate = MatchCandidate(
                     participants=list(members),
                     kind="group",
@@ -309,6 +523,7 @@ def _build_group_matches(
                     scores=score,
                     overlap=overlap,
                     estimated_shared_minutes=estimated_minutes,
+                    route_indexes=route_indexes,
                 )
                 if not best_group or candidate.scores.composite_score > best_group.scores.composite_score:
                     best_group = candidate
@@ -335,6 +550,7 @@ def run_matching_algorithm(
     overlap_weight: float = 0.7,
     interest_weight: float = 0.3,
     shared_meters_per_minute: float = 80.0,
+    max_route_pairs: int = 9,
 ) -> list[MatchCandidate]:
     users_by_id = {user.auth0_id: user for user in users}
     commutes_by_user_id = {commute.user_auth0_id: commute for commute in commutes}
@@ -359,6 +575,7 @@ def run_matching_algorithm(
         overlap_weight=overlap_weight,
         interest_weight=interest_weight,
         shared_meters_per_minute=shared_meters_per_minute,
+        max_route_pairs=max_route_pairs,
     )
     if not pair_compatibilities:
         return []
@@ -2,12 +2,10 @@ from __future__ import annotations
 
 from datetime import date, timedelta
 
-from beanie.odm.operators.find.comparison import In
 from fastapi import APIRouter, HTTPException, Query, status
 
 from src.auth.dependencies import AuthenticatedUser
 from src.db.models.match_suggestion import MatchSuggestion
-from src.db.models.user import User
 from src.matching.algorithm import MatchKind
 from src.matching.schemas import MatchRunResponse, MatchSuggestionResponse
 from src.matching.service import (
@@ -18,13 +16,13 @@ from src.matching.service import (
     pass_suggestion,
     run_matching_cycle,
 )
+from src.users.loader import UserLoader, UserProfileLoader
 
 router = APIRouter(prefix="/matching", tags=["matching"])
 
 
-async def _to_response(item: MatchSuggestion) -> MatchSuggestionResponse:
-    users = await User.find(In(User.auth0_id, item.participants)).to_list()
-    users_by_auth0_id = {user.auth0_id: user for user in users}
+async def _to_response(item: MatchSuggestion, users: UserProfileLoader) -> MatchSuggestionResponse:
+    users_by_auth0_id = await users.load_many(item.participants)
 
     participant_profiles = []
     for auth0_id in item.participants:
@@ -57,6 +55,15 @@ async def _to_response(item: MatchSuggestion) -> MatchSuggestionResponse:
     return MatchSuggestionResponse.model_validate(payload)
 
 
+async def _to_responses(
+    items: list[MatchSuggestion],
+    users: UserProfileLoader,
+) -> list[MatchSuggestionResponse]:
+    # One query for every participant across the list, rather than one per item.
+    await users.load_many(user_id for item in items for user_id in item.participants)
+    return [await _to_response(item, users) for item in items]
+
+
 @router.post("/run", response_model=MatchRunResponse)
 async def run_matching(run_queue: bool = False) -> MatchRunResponse:
     result = await run_matching_cycle(run_queue=run_queue)
@@ -66,16 +73,18 @@ async def run_matching(run_queue: bool = False) -> MatchRunResponse:
 @router.get("/suggestions", response_model=list[MatchSuggestionResponse])
 async def get_suggestions(
     claims: AuthenticatedUser,
+    users: UserLoader,
     kind: MatchKind = Query(default="individual"),
 ) -> list[MatchSuggestionResponse]:
     suggestions = await list_suggestions_for_user(claims.user_id, kind)
-    return [await _to_response(item) for item in suggestions]
+    return await _to_responses(suggestions, users)
 
 
 @router.post("/suggestions/{suggestion_id}/accept", response_model=MatchSuggestionResponse)
 async def accept_match_suggestion(
     suggestion_id: str,
     claims: AuthenticatedUser,
+    users: UserLoader,
 ) -> MatchSuggestionResponse:
     suggestion = await accept_suggestion(claims.user_id, suggestion_id)
     if not suggestion:
@@ -83,13 +92,14 @@ async def accept_match_suggestion(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Suggestion not found",
         )
-    return await _to_response(suggestion)
+    return await _to_response(suggestion, users)
 
 
 @router.post("/suggestions/{suggestion_id}/pass", response_model=MatchSuggestionResponse)
 async def pass_match_suggestion(
     suggestion_id: str,
     claims: AuthenticatedUser,
+    users: UserLoader,
 ) -> MatchSuggestionResponse:
     suggestion = await pass_suggestion(claims.user_id, suggestion_id)
     if not suggestion:
@@ -97,25 +107,27 @@ async def pass_match_suggestion(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Suggestion not found",
         )
-    return await _to_response(suggestion)
+    return await _to_response(suggestion, users)
 
 
 @router.get("/active", response_model=list[MatchSuggestionResponse])
 async def get_active_matches(
     claims: AuthenticatedUser,
+    users: UserLoader,
     kind: MatchKind = Query(default="individual"),
 ) -> list[MatchSuggestionResponse]:
     matches = await list_active_for_user(claims.user_id, kind)
-    return [await _to_response(item) for item in matches]
+    return await _to_responses(matches, users)
 
 
 @router.get("/assignments", response_model=list[MatchSuggestionResponse])
 async def get_assignments(
     claims: AuthenticatedUser,
+    users: UserLoader,
     kind: MatchKind = Query(default="individual"),
     for_date: date | None = Query(default=None, alias="date"),
 ) -> list[MatchSuggestionResponse]:
     commute_date = for_date or (date.today() + timedelta(days=1))
     assignments = await list_assignments_for_user(claims.user_id, kind, commute_date)
-    return [await _to_response(item) for item in assignments]
+    return await _to_responses(assignments, users)
 
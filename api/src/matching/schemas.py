@@ -25,6 +25,12 @@ class DecisionResponse(BaseModel):
     pass_cooldown_until: datetime | None
 
 
+class ParticipantRouteResponse(BaseModel):
+    auth0_id: str
+    alternate_index: int | None
+    departure_offset_minutes: int
+
+
 class MatchParticipantProfileResponse(BaseModel):
     auth0_id: str
     name: str
@@ -47,8 +53,10 @@ class MatchSuggestionResponse(BaseModel):
     shared_segment_end: MatchPointResponse
     estimated_time_minutes: int
     decisions: list[DecisionResponse]
+    participant_routes: list[ParticipantRouteResponse] = []
     chat_room_id: str | None
     commute_date: date | None
+    settings_version: str | None = None
     created_at: datetime
     updated_at: datetime
 
@@ -64,4 +72,6 @@ class MatchRunResponse(BaseModel):
     suggestions_group: int
     assignments_individual: int
     assignments_group: int
+    introductions_scheduled: int = 0
+    settings_version: str | None = None
 
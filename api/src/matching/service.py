@@ -1,53 +1,82 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
 from datetime import date, datetime, timedelta, timezone
 from typing import Literal
 
-from beanie.odm.operators.find.comparison import In
+from beanie.odm.operators.find.comparison import In, NotIn
 
+from src.chat.introductions import (
+    drain_dead_letters,
+    schedule_introductions,
+)
 from src.db.models.chat_message import ChatMessage
 from src.db.models.chat_room import ChatRoom
-from src.db.models.commute import Commute
+from src.db.models.commute import Commute, RouteSegment
 from src.db.models.match_suggestion import (
     MatchPoint,
     MatchScores,
     MatchSuggestion,
     ParticipantDecision,
+    ParticipantRoute,
 )
 from src.db.models.user import User
+from src.db.mongodb import find_for_list
 from src.matching.algorithm import (
     MatchCandidate,
     MatchKind,
     MatchingCommute,
+    MatchingRoute,
+    MatchingSegment,
     MatchingUser,
     run_matching_algorithm,
 )
 from src.matching.geospatial import haversine_meters
-from src.matching.settings import MATCHING_SETTINGS
+from src.metrics import track_matching_stage
+from src.matching.settings import MatchingSettings, get_matching_settings
+from src.routing.gtfs_index import get_transit_index
+
+logger = logging.getLogger(__name__)
+
+# Commutes still waiting on (or that failed) background route generation. NotIn also keeps
+# documents written before route_status existed, which always have a route.
+_UNROUTED_STATUSES = ["pending", "failed"]
 
 
 async def _remove_from_queue_for_participants(participants: list[str]) -> None:
-    commutes = await Commute.find(In(Commute.user_auth0_id, participants)).to_list()
-    if not commutes:
-        return
-    now = datetime.now(timezone.utc)
-    for commute in commutes:
-        commute.enable_queue_flow = False
-        commute.status = "paused"
-        commute.updated_at = now
-        await commute.save()
+    # Targeted $set rather than save(), which could overwrite a route the worker just stored.
+    await Commute.get_pymongo_collection().update_many(
+        {"user_auth0_id": {"$in": participants}},
+        {"$set": {"enable_queue_flow": False, "status": "paused", "updated_at": datetime.now(timezone.utc)}},
+    )
 
 
-def _flatten_route_coordinates(commute: Commute) -> list[tuple[float, float]]:
-    if commute.route_coordinates:
-        return commute.route_coordinates
-    flattened: list[tuple[float, float]] = []
-    for segment in commute.route_segments:
-        flattened.extend(segment.coordinates)
-    return flattened
+def _matching_segments(
+    commute: Commute,
+    route_segments: list[RouteSegment],
+    *,
+    snap_meters: float,
+) -> tuple[MatchingSegment, ...]:
+    index = get_transit_index()
+    if commute.transport_mode != "transit" or index is None:
+        return ()
+    segments = []
+    for segment in route_segments:
+        coordinates = segment.coordinates
+        interval = None
+        if segment.type == "transit":
+            interval = index.resolve_leg(
+                coordinates,
+                line_names=(segment.transit_line, segment.label),
+                snap_meters=snap_meters,
+            )
+        segments.append(MatchingSegment(type=segment.type, coordinates=coordinates, interval=interval))
+    return tuple(segments)
 
 
-def _to_algorithm_commute(commute: Commute) -> MatchingCommute:
+def _to_algorithm_commute(commute: Commute, *, snap_meters: float) -> MatchingCommute:
     return MatchingCommute(
         user_auth0_id=commute.user_auth0_id,
         transport_mode=commute.transport_mode,
@@ -57,7 +86,15 @@ def _to_algorithm_commute(commute: Commute) -> MatchingCommute:
         gender_preference=commute.gender_preference,
         start_minute=commute.time_window.start_minute,
         end_minute=commute.time_window.end_minute,
-        route_coordinates=_flatten_route_coordinates(commute),
+        route_coordinates=commute.route_coordinates,
+        segments=_matching_segments(commute, commute.route_segments, snap_meters=snap_meters),
+        alternates=tuple(
+            MatchingRoute(
+                route_coordinates=alternate.route_coordinates,
+                segments=_matching_segments(commute, alternate.route_segments, snap_meters=snap_meters),
+            )
+            for alternate in commute.route_alternates
+        ),
     )
 
 
@@ -138,12 +175,33 @@ def _as_aware_utc(value: datetime | None) -> datetime | None:
     return value.astimezone(timezone.utc)
 
 
+def _participant_routes(candidate: MatchCandidate, participant_commutes: list[Commute]) -> list[ParticipantRoute]:
+    commutes_by_user = {commute.user_auth0_id: commute for commute in participant_commutes}
+    routes = []
+    for auth0_id in candidate.participants:
+        commute = commutes_by_user.get(auth0_id)
+        route_index = candidate.route_indexes.get(auth0_id, 0)
+        if commute is None or route_index == 0 or route_index > len(commute.route_alternates):
+            offset = commute.route_departure_offset_minutes if commute else 0
+            routes.append(ParticipantRoute(auth0_id=auth0_id, departure_offset_minutes=offset))
+            continue
+        routes.append(
+            ParticipantRoute(
+                auth0_id=auth0_id,
+                alternate_index=route_index - 1,
+                departure_offset_minutes=commute.route_alternates[route_index - 1].departure_offset_minutes,
+            )
+        )
+    return routes
+
+
 def _candidate_to_match_doc(
     candidate: MatchCandidate,
     source: Literal["suggested", "queue_assigned"],
     status: Literal["suggested", "assigned"],
     participant_commutes: list[Commute],
     commute_date: date | None = None,
+    settings_version: str | None = None,
 ) -> MatchSuggestion:
     now = datetime.now(timezone.utc)
     decisions = [ParticipantDecision(auth0_id=auth0_id) for auth0_id in candidate.participants]
@@ -175,7 +233,9 @@ def _candidate_to_match_doc(
         ),
         estimated_time_minutes=candidate.estimated_shared_minutes,
         decisions=decisions,
+        participant_routes=_participant_routes(candidate, participant_commutes),
         commute_date=commute_date,
+        settings_version=settings_version,
         created_at=now,
         updated_at=now,
     )
@@ -185,6 +245,7 @@ async def _eligible_users_and_commutes(kind: MatchKind) -> tuple[list[User], lis
     suggestion_commutes = await Commute.find(
         Commute.enable_suggestions_flow == True,
         In(Commute.match_preference, [kind, "both"]),
+        NotIn(Commute.route_status, _UNROUTED_STATUSES),
     ).to_list()
     if not suggestion_commutes:
         return ([], [])
@@ -196,7 +257,11 @@ async def _eligible_users_and_commutes(kind: MatchKind) -> tuple[list[User], lis
     return (list(users_by_id.values()), filtered_commutes)
 
 
-async def run_suggestions_for_kind(kind: MatchKind) -> list[MatchSuggestion]:
+async def run_suggestions_for_kind(
+    kind: MatchKind,
+    matching_settings: MatchingSettings | None = None,
+) -> list[MatchSuggestion]:
+    matching_settings = matching_settings or get_matching_settings()
     users, commutes = await _eligible_users_and_commutes(kind)
     if not users or len(commutes) < 2:
         return []
@@ -212,16 +277,21 @@ async def run_suggestions_for_kind(kind: MatchKind) -> list[MatchSuggestion]:
     if len(filtered_users) < 2 or len(filtered_commutes) < 2:
         return []
 
+    algorithm = matching_settings.algorithm
     candidates = run_matching_algorithm(
         users=[_to_algorithm_user(user) for user in filtered_users],
-        commutes=[_to_algorithm_commute(commute) for commute in filtered_commutes],
+        commutes=[
+            _to_algorithm_commute(commute, snap_meters=algorithm.transit_stop_snap_meters)
+            for commute in filtered_commutes
+        ],
         kind=kind,
-        min_time_overlap_minutes=MATCHING_SETTINGS.algorithm.min_time_overlap_minutes,
-        min_overlap_distance_meters=MATCHING_SETTINGS.algorithm.min_overlap_distance_meters,
-        overlap_tolerance_meters=MATCHING_SETTINGS.algorithm.overlap_tolerance_meters,
-        overlap_weight=MATCHING_SETTINGS.algorithm.overlap_weight,
-        interest_weight=MATCHING_SETTINGS.algorithm.interest_weight,
-        shared_meters_per_minute=MATCHING_SETTINGS.algorithm.shared_meters_per_minute,
+        min_time_overlap_minutes=algorithm.min_time_overlap_minutes,
+        min_overlap_distance_meters=algorithm.min_overlap_distance_meters,
+        overlap_tolerance_meters=algorithm.overlap_tolerance_meters,
+        overlap_weight=algorithm.overlap_weight,
+        interest_weight=algorithm.interest_weight,
+        shared_meters_per_minute=algorithm.shared_meters_per_minute,
+        max_route_pairs=algorithm.max_route_pairs,
     )
 
     created: list[MatchSuggestion] = []
@@ -235,7 +305,7 @@ async def run_suggestions_for_kind(kind: MatchKind) -> list[MatchSuggestion]:
         for match in existing_matches
         if match.status in {"suggested", "active"}
         and not (
-            MATCHING_SETTINGS.service.pass_cooldown_days <= 0
+            matching_settings.service.pass_cooldown_days <= 0
             and match.status == "suggested"
             and any(decision.passed_at is not None for decision in match.decisions)
         )
@@ -272,6 +342,7 @@ async def run_suggestions_for_kind(kind: MatchKind) -> list[MatchSuggestion]:
             source="suggested",
             status="suggested",
             participant_commutes=participant_commutes,
+            settings_version=matching_settings.version,
         )
         await document.insert()
         for user_id in candidate.participants:
@@ -280,11 +351,17 @@ async def run_suggestions_for_kind(kind: MatchKind) -> list[MatchSuggestion]:
     return created
 
 
-async def run_queue_assignments_for_kind(kind: MatchKind, commute_date: date) -> list[MatchSuggestion]:
+async def run_queue_assignments_for_kind(
+    kind: MatchKind,
+    commute_date: date,
+    matching_settings: MatchingSettings | None = None,
+) -> list[MatchSuggestion]:
+    matching_settings = matching_settings or get_matching_settings()
     queued_commutes = await Commute.find(
         Commute.status == "queued",
         Commute.enable_queue_flow == True,
         In(Commute.match_preference, [kind, "both"]),
+        NotIn(Commute.route_status, _UNROUTED_STATUSES),
     ).to_list()
     if not queued_commutes:
         return []
@@ -296,16 +373,20 @@ async def run_queue_assignments_for_kind(kind: MatchKind, commute_date: date) ->
     users_by_id = {user.auth0_id: user for user in users}
     commutes = [commute for commute in queued_commutes if commute.user_auth0_id in users_by_id]
 
+    algorithm = matching_settings.algorithm
     candidates = run_matching_algorithm(
         users=[_to_algorithm_user(user) for user in users_by_id.values()],
-        commutes=[_to_algorithm_commute(commute) for commute in commutes],
+        commutes=[
+            _to_algorithm_commute(commute, snap_meters=algorithm.transit_stop_snap_meters) for commute in commutes
+        ],
         kind=kind,
-        min_time_overlap_minutes=MATCHING_SETTINGS.algorithm.min_time_overlap_minutes,
-        min_overlap_distance_meters=MATCHING_SETTINGS.algorithm.min_overlap_distance_meters,
-        overlap_tolerance_meters=MATCHING_SETTINGS.algorithm.overlap_tolerance_meters,
-        overlap_weight=MATCHING_SETTINGS.algorithm.overlap_weight,
-        interest_weight=MATCHING_SETTINGS.algorithm.interest_weight,
-        shared_meters_per_minute=MATCHING_SETTINGS.algorithm.shared_meters_per_minute,
+        min_time_overlap_minutes=algorithm.min_time_overlap_minutes,
+        min_overlap_distance_meters=algorithm.min_overlap_distance_meters,
+        overlap_tolerance_meters=algorithm.overlap_tolerance_meters,
+        overlap_weight=algorithm.overlap_weight,
+        interest_weight=algorithm.interest_weight,
+        shared_meters_per_minute=algorithm.shared_meters_per_minute,
+        max_route_pairs=algorithm.max_route_pairs,
     )
     commute_by_user_id = {commute.user_auth0_id: commute for commute in commutes}
     created: list[MatchSuggestion] = []
@@ -418,6 +499,7 @@ async def run_queue_assignments_for_kind(kind: MatchKind, commute_date: date) ->
             status="assigned",
             participant_commutes=participant_commutes,
             commute_date=commute_date,
+            settings_version=matching_settings.version,
         )
         await document.insert()
 
@@ -440,20 +522,21 @@ async def run_queue_assignments_for_kind(kind: MatchKind, commute_date: date) ->
 
 async def list_suggestions_for_user(auth0_id: str, kind: MatchKind) -> list[MatchSuggestion]:
     now = datetime.now(timezone.utc)
-    suggestions = await MatchSuggestion.find(
-        MatchSuggestion.source == "suggested",
-        MatchSuggestion.kind == kind,
-        MatchSuggestion.status == "suggested",
-    ).to_list()
+    suggestions = await find_for_list(
+        MatchSuggestion.find(
+            MatchSuggestion.source == "suggested",
+            MatchSuggestion.kind == kind,
+            MatchSuggestion.status == "suggested",
+            MatchSuggestion.participants == auth0_id,
+        )
+    )
     visible: list[MatchSuggestion] = []
     for suggestion in suggestions:
-        if auth0_id not in suggestion.participants:
-            continue
         decision = next((item for item in suggestion.decisions if item.auth0_id == auth0_id), None)
         if not decision:
             continue
         if (
-            MATCHING_SETTINGS.service.pass_cooldown_days <= 0
+            get_matching_settings().service.pass_cooldown_days <= 0
             and decision.passed_at is not None
         ):
             continue
@@ -467,11 +550,13 @@ async def list_suggestions_for_user(auth0_id: str, kind: MatchKind) -> list[Matc
 
 
 async def list_active_for_user(auth0_id: str, kind: MatchKind) -> list[MatchSuggestion]:
-    matches = await MatchSuggestion.find(
-        MatchSuggestion.kind == kind,
-        MatchSuggestion.status == "active",
-    ).to_list()
-    return [match for match in matches if auth0_id in match.participants]
+    return await find_for_list(
+        MatchSuggestion.find(
+            MatchSuggestion.kind == kind,
+            MatchSuggestion.status == "active",
+            MatchSuggestion.participants == auth0_id,
+        )
+    )
 
 
 async def list_assignments_for_user(
@@ -479,12 +564,14 @@ async def list_assignments_for_user(
     kind: MatchKind,
     commute_date: date,
 ) -> list[MatchSuggestion]:
-    matches = await MatchSuggestion.find(
-        MatchSuggestion.source == "queue_assigned",
-        MatchSuggestion.kind == kind,
-        MatchSuggestion.commute_date == commute_date,
-    ).to_list()
-    return [match for match in matches if auth0_id in match.participants]
+    return await find_for_list(
+        MatchSuggestion.find(
+            MatchSuggestion.source == "queue_assigned",
+            MatchSuggestion.kind == kind,
+            MatchSuggestion.commute_date == commute_date,
+            MatchSuggestion.participants == auth0_id,
+        )
+    )
 
 
 async def accept_suggestion(auth0_id: str, suggestion_id: str) -> MatchSuggestion | None:
@@ -516,6 +603,8 @@ async def accept_suggestion(auth0_id: str, suggestion_id: str) -> MatchSuggestio
 
     suggestion.updated_at = now
     await suggestion.save()
+    if suggestion.status == "active":
+        schedule_introductions([suggestion])
     return suggestion
 
 
@@ -541,7 +630,7 @@ async def pass_suggestion(auth0_id: str, suggestion_id: str) -> MatchSuggestion
         return suggestion
 
     now = datetime.now(timezone.utc)
-    cooldown_days = MATCHING_SETTINGS.service.pass_cooldown_days
+    cooldown_days = get_matching_settings().service.pass_cooldown_days
     for decision in suggestion.decisions:
         if decision.auth0_id == auth0_id:
             decision.passed_at = now
@@ -557,23 +646,49 @@ async def pass_suggestion(auth0_id: str, suggestion_id: str) -> MatchSuggestion
     return suggestion
 
 
-async def run_matching_cycle(run_queue: bool = False) -> dict[str, int]:
-    created_individual = await run_suggestions_for_kind("individual")
-    created_group = await run_suggestions_for_kind("group")
+async def run_matching_cycle(run_queue: bool = False) -> dict[str, int | str]:
+    # One snapshot for the whole cycle; a config edit mid-cycle applies from the next one.
+    matching_settings = get_matching_settings()
+    started = time.perf_counter()
+    with track_matching_stage("suggestions_individual"):
+        created_individual = await run_suggestions_for_kind("individual", matching_settings)
+    with track_matching_stage("suggestions_group"):
+        created_group = await run_suggestions_for_kind("group", matching_settings)
 
     assigned_individual: list[MatchSuggestion] = []
     assigned_group: list[MatchSuggestion] = []
     if run_queue:
         tomorrow = date.today() + timedelta(
-            days=MATCHING_SETTINGS.service.queue_assignment_days_ahead
+            days=matching_settings.service.queue_assignment_days_ahead
         )
-        assigned_individual = await run_queue_assignments_for_kind("individual", tomorrow)
-        assigned_group = await run_queue_assignments_for_kind("group", tomorrow)
+        with track_matching_stage("queue_individual"):
+            assigned_individual = await run_queue_assignments_for_kind("individual", tomorrow, matching_settings)
+        with track_matching_stage("queue_group"):
+            assigned_group = await run_queue_assignments_for_kind("group", tomorrow, matching_settings)
+    logger.info(
+        "Matching cycle with settings %s took %.2fs",
+        matching_settings.version,
+        time.perf_counter() - started,
+    )
+
+    # Post-cycle stage: introduce newly active matches, retrying earlier dead letters too.
+    retry_ids = [letter.match_id for letter in drain_dead_letters()]
+    retry_matches = [
+        match
+        for match in await asyncio.gather(*(MatchSuggestion.get(match_id) for match_id in retry_ids))
+        if match is not None
+    ]
+    # Runs in the background (timed under the "introductions" stage there); the room's
+    # intro_posted_at claim keeps overlapping cycles from posting twice.
+    introductions = [*assigned_individual, *assigned_group, *retry_matches]
+    schedule_introductions(introductions)
 
     return {
         "suggestions_individual": len(created_individual),
         "suggestions_group": len(created_group),
         "assignments_individual": len(assigned_individual),
         "assignments_group": len(assigned_group),
+        "introductions_scheduled": len(introductions),
+        "settings_version": matching_settings.version,
     }
 
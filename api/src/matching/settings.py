@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import hashlib
+import logging
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
-import yaml
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / "config.yaml"
 
 
 @dataclass(frozen=True)
@@ -15,6 +22,10 @@ class AlgorithmSettings:
     overlap_weight: float = 0.7
     interest_weight: float = 0.3
     shared_meters_per_minute: float = 80.0
+    transit_stop_snap_meters: float = 150.0
+    # Itinerary pairings compared per pair of commutes, main routes first; bounds the
+    # (1 + alternates)^2 overlap computations.
+    max_route_pairs: int = 9
 
 
 @dataclass(frozen=True)
@@ -27,6 +38,8 @@ class ServiceSettings:
 class MatchingSettings:
     algorithm: AlgorithmSettings
     service: ServiceSettings
+    # Hash of the config file contents; stored on each match to tie results to parameters.
+    version: str = "defaults"
 
 
 def _to_int(value: Any, default: int) -> int:
@@ -44,10 +57,15 @@ def _to_float(value: Any, default: float) -> float:
 
 
 def load_matching_settings(config_path: Path | None = None) -> MatchingSettings:
-    path = config_path or (Path(__file__).resolve().parent / "config.yaml")
+    path = config_path or DEFAULT_CONFIG_PATH
     payload: dict[str, Any] = {}
+    version = "defaults"
     if path.exists():
-        raw = yaml.safe_load(path.read_text(encoding="utf-8"))
+        import yaml
+
+        content = path.read_bytes()
+        version = hashlib.sha256(content).hexdigest()[:12]
+        raw = yaml.safe_load(content.decode("utf-8"))
         if isinstance(raw, dict):
             payload = raw
 
@@ -80,6 +98,14 @@ def load_matching_settings(config_path: Path | None = None) -> MatchingSettings:
             algorithm_payload.get("shared_meters_per_minute"),
             defaults.shared_meters_per_minute,
         ),
+        transit_stop_snap_meters=_to_float(
+            algorithm_payload.get("transit_stop_snap_meters"),
+            defaults.transit_stop_snap_meters,
+        ),
+        max_route_pairs=_to_int(
+            algorithm_payload.get("max_route_pairs"),
+            defaults.max_route_pairs,
+        ),
     )
 
     service_defaults = ServiceSettings()
@@ -94,8 +120,78 @@ def load_matching_settings(config_path: Path | None = None) -> MatchingSettings:
         ),
     )
 
-    return MatchingSettings(algorithm=algorithm, service=service)
-
-
-MATCHING_SETTINGS = load_matching_settings()
+    return MatchingSettings(algorithm=algorithm, service=service, version=version)
+
+
+class MatchingSettingsProvider:
+    """Serves the current settings, reloading the file when its mtime or size changes.
+
+    A reload builds a complete MatchingSettings before swapping it in, so readers never see a
+    mix of old and new values. A file that fails to parse, or goes missing after the first load,
+    is logged and the previous settings stay.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        check_interval_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.path = path
+        self.check_interval_seconds = check_interval_seconds
+        self._clock = clock
+        self._settings: MatchingSettings | None = None
+        self._signature: tuple[int, int] | None = None
+        self._checked_at = 0.0
+
+    def _file_signature(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def current(self) -> MatchingSettings:
+        now = self._clock()
+        if self._settings is not None and now - self._checked_at < self.check_interval_seconds:
+            return self._settings
+        self._checked_at = now
+        signature = self._file_signature()
+        if self._settings is not None and signature == self._signature:
+            return self._settings
+        if self._settings is not None and signature is None:
+            # Falling back to the built-in defaults would swap versions mid-deployment.
+            logger.warning("Keeping matching settings %s; %s is missing", self._settings.version, self.path)
+            self._signature = None
+            return self._settings
+
+        import yaml
+
+        try:
+            loaded = load_matching_settings(self.path)
+        except (OSError, UnicodeDecodeError, yaml.YAMLError) as exc:
+            if self._settings is None:
+                raise
+            logger.warning("Keeping matching settings %s; %s is invalid: %s", self._settings.version, self.path, exc)
+        else:
+            if self._settings is not None and loaded.version != self._settings.version:
+                logger.info("Matching settings reloaded: %s -> %s", self._settings.version, loaded.version)
+            self._settings = loaded
+        self._signature = signature
+        return self._settings
+
+
+_provider = MatchingSettingsProvider(
+    settings.MATCHING_CONFIG_PATH or DEFAULT_CONFIG_PATH,
+    check_interval_seconds=settings.MATCHING_SETTINGS_CHECK_SECONDS,
+)
+
+
+def get_matching_settings() -> MatchingSettings:
+    """Current settings from config.yaml, read on first use and re-read after it changes.
+
+    A matching cycle takes one snapshot up front so every stage in it uses the same values.
+    """
+    return _provider.current()
 
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upstream calls are slower than in-process work, so they get a wider top end.
+_EXTERNAL_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "flock_http_request_duration_seconds",
+    "HTTP request latency by route template, until the response body is sent.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "flock_http_requests_in_flight",
+    "HTTP requests being handled, including open SSE streams.",
+    ["method"],
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "flock_mongo_command_duration_seconds",
+    "MongoDB command latency as reported by the driver.",
+    ["command", "outcome"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+OTP_REQUEST_SECONDS = Histogram(
+    "flock_otp_request_duration_seconds",
+    "OpenTripPlanner GraphQL latency; outcome is ok, failed or cancelled.",
+    ["outcome"],
+    buckets=_EXTERNAL_BUCKETS,
+)
+OTP_SHORT_CIRCUITS = Counter(
+    "flock_otp_short_circuited_total",
+    "OTP calls refused by the open circuit breaker.",
+)
+GEMINI_REQUEST_SECONDS = Histogram(
+    "flock_gemini_request_duration_seconds",
+    "Gemini call latency by operation; streams are timed until the last chunk. Outcome is ok, failed or cancelled.",
+    ["operation", "outcome"],
+    buckets=_EXTERNAL_BUCKETS,
+)
+MATCHING_STAGE_SECONDS = Histogram(
+    "flock_matching_stage_duration_seconds",
+    "Time spent in each stage of a matching cycle.",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+@contextmanager
+def track_gemini(operation: str) -> Iterator[None]:
+    started = time.perf_counter()
+    outcome = "failed"
+    try:
+        yield
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        # The client went away mid-stream; that says nothing about Gemini.
+        outcome = "cancelled"
+        raise
+    finally:
+        GEMINI_REQUEST_SECONDS.labels(operation=operation, outcome=outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_matching_stage(stage: str) -> Iterator[None]:
+    with MATCHING_STAGE_SECONDS.labels(stage=stage).time():
+        yield
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Per-command counts and latencies from the driver's command monitoring events."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        MONGO_COMMAND_SECONDS.labels(command=event.command_name, outcome="ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        MONGO_COMMAND_SECONDS.labels(command=event.command_name, outcome="failed").observe(event.duration_micros / 1e6)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request under its route template (e.g. /api/chats/{room_id}).
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed responses are timed to their end
+    and are not buffered.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method=method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            # The matched route's template (relative to its router on newer FastAPI). Unmatched
+            # paths share one label so scanners cannot blow up the series count.
+            route_label = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(method=method, route=route_label, status=str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
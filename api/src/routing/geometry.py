@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Sequence
+
+from src.routing.polyline import decode_polyline, encode_polyline
+
+
+@dataclass(frozen=True)
+class NormalizedRouteGeometry:
+    route_segments: list[dict[str, Any]]
+    route_coordinates: list[tuple[float, float]]
+    total_duration_minutes: int | None
+    # Other itineraries OTP offered for the same trip (other routes or departure offsets).
+    alternates: list[NormalizedRouteGeometry] = field(default_factory=list)
+    # Minutes after the commute's start that this itinerary was planned to depart.
+    departure_offset_minutes: int = 0
+
+
+def flatten_segment_coordinates(
+    segments: Iterable[Sequence[Sequence[float]]],
+) -> list[tuple[float, float]]:
+    """Join per-segment coordinates into one route, dropping the point shared where legs meet."""
+    flattened: list[tuple[float, float]] = []
+    for coordinates in segments:
+        for coordinate in coordinates:
+            point = (float(coordinate[0]), float(coordinate[1]))
+            if not flattened or flattened[-1] != point:
+                flattened.append(point)
+    return flattened
+
+
+def segments_for_storage(route_segments: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Swap each segment's coordinate list for an encoded polyline."""
+    stored = []
+    for segment in route_segments:
+        item = {key: value for key, value in segment.items() if key != "coordinates"}
+        if "polyline" not in item:
+            item["polyline"] = encode_polyline(segment.get("coordinates") or [])
+        stored.append(item)
+    return stored
+
+
+def legacy_route_segments(transport_mode: str | None, route_coordinates: list[Any]) -> list[dict[str, Any]]:
+    """One segment standing in for a route stored only as a flat `route_coordinates` array."""
+    if not route_coordinates:
+        return []
+    segment_type = "transit" if transport_mode == "transit" else "walk"
+    return [{"type": segment_type, "coordinates": [tuple(point) for point in route_coordinates]}]
+
+
+def segments_from_storage(stored_segments: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Inverse of segments_for_storage; also accepts legacy segments that kept coordinates."""
+    segments = []
+    for stored in stored_segments:
+        item = {key: value for key, value in stored.items() if key != "polyline"}
+        if stored.get("polyline") is not None:
+            item["coordinates"] = decode_polyline(stored["polyline"])
+        else:
+            item["coordinates"] = [tuple(point) for point in stored.get("coordinates") or []]
+        segments.append(item)
+    return segments
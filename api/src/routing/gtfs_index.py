@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import zipfile
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+from src.config import settings
+from src.matching.geospatial import haversine_meters
+from src.routing.route_cache import current_feed_version
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True, eq=False)
+class TransitPattern:
+    """One stop sequence a line runs (a route in one direction, per distinct shape)."""
+
+    pattern_id: int
+    route_id: str
+    stop_ids: tuple[str, ...]
+    stop_points: tuple[tuple[float, float], ...]
+    # Cumulative along-line distance at each stop, from the first stop.
+    stop_offsets_meters: tuple[float, ...]
+
+
+@dataclass(frozen=True)
+class TransitInterval:
+    """A ride on one pattern, boarding and alighting at stop positions within it."""
+
+    pattern: TransitPattern
+    board_position: int
+    alight_position: int
+
+    @property
+    def line_key(self) -> str:
+        return self.pattern.route_id
+
+
+@dataclass
+class TransitIndex:
+    feed_version: str
+    patterns: list[TransitPattern]
+    # Lowercased route short/long names and route ids -> route ids.
+    route_ids_by_name: dict[str, set[str]]
+    _patterns_by_route: dict[str, list[TransitPattern]] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        by_route: dict[str, list[TransitPattern]] = defaultdict(list)
+        for pattern in self.patterns:
+            by_route[pattern.route_id].append(pattern)
+        self._patterns_by_route = dict(by_route)
+
+    def route_ids_for(self, *names: str | None) -> set[str]:
+        for name in names:
+            if isinstance(name, str) and name.strip():
+                route_ids = self.route_ids_by_name.get(name.strip().casefold())
+                if route_ids:
+                    return route_ids
+        return set()
+
+    def resolve_leg(
+        self,
+        coordinates: list[tuple[float, float]],
+        *,
+        line_names: tuple[str | None, ...],
+        snap_meters: float,
+    ) -> TransitInterval | None:
+        """Snap a transit leg's ends to stops on its line; None if it cannot be placed."""
+        if len(coordinates) < 2:
+            return None
+        start, end = coordinates[0], coordinates[-1]
+        best: tuple[float, TransitInterval] | None = None
+        for route_id in self.route_ids_for(*line_names):
+            for pattern in self._patterns_by_route.get(route_id, ()):
+                board = _nearest_stop(pattern, start)
+                alight = _nearest_stop(pattern, end)
+                if board is None or alight is None:
+                    continue
+                (board_position, board_meters), (alight_position, alight_meters) = board, alight
+                if board_meters > snap_meters or alight_meters > snap_meters:
+                    continue
+                if board_position >= alight_position:
+                    continue
+                total = board_meters + alight_meters
+                if best is None or total < best[0]:
+                    best = (total, TransitInterval(pattern, board_position, alight_position))
+        return best[1] if best else None
+
+    def to_json(self) -> dict:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "feed_version": self.feed_version,
+            "route_ids_by_name": {name: sorted(route_ids) for name, route_ids in self.route_ids_by_name.items()},
+            "patterns": [
+                {
+                    "route_id": pattern.route_id,
+                    "stop_ids": list(pattern.stop_ids),
+                    "stop_points": [list(point) for point in pattern.stop_points],
+                }
+                for pattern in self.patterns
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, payload: dict) -> TransitIndex:
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError("transit index cache has an old format")
+        patterns = [
+            _make_pattern(
+                pattern_id,
+                item["route_id"],
+                item["stop_ids"],
+                [tuple(point) for point in item["stop_points"]],
+            )
+            for pattern_id, item in enumerate(payload["patterns"])
+        ]
+        return cls(
+            feed_version=payload["feed_version"],
+            patterns=patterns,
+            route_ids_by_name={name: set(route_ids) for name, route_ids in payload["route_ids_by_name"].items()},
+        )
+
+
+def _nearest_stop(pattern: TransitPattern, point: tuple[float, float]) -> tuple[int, float] | None:
+    best: tuple[int, float] | None = None
+    for position, stop_point in enumerate(pattern.stop_points):
+        distance = haversine_meters(point, stop_point)
+        if best is None or distance < best[1]:
+            best = (position, distance)
+    return best
+
+
+def _make_pattern(
+    pattern_id: int,
+    route_id: str,
+    stop_ids: list[str],
+    stop_points: list[tuple[float, float]],
+) -> TransitPattern:
+    offsets = [0.0]
+    for previous, current in zip(stop_points, stop_points[1:]):
+        offsets.append(offsets[-1] + haversine_meters(previous, current))
+    return TransitPattern(
+        pattern_id=pattern_id,
+        route_id=route_id,
+        stop_ids=tuple(stop_ids),
+        stop_points=tuple(stop_points),
+        stop_offsets_meters=tuple(offsets),
+    )
+
+
+def _rows(feed: zipfile.ZipFile, name: str) -> Iterator[dict[str, str]]:
+    with feed.open(name) as handle:
+        yield from csv.DictReader(io.TextIOWrapper(handle, encoding="utf-8-sig"))
+
+
+def build_transit_index(feed_path: Path, *, feed_version: str) -> TransitIndex:
+    """Read stops, routes and one representative trip per (route, direction, shape)."""
+    with zipfile.ZipFile(feed_path) as feed:
+        stop_points = {
+            row["stop_id"]: (float(row["stop_lat"]), float(row["stop_lon"]))
+            for row in _rows(feed, "stops.txt")
+            if row.get("stop_lat") and row.get("stop_lon")
+        }
+
+        route_ids_by_name: dict[str, set[str]] = defaultdict(set)
+        for row in _rows(feed, "routes.txt"):
+            for name in (row.get("route_id"), row.get("route_short_name"), row.get("route_long_name")):
+                if name and name.strip():
+                    route_ids_by_name[name.strip().casefold()].add(row["route_id"])
+
+        representative_trips: dict[str, str] = {}
+        seen_variants: set[tuple[str, str, str]] = set()
+        for row in _rows(feed, "trips.txt"):
+            variant = (row["route_id"], row.get("direction_id", ""), row.get("shape_id", ""))
+            if variant in seen_variants:
+                continue
+            seen_variants.add(variant)
+            representative_trips[row["trip_id"]] = row["route_id"]
+
+        trip_stops: dict[str, list[tuple[int, str]]] = defaultdict(list)
+        for row in _rows(feed, "stop_times.txt"):
+            trip_id = row["trip_id"]
+            if trip_id in representative_trips:
+                trip_stops[trip_id].append((int(row["stop_sequence"]), row["stop_id"]))
+
+    patterns: list[TransitPattern] = []
+    seen_sequences: set[tuple[str, tuple[str, ...]]] = set()
+    for trip_id, stops in trip_stops.items():
+        ordered = [stop_id for _, stop_id in sorted(stops) if stop_id in stop_points]
+        route_id = representative_trips[trip_id]
+        if len(ordered) < 2 or (route_id, tuple(ordered)) in seen_sequences:
+            continue
+        seen_sequences.add((route_id, tuple(ordered)))
+        patterns.append(
+            _make_pattern(len(patterns), route_id, ordered, [stop_points[stop_id] for stop_id in ordered])
+        )
+    return TransitIndex(feed_version=feed_version, patterns=patterns, route_ids_by_name=dict(route_ids_by_name))
+
+
+def load_transit_index(feed_path: Path, *, feed_version: str, cache_dir: Path | None) -> TransitIndex:
+    """Build the index from the feed, reusing a JSON cache for the same feed version."""
+    cache_path = None
+    if cache_dir is not None:
+        safe_version = "".join(char if char.isalnum() or char in "-_." else "_" for char in feed_version)
+        cache_path = cache_dir / f"transit_index_{safe_version}.json"
+        if cache_path.exists():
+            try:
+                return TransitIndex.from_json(json.loads(cache_path.read_text(encoding="utf-8")))
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning("ignoring transit index cache %s: %s", cache_path, exc)
+
+    index = build_transit_index(feed_path, feed_version=feed_version)
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps(index.to_json()), encoding="utf-8")
+        except OSError as exc:
+            logger.warning("could not write transit index cache %s: %s", cache_path, exc)
+    return index
+
+
+_transit_index: TransitIndex | None = None
+
+
+async def init_transit_index() -> None:
+    """Load the stop/line index for transit-aware matching; matching falls back to geometry without it."""
+    global _transit_index
+    if not settings.TRANSIT_INDEX_ENABLED or _transit_index is not None:
+        return
+    path = settings.GTFS_FEED_PATH
+    if not path.exists():
+        logger.warning("Transit index disabled: %s not found", path)
+        return
+    try:
+        index = await asyncio.to_thread(
+            load_transit_index,
+            path,
+            feed_version=current_feed_version(),
+            cache_dir=settings.TRANSIT_INDEX_CACHE_DIR,
+        )
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as exc:
+        logger.warning("Transit index disabled: could not read %s: %s", path, exc)
+        return
+    _transit_index = index
+    logger.info("Transit index ready: %s patterns (feed %s)", len(index.patterns), index.feed_version)
+
+
+def get_transit_index() -> TransitIndex | None:
+    return _transit_index
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from src.config import settings
+from src.matching.geospatial import polyline_length_meters
+from src.routing.geometry import NormalizedRouteGeometry
+from src.routing.walk_graph import WalkGraph, source_fingerprint
+
+logger = logging.getLogger(__name__)
+
+_walk_graph: WalkGraph | None = None
+
+
+async def init_walk_router() -> None:
+    """Load the prebuilt walk graph (scripts/build_walk_graph.py) when local walking is enabled."""
+    global _walk_graph
+    if settings.WALK_ROUTER_MODE == "off" or _walk_graph is not None:
+        return
+    path = settings.WALK_GRAPH_PATH
+    if not path.exists():
+        logger.warning("Local walk router disabled: %s not found; run scripts/build_walk_graph.py", path)
+        return
+    try:
+        graph = await asyncio.to_thread(WalkGraph.load, path)
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Local walk router disabled: could not load %s: %s", path, exc)
+        return
+    if settings.OSM_EXTRACT_PATH.exists() and graph.source_fingerprint != source_fingerprint(settings.OSM_EXTRACT_PATH):
+        logger.warning("Walk graph %s was built from a different OSM extract; rebuild it", path)
+    _walk_graph = graph
+    logger.info("Local walk router ready: %s nodes, %s edges", graph.node_count, graph.edge_count)
+
+
+def walk_router_available() -> bool:
+    return _walk_graph is not None
+
+
+def _plan_on_graph(
+    graph: WalkGraph,
+    start: tuple[float, float],
+    end: tuple[float, float],
+) -> NormalizedRouteGeometry | None:
+    source = graph.nearest_node(*start, max_meters=settings.WALK_SNAP_MAX_METERS)
+    target = graph.nearest_node(*end, max_meters=settings.WALK_SNAP_MAX_METERS)
+    if source is None or target is None:
+        return None
+    path = graph.shortest_path(source, target)
+    if path is None:
+        return None
+    edge_refs, _ = path
+
+    coordinates = [start]
+    for ref in edge_refs:
+        for point in graph.edge_shape(ref):
+            if coordinates[-1] != point:
+                coordinates.append(point)
+    if coordinates[-1] != end:
+        coordinates.append(end)
+    if len(coordinates) < 2:
+        return None
+
+    meters = polyline_length_meters(coordinates)
+    minutes = max(1, int(round(meters / settings.WALK_SPEED_METERS_PER_SECOND / 60)))
+    return NormalizedRouteGeometry(
+        route_segments=[
+            {
+                "type": "walk",
+                "coordinates": coordinates,
+                "label": None,
+                "transit_line": None,
+                "duration_minutes": minutes,
+            }
+        ],
+        route_coordinates=list(coordinates),
+        total_duration_minutes=minutes,
+    )
+
+
+async def plan_walk_route(
+    *,
+    start_lat: float,
+    start_lng: float,
+    end_lat: float,
+    end_lng: float,
+) -> NormalizedRouteGeometry | None:
+    """Walking route from the in-process graph, or None when it is not loaded or has no path."""
+    graph = _walk_graph
+    if graph is None:
+        return None
+    return await asyncio.to_thread(_plan_on_graph, graph, (start_lat, start_lng), (end_lat, end_lng))
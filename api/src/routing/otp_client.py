@@ -2,15 +2,127 @@ from __future__ import annotations
 
 import asyncio
 import json
-from datetime import datetime
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Literal, Sequence
+
+import httpx
+
+from src.metrics import OTP_REQUEST_SECONDS, OTP_SHORT_CIRCUITS
 
 
 class OtpClientError(RuntimeError):
     pass
 
 
+class OtpCircuitOpenError(OtpClientError):
+    pass
+
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """Fails fast after failure_threshold consecutive upstream failures.
+
+    After reset_seconds one trial request is let through (half-open); its outcome
+    closes the breaker again or re-opens it for another reset_seconds.
+    """
+
+    def __init__(self, *, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state: BreakerState = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self) -> None:
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                raise OtpCircuitOpenError(f"OTP circuit open; retrying in {remaining:.0f}s")
+            self.state = "half_open"
+        if self._trial_in_flight:
+            raise OtpCircuitOpenError("OTP circuit half-open; trial request in flight")
+        self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """The call ended without telling us anything about upstream health (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+class OtpMetrics:
+    """Per-endpoint request counters and recent latencies."""
+
+    def __init__(self, *, latency_window: int = 200) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.coalesced = 0
+        self.short_circuited = 0
+        self._latencies_ms: deque[float] = deque(maxlen=latency_window)
+
+    def observe(self, latency_ms: float, *, failed: bool) -> None:
+        self.requests += 1
+        if failed:
+            self.failures += 1
+        self._latencies_ms.append(latency_ms)
+
+    def snapshot(self) -> dict[str, float | int]:
+        latencies = sorted(self._latencies_ms)
+
+        def percentile(fraction: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 1)
+
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.failures / self.requests, 4) if self.requests else 0.0,
+            "coalesced": self.coalesced,
+            "short_circuited": self.short_circuited,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
+
+
+OtpDialect = Literal["v2", "v1"]
+
+# Which plan query shape each endpoint accepted last; shared by every client in the process.
+_DIALECT_BY_ENDPOINT: dict[str, OtpDialect] = {}
+
+# Breakers, metrics and in-flight requests are per endpoint so short-lived clients share them.
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_METRICS: dict[str, OtpMetrics] = {}
+_IN_FLIGHT: dict[str, dict[str, asyncio.Task]] = {}
+
+
+def otp_stats() -> dict[str, dict]:
+    return {
+        endpoint: {**metrics.snapshot(), "breaker_state": _BREAKERS[endpoint].state}
+        for endpoint, metrics in _METRICS.items()
+    }
+
+
+_SCHEMA_PROBE_QUERY = "{ __schema { queryType { fields { name args { name } } } } }"
+
+
 def _mode_block(transport_mode: str) -> str:
     if transport_mode == "walk":
         return "direct: [WALK]"
@@ -20,19 +132,25 @@ def _mode_block(transport_mode: str) -> str:
     )
 
 
+def _plan_alias(index: int) -> str:
+    # The first departure keeps the plain `plan` key so single-plan responses look as before.
+    return "plan" if index == 0 else f"plan_{index}"
+
+
 def _build_plan_query_v2(
     *,
     from_lat: float,
     from_lng: float,
     to_lat: float,
     to_lng: float,
-    departure_iso: str,
+    departures: Sequence[str],
     transport_mode: str,
+    num_itineraries: int = 1,
 ) -> str:
     modes = _mode_block(transport_mode)
-    return f"""
-{{
-  plan(
+    fields = [
+        f"""
+  {_plan_alias(index)}: plan(
     from: {{
       location: {{ coordinate: {{ latitude: {from_lat}, longitude: {from_lng} }} }}
     }}
@@ -40,6 +158,7 @@ def _build_plan_query_v2(
       location: {{ coordinate: {{ latitude: {to_lat}, longitude: {to_lng} }} }}
     }}
     dateTime: {{ earliestDeparture: "{departure_iso}" }}
+    first: {num_itineraries}
     modes: {{
       {modes}
     }}
@@ -54,9 +173,10 @@ def _build_plan_query_v2(
         }}
       }}
     }}
-  }}
-}}
-""".strip()
+  }}"""
+        for index, departure_iso in enumerate(departures)
+    ]
+    return "{" + "".join(fields) + "\n}"
 
 
 def _build_transport_modes_block(transport_mode: str) -> str:
@@ -76,19 +196,22 @@ def _build_plan_query_v1(
     from_lng: float,
     to_lat: float,
     to_lng: float,
-    departure_iso: str,
+    departures: Sequence[str],
     transport_mode: str,
+    num_itineraries: int = 1,
 ) -> str:
-    date, time = _departure_iso_to_legacy_fields(departure_iso)
     transport_modes = _build_transport_modes_block(transport_mode)
-    return f"""
-{{
-  plan(
+    fields = []
+    for index, departure_iso in enumerate(departures):
+        date, time = _departure_iso_to_legacy_fields(departure_iso)
+        fields.append(
+            f"""
+  {_plan_alias(index)}: plan(
     from: {{ lat: {from_lat}, lon: {from_lng} }}
     to: {{ lat: {to_lat}, lon: {to_lng} }}
     date: "{date}"
     time: "{time}"
-    numItineraries: 1
+    numItineraries: {num_itineraries}
     transportModes: [{transport_modes}]
   ) {{
     itineraries {{
@@ -100,17 +223,89 @@ def _build_plan_query_v1(
         legGeometry {{ points }}
       }}
     }}
-  }}
-}}
-""".strip()
+  }}"""
+        )
+    return "{" + "".join(fields) + "\n}"
+
+
+def _offset_departures(departure_iso: str, offsets_minutes: Sequence[int]) -> list[str]:
+    departure = datetime.fromisoformat(departure_iso)
+    departures: list[str] = []
+    for offset in offsets_minutes or (0,):
+        shifted = (departure + timedelta(minutes=offset)).isoformat(timespec="minutes")
+        if shifted not in departures:
+            departures.append(shifted)
+    return departures
+
+
+def create_otp_http_client(
+    *,
+    timeout_seconds: float,
+    connect_timeout_seconds: float,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry_seconds: float,
+) -> httpx.AsyncClient:
+    """Keep-alive connection pool shared by every OtpClient request in the process."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_seconds,
+        ),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+_QUERY_BUILDERS = {
+    "v2": _build_plan_query_v2,
+    "v1": _build_plan_query_v1,
+}
+
+
+def _dialect_from_schema(response_json: dict) -> OtpDialect | None:
+    data = response_json.get("data")
+    schema = data.get("__schema") if isinstance(data, dict) else None
+    query_type = schema.get("queryType") if isinstance(schema, dict) else None
+    fields = query_type.get("fields") if isinstance(query_type, dict) else None
+    if not isinstance(fields, list):
+        return None
+    plan_field = next(
+        (field for field in fields if isinstance(field, dict) and field.get("name") == "plan"),
+        None,
+    )
+    if not plan_field:
+        return None
+    arg_names = {arg.get("name") for arg in plan_field.get("args") or [] if isinstance(arg, dict)}
+    if "dateTime" in arg_names:
+        return "v2"
+    if "date" in arg_names or "time" in arg_names:
+        return "v1"
+    return None
 
 
 class OtpClient:
-    def __init__(self, *, base_url: str, graphql_path: str, timeout_seconds: float) -> None:
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        graphql_path: str,
+        timeout_seconds: float,
+        http_client: httpx.AsyncClient | None = None,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_seconds: float = 30.0,
+    ) -> None:
         normalized_base = base_url.rstrip("/")
         normalized_path = graphql_path if graphql_path.startswith("/") else f"/{graphql_path}"
         self.endpoint = f"{normalized_base}{normalized_path}"
         self.timeout_seconds = timeout_seconds
+        self.http_client = http_client
+        self.breaker = _BREAKERS.setdefault(
+            self.endpoint,
+            CircuitBreaker(failure_threshold=breaker_failure_threshold, reset_seconds=breaker_reset_seconds),
+        )
+        self.metrics = _METRICS.setdefault(self.endpoint, OtpMetrics())
 
     async def plan_route(
         self,
@@ -121,63 +316,140 @@ class OtpClient:
         to_lng: float,
         departure_iso: str,
         transport_mode: str,
+        departure_offsets_minutes: Sequence[int] = (0,),
+        num_itineraries: int = 1,
     ) -> dict:
-        payload_v2 = {
-            "query": _build_plan_query_v2(
-                from_lat=from_lat,
-                from_lng=from_lng,
-                to_lat=to_lat,
-                to_lng=to_lng,
-                departure_iso=departure_iso,
-                transport_mode=transport_mode,
-            )
-        }
-        response_json = await asyncio.to_thread(self._post_graphql, payload_v2)
-        if response_json.get("errors"):
-            payload_v1 = {
-                "query": _build_plan_query_v1(
+        """Plan every departure offset in one GraphQL request.
+
+        The plan for the first offset is under `plan`, later ones under `plan_1`, `plan_2`...
+        """
+        departures = _offset_departures(departure_iso, departure_offsets_minutes)
+        known = _DIALECT_BY_ENDPOINT.get(self.endpoint)
+        candidates: list[OtpDialect] = [known, "v1" if known == "v2" else "v2"] if known else ["v2", "v1"]
+        errors = None
+        for dialect in candidates:
+            payload = {
+                "query": _QUERY_BUILDERS[dialect](
                     from_lat=from_lat,
                     from_lng=from_lng,
                     to_lat=to_lat,
                     to_lng=to_lng,
-                    departure_iso=departure_iso,
+                    departures=departures,
                     transport_mode=transport_mode,
+                    num_itineraries=max(1, num_itineraries),
                 )
             }
-            fallback_json = await asyncio.to_thread(self._post_graphql, payload_v1)
-            if fallback_json.get("errors"):
-                raise OtpClientError(f"OTP returned errors: {fallback_json['errors']}")
-            response_json = fallback_json
-        data = response_json.get("data")
-        if not isinstance(data, dict):
-            raise OtpClientError("OTP returned an invalid GraphQL response")
-        return data
-
-    def _post_graphql(self, payload: dict) -> dict:
-        body = json.dumps(payload).encode("utf-8")
-        request = Request(
-            self.endpoint,
-            data=body,
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
+            response_json = await self._post_graphql(payload)
+            if response_json.get("errors"):
+                errors = response_json["errors"]
+                continue
+            data = response_json.get("data")
+            if not isinstance(data, dict):
+                raise OtpClientError("OTP returned an invalid GraphQL response")
+            _DIALECT_BY_ENDPOINT[self.endpoint] = dialect
+            return data
+        # Neither shape worked; forget the cached dialect so the next call probes again.
+        _DIALECT_BY_ENDPOINT.pop(self.endpoint, None)
+        raise OtpClientError(f"OTP returned errors: {errors}")
+
+    @property
+    def dialect(self) -> OtpDialect | None:
+        return _DIALECT_BY_ENDPOINT.get(self.endpoint)
+
+    async def detect_dialect(self) -> OtpDialect | None:
+        """Ask the schema which plan arguments exist so the first route needs one request."""
+        response_json = await self._post_graphql({"query": _SCHEMA_PROBE_QUERY})
+        dialect = _dialect_from_schema(response_json)
+        if dialect:
+            _DIALECT_BY_ENDPOINT[self.endpoint] = dialect
+        return dialect
+
+    async def ping(self) -> None:
+        """Smallest possible GraphQL round trip, for health checks.
+
+        Goes around the breaker and metrics so probes neither trip nor reset them.
+        """
+        payload = {"query": "{ __typename }"}
+        try:
+            if self.http_client is not None:
+                response = await self.http_client.post(self.endpoint, json=payload)
+            else:
+                async with httpx.AsyncClient(timeout=self.timeout_seconds) as client:
+                    response = await client.post(self.endpoint, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise OtpClientError(f"OTP ping failed: {exc!r}") from exc
+
+    async def _post_graphql(self, payload: dict) -> dict:
+        """POST a query, sharing the upstream call with identical queries already in flight."""
+        key = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        in_flight = _IN_FLIGHT.setdefault(self.endpoint, {})
+        pending = in_flight.get(key)
+        if pending is not None:
+            self.metrics.coalesced += 1
+            return await asyncio.shield(pending)
+
+        try:
+            self.breaker.before_call()
+        except OtpCircuitOpenError:
+            self.metrics.short_circuited += 1
+            OTP_SHORT_CIRCUITS.inc()
+            raise
+
+        # The upstream call runs as its own task so a caller that is cancelled (e.g. its client
+        # disconnected) neither aborts the request nor cancels the callers sharing it.
+        task = asyncio.create_task(self._send_graphql(payload))
+        in_flight[key] = task
+
+        def finished(done: asyncio.Task) -> None:
+            if in_flight.get(key) is done:
+                del in_flight[key]
+            if not done.cancelled():
+                # Every caller re-raises it itself; this only marks it retrieved for asyncio.
+                done.exception()
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task)
+
+    async def _send_graphql(self, payload: dict) -> dict:
+        started = time.perf_counter()
+        outcome: Literal["ok", "failed"] | None = None
         try:
-            with urlopen(request, timeout=self.timeout_seconds) as response:
-                raw = response.read().decode("utf-8")
-        except HTTPError as exc:
-            details = exc.read().decode("utf-8", errors="ignore")
+            if self.http_client is not None:
+                response = await self.http_client.post(self.endpoint, json=payload)
+            else:
+                # Scripts without a long-lived pool get a one-off client per request.
+                async with httpx.AsyncClient(timeout=self.timeout_seconds) as client:
+                    response = await client.post(self.endpoint, json=payload)
+            response.raise_for_status()
+            outcome = "ok"
+        except httpx.HTTPStatusError as exc:
+            # 4xx means OTP answered; only 5xx says it is unhealthy.
+            outcome = "failed" if exc.response.status_code >= 500 else "ok"
+            details = exc.response.text
             raise OtpClientError(
-                f"OTP request failed with status {exc.code}: {details[:300]}"
+                f"OTP request failed with status {exc.response.status_code}: {details[:300]}"
             ) from exc
-        except URLError as exc:
-            raise OtpClientError(f"OTP request failed: {exc.reason}") from exc
+        except httpx.RequestError as exc:
+            outcome = "failed"
+            raise OtpClientError(f"OTP request failed: {exc!r}") from exc
+        finally:
+            elapsed = time.perf_counter() - started
+            OTP_REQUEST_SECONDS.labels(outcome=outcome or "cancelled").observe(elapsed)
+            if outcome is None:
+                self.breaker.release()
+            else:
+                self.metrics.observe(elapsed * 1000, failed=outcome == "failed")
+                if outcome == "failed":
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
 
         try:
-            parsed = json.loads(raw)
-        except json.JSONDecodeError as exc:
+            parsed = json.loads(response.content.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
             raise OtpClientError("OTP returned non-JSON content") from exc
 
         if not isinstance(parsed, dict):
             raise OtpClientError("OTP returned a malformed JSON payload")
         return parsed
-
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from itertools import accumulate
+from typing import Iterable
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only decode_polyline_array needs it.
+    np = None
+
+# Bytes 95..126 carry a continuation bit; every other chunk ends a value.
+_CONTINUATION_BYTES = bytes(range(95, 127))
+
+
+def _as_bytes(encoded: str | bytes) -> bytes:
+    return encoded.encode("ascii") if isinstance(encoded, str) else bytes(encoded)
+
+
+def _decode_deltas(data: bytes) -> list[int]:
+    # One flat pass over the bytes into a preallocated list; the value count is the
+    # number of terminating chunks, which dropping the continuation bytes counts at C speed.
+    values = [0] * len(data.translate(None, _CONTINUATION_BYTES))
+    index = 0
+    result = 0
+    shift = 0
+    for byte in data:
+        chunk = byte - 63
+        result |= (chunk & 0x1F) << shift
+        if chunk < 0x20:
+            values[index] = ~(result >> 1) if result & 1 else result >> 1
+            index += 1
+            result = 0
+            shift = 0
+        else:
+            shift += 5
+    if shift or index % 2:
+        raise ValueError("malformed polyline")
+    return values
+
+
+def decode_polyline(encoded: str | bytes, precision: int = 5) -> list[tuple[float, float]]:
+    """Decode a Google encoded polyline (OTP legGeometry.points) into (lat, lng) pairs."""
+    deltas = _decode_deltas(_as_bytes(encoded))
+    factor = float(10**precision)
+    lats = [value / factor for value in accumulate(deltas[0::2])]
+    lngs = [value / factor for value in accumulate(deltas[1::2])]
+    return list(zip(lats, lngs))
+
+
+def decode_polyline_array(encoded: str | bytes, precision: int = 5):
+    """Vectorized decode into an (n, 2) float64 numpy array of (lat, lng)."""
+    if np is None:
+        raise RuntimeError("decode_polyline_array requires numpy")
+    data = _as_bytes(encoded)
+    if not data:
+        return np.empty((0, 2), dtype=np.float64)
+    chunks = np.frombuffer(data, dtype=np.uint8).astype(np.int64) - 63
+    ends = chunks < 0x20
+    if not ends[-1]:
+        raise ValueError("malformed polyline")
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    lengths = np.diff(np.append(starts, len(chunks)))
+    positions = np.arange(len(chunks)) - np.repeat(starts, lengths)
+    values = np.add.reduceat((chunks & 0x1F) << (5 * positions), starts)
+    if len(values) % 2:
+        raise ValueError("malformed polyline")
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / float(10**precision)
+
+
+def _encode_value(value: int, out: bytearray) -> None:
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append((0x20 | (value & 0x1F)) + 63)
+        value >>= 5
+    out.append(value + 63)
+
+
+def encode_polyline(coordinates: Iterable[tuple[float, float]], precision: int = 5) -> str:
+    factor = 10**precision
+    out = bytearray()
+    previous_lat = 0
+    previous_lng = 0
+    for lat, lng in coordinates:
+        scaled_lat = round(lat * factor)
+        scaled_lng = round(lng * factor)
+        _encode_value(scaled_lat - previous_lat, out)
+        _encode_value(scaled_lng - previous_lng, out)
+        previous_lat = scaled_lat
+        previous_lng = scaled_lng
+    return out.decode("ascii")
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import logging
+import math
+import zipfile
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from src.cache import TtlLruCache
+from src.config import settings
+from src.db.models.route_plan_cache import RoutePlanCacheEntry
+from src.routing.geometry import (
+    NormalizedRouteGeometry,
+    flatten_segment_coordinates,
+    segments_for_storage,
+    segments_from_storage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RouteCacheKey:
+    origin_cell: tuple[int, int]
+    destination_cell: tuple[int, int]
+    transport_mode: str
+    departure_slot: int
+    feed_version: str
+
+    def as_string(self) -> str:
+        return (
+            f"{self.feed_version}|{self.transport_mode}|{self.departure_slot}|"
+            f"{self.origin_cell[0]},{self.origin_cell[1]}|"
+            f"{self.destination_cell[0]},{self.destination_cell[1]}"
+        )
+
+
+def _snap(lat: float, lng: float, grid_degrees: float) -> tuple[int, int]:
+    return (math.floor(lat / grid_degrees), math.floor(lng / grid_degrees))
+
+
+@lru_cache(maxsize=1)
+def current_feed_version() -> str:
+    """Version of the GTFS feed OTP is routing on; changing it invalidates cached plans.
+
+    Uses ROUTE_CACHE_FEED_VERSION when set, then feed_info.txt in the bundled feed,
+    then a fingerprint of the feed file itself.
+    """
+    if settings.ROUTE_CACHE_FEED_VERSION:
+        return settings.ROUTE_CACHE_FEED_VERSION
+    path = settings.GTFS_FEED_PATH
+    try:
+        with zipfile.ZipFile(path) as feed:
+            with feed.open("feed_info.txt") as handle:
+                rows = csv.DictReader(io.TextIOWrapper(handle, encoding="utf-8-sig"))
+                version = next((row.get("feed_version") for row in rows if row.get("feed_version")), None)
+                if version:
+                    return version
+    except (OSError, KeyError, zipfile.BadZipFile):
+        pass
+    try:
+        stat = path.stat()
+    except OSError:
+        return "unknown"
+    return hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:16]
+
+
+def route_cache_key(
+    *,
+    start_lat: float,
+    start_lng: float,
+    end_lat: float,
+    end_lng: float,
+    start_minute: int,
+    transport_mode: str,
+) -> RouteCacheKey:
+    grid = settings.ROUTE_CACHE_GRID_DEGREES
+    return RouteCacheKey(
+        origin_cell=_snap(start_lat, start_lng, grid),
+        destination_cell=_snap(end_lat, end_lng, grid),
+        transport_mode=transport_mode,
+        departure_slot=start_minute // max(1, settings.ROUTE_CACHE_SLOT_MINUTES),
+        feed_version=current_feed_version(),
+    )
+
+
+_memory_cache: TtlLruCache[str, NormalizedRouteGeometry] = TtlLruCache(
+    max_entries=settings.ROUTE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ROUTE_CACHE_TTL_SECONDS,
+)
+
+
+def _as_aware_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _geometry_from_storage(
+    stored_segments: list[dict], total_duration_minutes: int | None, departure_offset_minutes: int = 0
+) -> NormalizedRouteGeometry:
+    route_segments = segments_from_storage(stored_segments)
+    return NormalizedRouteGeometry(
+        route_segments=route_segments,
+        route_coordinates=flatten_segment_coordinates(segment["coordinates"] for segment in route_segments),
+        total_duration_minutes=total_duration_minutes,
+        departure_offset_minutes=departure_offset_minutes,
+    )
+
+
+async def get_cached_route(key: RouteCacheKey) -> NormalizedRouteGeometry | None:
+    """Memory first, then the Mongo tier; Mongo hits are promoted into memory."""
+    if not settings.ROUTE_CACHE_ENABLED:
+        return None
+    cache_key = key.as_string()
+    cached = _memory_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        entry = await RoutePlanCacheEntry.find_one(RoutePlanCacheEntry.key == cache_key)
+    except Exception as exc:
+        logger.warning("route cache lookup failed: %s", exc)
+        return None
+    if not entry:
+        return None
+    remaining = (_as_aware_utc(entry.expires_at) - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        return None
+    geometry = _geometry_from_storage(
+        entry.route_segments, entry.total_duration_minutes, entry.departure_offset_minutes
+    )
+    geometry = replace(
+        geometry,
+        alternates=[
+            _geometry_from_storage(
+                alternate.get("route_segments") or [],
+                alternate.get("total_duration_minutes"),
+                alternate.get("departure_offset_minutes") or 0,
+            )
+            for alternate in entry.route_alternates
+        ],
+    )
+    _memory_cache.put(cache_key, geometry, ttl_seconds=remaining)
+    return geometry
+
+
+async def store_route(key: RouteCacheKey, geometry: NormalizedRouteGeometry) -> None:
+    if not settings.ROUTE_CACHE_ENABLED:
+        return
+    cache_key = key.as_string()
+    _memory_cache.put(cache_key, geometry)
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=settings.ROUTE_CACHE_TTL_SECONDS)
+    fields = {
+        "feed_version": key.feed_version,
+        "transport_mode": key.transport_mode,
+        "route_segments": segments_for_storage(geometry.route_segments),
+        "total_duration_minutes": geometry.total_duration_minutes,
+        "departure_offset_minutes": geometry.departure_offset_minutes,
+        "route_alternates": [
+            {
+                "route_segments": segments_for_storage(alternate.route_segments),
+                "total_duration_minutes": alternate.total_duration_minutes,
+                "departure_offset_minutes": alternate.departure_offset_minutes,
+            }
+            for alternate in geometry.alternates
+        ],
+        "created_at": now,
+        "expires_at": expires_at,
+    }
+    try:
+        await RoutePlanCacheEntry.find_one(RoutePlanCacheEntry.key == cache_key).upsert(
+            {"$set": fields},
+            on_insert=RoutePlanCacheEntry(key=cache_key, **fields),
+        )
+    except Exception as exc:
+        logger.warning("route cache write failed: %s", exc)
@@ -1,60 +1,76 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+from dataclasses import replace
 from datetime import datetime, timedelta
+import logging
 import re
-from typing import Any
+from typing import Any, Sequence
 
 from src.config import settings
-from src.routing.otp_client import OtpClient, OtpClientError
+from src.routing.geometry import NormalizedRouteGeometry
+from src.routing.local_walk import plan_walk_route, walk_router_available
+from src.routing.otp_client import OtpClient, OtpClientError, create_otp_http_client
+from src.routing.polyline import decode_polyline
+from src.routing.route_cache import get_cached_route, route_cache_key, store_route
+
+
+logger = logging.getLogger(__name__)
 
 
 class RouteGenerationError(RuntimeError):
     pass
 
 
-@dataclass(frozen=True)
-class NormalizedRouteGeometry:
-    route_segments: list[dict[str, Any]]
-    route_coordinates: list[tuple[float, float]]
-    total_duration_minutes: int | None
-
-
-def _decode_polyline(encoded: str) -> list[tuple[float, float]]:
-    coordinates: list[tuple[float, float]] = []
-    index = 0
-    lat = 0
-    lng = 0
-    length = len(encoded)
-
-    while index < length:
-        shift = 0
-        result = 0
-        while True:
-            value = ord(encoded[index]) - 63
-            index += 1
-            result |= (value & 0x1F) << shift
-            shift += 5
-            if value < 0x20:
-                break
-        delta_lat = ~(result >> 1) if (result & 1) else (result >> 1)
-        lat += delta_lat
-
-        shift = 0
-        result = 0
-        while True:
-            value = ord(encoded[index]) - 63
-            index += 1
-            result |= (value & 0x1F) << shift
-            shift += 5
-            if value < 0x20:
-                break
-        delta_lng = ~(result >> 1) if (result & 1) else (result >> 1)
-        lng += delta_lng
-
-        coordinates.append((lat / 1e5, lng / 1e5))
-
-    return coordinates
+_shared_otp_client: OtpClient | None = None
+
+
+async def init_otp_client() -> None:
+    """Open the pooled OTP transport; called from the app lifespan."""
+    global _shared_otp_client
+    if not settings.OTP_BASE_URL or _shared_otp_client is not None:
+        return
+    _shared_otp_client = OtpClient(
+        base_url=settings.OTP_BASE_URL,
+        graphql_path=settings.OTP_GRAPHQL_PATH,
+        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+        http_client=create_otp_http_client(
+            timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+            connect_timeout_seconds=settings.OTP_CONNECT_TIMEOUT_SECONDS,
+            max_connections=settings.OTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry_seconds=settings.OTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        breaker_failure_threshold=settings.OTP_BREAKER_FAILURE_THRESHOLD,
+        breaker_reset_seconds=settings.OTP_BREAKER_RESET_SECONDS,
+    )
+    try:
+        dialect = await asyncio.wait_for(
+            _shared_otp_client.detect_dialect(),
+            timeout=settings.OTP_CONNECT_TIMEOUT_SECONDS,
+        )
+        logger.info("OTP GraphQL dialect: %s", dialect or "unknown, will detect on first route")
+    except (OtpClientError, asyncio.TimeoutError) as exc:
+        logger.warning("OTP dialect probe failed (will detect on first route): %r", exc)
+
+
+async def close_otp_client() -> None:
+    global _shared_otp_client
+    client, _shared_otp_client = _shared_otp_client, None
+    if client is not None and client.http_client is not None:
+        await client.http_client.aclose()
+
+
+def get_otp_client() -> OtpClient:
+    if _shared_otp_client is not None:
+        return _shared_otp_client
+    return OtpClient(
+        base_url=settings.OTP_BASE_URL,
+        graphql_path=settings.OTP_GRAPHQL_PATH,
+        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
+        breaker_failure_threshold=settings.OTP_BREAKER_FAILURE_THRESHOLD,
+        breaker_reset_seconds=settings.OTP_BREAKER_RESET_SECONDS,
+    )
 
 
 def _build_departure_iso(start_minute: int) -> str:
@@ -86,31 +102,39 @@ def _duration_minutes(value: Any) -> int | None:
     return None
 
 
-def _normalize_route_response(response_data: dict[str, Any]) -> NormalizedRouteGeometry:
-    plan = response_data.get("plan")
-    if not isinstance(plan, dict):
-        raise RouteGenerationError("OTP response did not include a plan")
+def _plan_offset(key: str, departure_offsets_minutes: Sequence[int]) -> int:
+    """Departure offset of an aliased plan: `plan` is the first offset, `plan_N` the Nth."""
+    _, _, suffix = key.partition("_")
+    index = int(suffix) if suffix.isdigit() else 0
+    return departure_offsets_minutes[index] if index < len(departure_offsets_minutes) else 0
+
+
+def _response_itineraries(
+    response_data: dict[str, Any],
+    departure_offsets_minutes: Sequence[int] = (0,),
+) -> list[tuple[list[Any], int | None, int]]:
+    """Legs, duration and departure offset of every itinerary, in order, across all aliased plans."""
+    itineraries: list[tuple[list[Any], int | None, int]] = []
+    for key, plan in response_data.items():
+        if not key.startswith("plan") or not isinstance(plan, dict):
+            continue
+        offset = _plan_offset(key, departure_offsets_minutes)
+        for edge in plan.get("edges") or []:
+            node = edge.get("node") if isinstance(edge, dict) else None
+            legs = node.get("legs") if isinstance(node, dict) else None
+            if isinstance(legs, list):
+                itineraries.append((legs, None, offset))
+        for itinerary in plan.get("itineraries") or []:
+            if not isinstance(itinerary, dict):
+                continue
+            legs = itinerary.get("legs")
+            if isinstance(legs, list):
+                itineraries.append((legs, _duration_minutes(itinerary.get("duration")), offset))
+    return itineraries
+
 
-    legs = None
-    edges = plan.get("edges")
-    if isinstance(edges, list) and edges:
-        first_edge = edges[0] if isinstance(edges[0], dict) else None
-        node = first_edge.get("node") if isinstance(first_edge, dict) else None
-        candidate_legs = node.get("legs") if isinstance(node, dict) else None
-        if isinstance(candidate_legs, list):
-            legs = candidate_legs
-    itinerary_duration_minutes: int | None = None
-    if legs is None:
-        itineraries = plan.get("itineraries")
-        if isinstance(itineraries, list) and itineraries:
-            first_itinerary = itineraries[0] if isinstance(itineraries[0], dict) else None
-            candidate_legs = first_itinerary.get("legs") if isinstance(first_itinerary, dict) else None
-            if isinstance(candidate_legs, list):
-                legs = candidate_legs
-            itinerary_duration_minutes = _duration_minutes(
-                first_itinerary.get("duration") if isinstance(first_itinerary, dict) else None
-            )
-    if not isinstance(legs, list) or not legs:
+def _normalize_itinerary(legs: list[Any], itinerary_duration_minutes: int | None) -> NormalizedRouteGeometry:
+    if not legs:
         raise RouteGenerationError("OTP itinerary did not include legs")
 
     route_segments: list[dict[str, Any]] = []
@@ -126,7 +150,10 @@ def _normalize_route_response(response_data: dict[str, Any]) -> NormalizedRouteG
         encoded = geometry.get("points") if isinstance(geometry, dict) else None
         if not isinstance(encoded, str) or not encoded:
             continue
-        coordinates = _decode_polyline(encoded)
+        try:
+            coordinates = decode_polyline(encoded)
+        except ValueError:
+            continue
         if len(coordinates) < 2:
             continue
 
@@ -167,6 +194,41 @@ def _normalize_route_response(response_data: dict[str, Any]) -> NormalizedRouteG
     )
 
 
+def _normalize_route_response(
+    response_data: dict[str, Any],
+    departure_offsets_minutes: Sequence[int] = (0,),
+) -> NormalizedRouteGeometry:
+    """First usable itinerary is the route; distinct later ones become its alternates."""
+    if not isinstance(response_data.get("plan"), dict):
+        raise RouteGenerationError("OTP response did not include a plan")
+    itineraries = _response_itineraries(response_data, departure_offsets_minutes)
+    if not itineraries:
+        raise RouteGenerationError("OTP itinerary did not include legs")
+
+    routes: list[NormalizedRouteGeometry] = []
+    seen: set[tuple[tuple[str, tuple[tuple[float, float], ...]], ...]] = set()
+    first_error: RouteGenerationError | None = None
+    for legs, duration, offset in itineraries:
+        try:
+            geometry = replace(_normalize_itinerary(legs, duration), departure_offset_minutes=offset)
+        except RouteGenerationError as exc:
+            first_error = first_error or exc
+            continue
+        # Later departures often repeat the same itinerary; keep one copy.
+        signature = tuple(
+            (segment["type"], tuple(segment["coordinates"])) for segment in geometry.route_segments
+        )
+        if signature in seen:
+            continue
+        seen.add(signature)
+        routes.append(geometry)
+        if len(routes) > settings.ROUTE_MAX_ALTERNATES:
+            break
+    if not routes:
+        raise first_error or RouteGenerationError("OTP returned no usable route geometry")
+    return replace(routes[0], alternates=routes[1:])
+
+
 async def generate_route_for_commute(
     *,
     start_lat: float,
@@ -176,15 +238,35 @@ async def generate_route_for_commute(
     start_minute: int,
     transport_mode: str,
 ) -> NormalizedRouteGeometry:
+    cache_key = route_cache_key(
+        start_lat=start_lat,
+        start_lng=start_lng,
+        end_lat=end_lat,
+        end_lng=end_lng,
+        start_minute=start_minute,
+        transport_mode=transport_mode,
+    )
+    cached = await get_cached_route(cache_key)
+    if cached is not None:
+        return cached
+
+    local_walk = transport_mode == "walk" and walk_router_available()
+    if local_walk and (settings.WALK_ROUTER_MODE == "prefer" or not settings.OTP_BASE_URL):
+        geometry = await plan_walk_route(start_lat=start_lat, start_lng=start_lng, end_lat=end_lat, end_lng=end_lng)
+        if geometry is not None:
+            await store_route(cache_key, geometry)
+            return geometry
+
     if not settings.OTP_BASE_URL:
         raise RouteGenerationError("OTP is not configured. Set OTP_BASE_URL.")
 
-    client = OtpClient(
-        base_url=settings.OTP_BASE_URL,
-        graphql_path=settings.OTP_GRAPHQL_PATH,
-        timeout_seconds=settings.OTP_TIMEOUT_SECONDS,
-    )
+    client = get_otp_client()
     departure_iso = _build_departure_iso(start_minute)
+    # Walking has one sensible path whatever the departure time. Duplicates are dropped the
+    # same way the client drops duplicate departures, so plan aliases line up with offsets.
+    departure_offsets = (
+        list(dict.fromkeys(settings.OTP_DEPARTURE_OFFSETS_MINUTES or [0])) if transport_mode == "transit" else [0]
+    )
     try:
         otp_response = await client.plan_route(
             from_lat=start_lat,
@@ -193,9 +275,19 @@ async def generate_route_for_commute(
             to_lng=end_lng,
             departure_iso=departure_iso,
             transport_mode=transport_mode,
+            departure_offsets_minutes=departure_offsets,
+            num_itineraries=settings.OTP_NUM_ITINERARIES if transport_mode == "transit" else 1,
         )
     except OtpClientError as exc:
-        raise RouteGenerationError(str(exc)) from exc
-
-    return _normalize_route_response(otp_response)
+        geometry = None
+        if local_walk:
+            logger.info("OTP unavailable, planning walk route locally: %s", exc)
+            geometry = await plan_walk_route(start_lat=start_lat, start_lng=start_lng, end_lat=end_lat, end_lng=end_lng)
+        if geometry is None:
+            raise RouteGenerationError(str(exc)) from exc
+        await store_route(cache_key, geometry)
+        return geometry
 
+    geometry = _normalize_route_response(otp_response, departure_offsets)
+    await store_route(cache_key, geometry)
+    return geometry
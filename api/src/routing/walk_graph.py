@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import heapq
+import json
+import math
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from src.matching.geospatial import haversine_meters
+
+GRAPH_FORMAT_VERSION = 1
+
+# OSM highway values a pedestrian can use; motorways and trunk roads are left out.
+WALKABLE_HIGHWAYS = frozenset(
+    {
+        "footway",
+        "path",
+        "pedestrian",
+        "steps",
+        "corridor",
+        "living_street",
+        "residential",
+        "service",
+        "unclassified",
+        "road",
+        "track",
+        "cycleway",
+        "tertiary",
+        "tertiary_link",
+        "secondary",
+        "secondary_link",
+        "primary",
+        "primary_link",
+    }
+)
+_FOOT_ALLOWED = frozenset({"yes", "designated", "permissive"})
+_FOOT_DENIED = frozenset({"no", "private"})
+
+# Grid cell size for nearest-node lookups (~200m of latitude).
+_GRID_DEGREES = 0.002
+
+OsmWayNodes = Sequence[tuple[int, float, float]]
+
+
+def is_walkable(tags: dict[str, str]) -> bool:
+    if tags.get("highway") not in WALKABLE_HIGHWAYS:
+        return False
+    foot = tags.get("foot")
+    if foot in _FOOT_DENIED:
+        return False
+    if tags.get("access") in _FOOT_DENIED and foot not in _FOOT_ALLOWED:
+        return False
+    return True
+
+
+class WalkGraph:
+    """Walking network compacted to junction nodes, stored as flat arrays.
+
+    Each undirected edge keeps its full shape so routes can be drawn; adjacency is
+    CSR (adj_offsets/adj_targets) and adj_edges holds the edge id, bit-inverted when
+    the edge is walked against its stored direction.
+    """
+
+    _ARRAYS = (
+        ("node_lat", "d"),
+        ("node_lng", "d"),
+        ("edge_length", "d"),
+        ("shape_offsets", "q"),
+        ("shape_lat", "d"),
+        ("shape_lng", "d"),
+        ("adj_offsets", "q"),
+        ("adj_targets", "q"),
+        ("adj_edges", "q"),
+    )
+
+    def __init__(self, *, source_fingerprint: str = "", **arrays: array) -> None:
+        self.source_fingerprint = source_fingerprint
+        for name, typecode in self._ARRAYS:
+            setattr(self, name, arrays.get(name, array(typecode)))
+        self._grid: dict[tuple[int, int], list[int]] | None = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_length)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            "version": GRAPH_FORMAT_VERSION,
+            "source_fingerprint": self.source_fingerprint,
+            "lengths": {name: len(getattr(self, name)) for name, _ in self._ARRAYS},
+        }
+        temporary = path.with_suffix(path.suffix + ".tmp")
+        with temporary.open("wb") as handle:
+            handle.write(json.dumps(header).encode("utf-8") + b"\n")
+            for name, _ in self._ARRAYS:
+                getattr(self, name).tofile(handle)
+        temporary.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> WalkGraph:
+        with path.open("rb") as handle:
+            header = json.loads(handle.readline())
+            if header.get("version") != GRAPH_FORMAT_VERSION:
+                raise ValueError(f"walk graph format {header.get('version')} is not {GRAPH_FORMAT_VERSION}")
+            arrays = {}
+            for name, typecode in cls._ARRAYS:
+                values = array(typecode)
+                values.fromfile(handle, header["lengths"][name])
+                arrays[name] = values
+        return cls(source_fingerprint=header.get("source_fingerprint", ""), **arrays)
+
+    def _grid_index(self) -> dict[tuple[int, int], list[int]]:
+        if self._grid is None:
+            grid: dict[tuple[int, int], list[int]] = defaultdict(list)
+            for node, (lat, lng) in enumerate(zip(self.node_lat, self.node_lng)):
+                grid[(math.floor(lat / _GRID_DEGREES), math.floor(lng / _GRID_DEGREES))].append(node)
+            self._grid = dict(grid)
+        return self._grid
+
+    def nearest_node(self, lat: float, lng: float, *, max_meters: float) -> int | None:
+        grid = self._grid_index()
+        cell_lat = math.floor(lat / _GRID_DEGREES)
+        cell_lng = math.floor(lng / _GRID_DEGREES)
+        best_node: int | None = None
+        best_distance = max_meters
+        max_ring = int(max_meters / (_GRID_DEGREES * 111_000 * max(0.2, math.cos(math.radians(lat))))) + 1
+        # Gaps (in meters, rounded down) from the point to the edges of its own cell.
+        lat_gap = min(lat - cell_lat * _GRID_DEGREES, (cell_lat + 1) * _GRID_DEGREES - lat) * 111_000
+        lng_gap = min(lng - cell_lng * _GRID_DEGREES, (cell_lng + 1) * _GRID_DEGREES - lng) * 111_000
+        for ring in range(max_ring + 1):
+            for row in range(cell_lat - ring, cell_lat + ring + 1):
+                for column in range(cell_lng - ring, cell_lng + ring + 1):
+                    if max(abs(row - cell_lat), abs(column - cell_lng)) != ring:
+                        continue
+                    for node in grid.get((row, column), ()):
+                        distance = haversine_meters((lat, lng), (self.node_lat[node], self.node_lng[node]))
+                        if distance <= best_distance:
+                            best_node = node
+                            best_distance = distance
+            # The next ring starts `ring` whole cells beyond this cell's nearest edge; cells
+            # narrow toward the pole, so the farthest latitude it reaches sets their width.
+            lng_scale = math.cos(math.radians(min(89.9, abs(lat) + (ring + 2) * _GRID_DEGREES)))
+            next_ring_meters = min(
+                lat_gap + ring * _GRID_DEGREES * 111_000,
+                (lng_gap + ring * _GRID_DEGREES * 111_000) * lng_scale,
+            )
+            if next_ring_meters > best_distance:
+                break
+        return best_node
+
+    def shortest_path(self, source: int, target: int) -> tuple[list[int], float] | None:
+        """A* over the junction graph; returns the edge refs walked and the distance in meters."""
+        if source == target:
+            return ([], 0.0)
+        target_point = (self.node_lat[target], self.node_lng[target])
+
+        def estimate(node: int) -> float:
+            return haversine_meters((self.node_lat[node], self.node_lng[node]), target_point)
+
+        best = {source: 0.0}
+        came_from: dict[int, tuple[int, int]] = {}
+        frontier = [(estimate(source), 0.0, source)]
+        while frontier:
+            _, distance, node = heapq.heappop(frontier)
+            if node == target:
+                refs = []
+                while node != source:
+                    node, ref = came_from[node]
+                    refs.append(ref)
+                refs.reverse()
+                return (refs, distance)
+            if distance > best.get(node, math.inf):
+                continue
+            for index in range(self.adj_offsets[node], self.adj_offsets[node + 1]):
+                neighbor = self.adj_targets[index]
+                ref = self.adj_edges[index]
+                candidate = distance + self.edge_length[ref if ref >= 0 else ~ref]
+                if candidate < best.get(neighbor, math.inf):
+                    best[neighbor] = candidate
+                    came_from[neighbor] = (node, ref)
+                    heapq.heappush(frontier, (candidate + estimate(neighbor), candidate, neighbor))
+        return None
+
+    def edge_shape(self, ref: int) -> list[tuple[float, float]]:
+        edge = ref if ref >= 0 else ~ref
+        start, end = self.shape_offsets[edge], self.shape_offsets[edge + 1]
+        shape = list(zip(self.shape_lat[start:end], self.shape_lng[start:end]))
+        return shape if ref >= 0 else shape[::-1]
+
+
+class WalkGraphBuilder:
+    """Turns OSM ways into a WalkGraph, splitting them at junctions.
+
+    junction_ids are the OSM node ids where ways meet (or end); every other node
+    only contributes to edge shapes.
+    """
+
+    def __init__(self, junction_ids: set[int] | Counter) -> None:
+        self._junction_ids = junction_ids
+        self._node_index: dict[int, int] = {}
+        self._node_lat = array("d")
+        self._node_lng = array("d")
+        self._edges: list[tuple[int, int]] = []
+        self._edge_length = array("d")
+        self._shape_offsets = array("q", [0])
+        self._shape_lat = array("d")
+        self._shape_lng = array("d")
+
+    def _node(self, osm_id: int, lat: float, lng: float) -> int:
+        index = self._node_index.get(osm_id)
+        if index is None:
+            index = len(self._node_lat)
+            self._node_index[osm_id] = index
+            self._node_lat.append(lat)
+            self._node_lng.append(lng)
+        return index
+
+    def _is_junction(self, osm_id: int) -> bool:
+        if isinstance(self._junction_ids, Counter):
+            return self._junction_ids[osm_id] > 1
+        return osm_id in self._junction_ids
+
+    def add_way(self, nodes: OsmWayNodes) -> None:
+        if len(nodes) < 2:
+            return
+        start_osm_id, start_lat, start_lng = nodes[0]
+        start = self._node(start_osm_id, start_lat, start_lng)
+        shape = [(start_lat, start_lng)]
+        length = 0.0
+        for position in range(1, len(nodes)):
+            osm_id, lat, lng = nodes[position]
+            length += haversine_meters(shape[-1], (lat, lng))
+            shape.append((lat, lng))
+            if position != len(nodes) - 1 and not self._is_junction(osm_id):
+                continue
+            end = self._node(osm_id, lat, lng)
+            if end != start:
+                self._edges.append((start, end))
+                self._edge_length.append(length)
+                for point_lat, point_lng in shape:
+                    self._shape_lat.append(point_lat)
+                    self._shape_lng.append(point_lng)
+                self._shape_offsets.append(len(self._shape_lat))
+            start = end
+            shape = [(lat, lng)]
+            length = 0.0
+
+    def build(self, *, source_fingerprint: str = "") -> WalkGraph:
+        node_count = len(self._node_lat)
+        degree = [0] * (node_count + 1)
+        for start, end in self._edges:
+            degree[start] += 1
+            degree[end] += 1
+        adj_offsets = array("q", [0] * (node_count + 1))
+        for node in range(node_count):
+            adj_offsets[node + 1] = adj_offsets[node] + degree[node]
+        cursor = list(adj_offsets[:-1])
+        adj_targets = array("q", [0] * (2 * len(self._edges)))
+        adj_edges = array("q", [0] * (2 * len(self._edges)))
+        for edge, (start, end) in enumerate(self._edges):
+            adj_targets[cursor[start]] = end
+            adj_edges[cursor[start]] = edge
+            cursor[start] += 1
+            adj_targets[cursor[end]] = start
+            adj_edges[cursor[end]] = ~edge
+            cursor[end] += 1
+        return WalkGraph(
+            source_fingerprint=source_fingerprint,
+            node_lat=self._node_lat,
+            node_lng=self._node_lng,
+            edge_length=self._edge_length,
+            shape_offsets=self._shape_offsets,
+            shape_lat=self._shape_lat,
+            shape_lng=self._shape_lng,
+            adj_offsets=adj_offsets,
+            adj_targets=adj_targets,
+            adj_edges=adj_edges,
+        )
+
+
+def build_walk_graph(ways: Iterable[OsmWayNodes], *, source_fingerprint: str = "") -> WalkGraph:
+    """Build from in-memory ways; for a full extract use build_walk_graph_from_pbf."""
+    ways = list(ways)
+    references: Counter = Counter()
+    for nodes in ways:
+        references.update(osm_id for osm_id, _, _ in nodes)
+    builder = WalkGraphBuilder(references)
+    for nodes in ways:
+        builder.add_way(nodes)
+    return builder.build(source_fingerprint=source_fingerprint)
+
+
+def source_fingerprint(path: Path) -> str:
+    stat = path.stat()
+    return f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_walk_graph_from_pbf(path: Path) -> WalkGraph:
+    """Two streaming passes over an OSM extract; needs the optional `osmium` package."""
+    try:
+        import osmium
+    except ImportError as exc:
+        raise RuntimeError("Building the walk graph requires `pip install osmium`") from exc
+
+    references: Counter = Counter()
+
+    class ReferenceCounter(osmium.SimpleHandler):
+        def way(self, way) -> None:
+            if is_walkable(dict(way.tags)):
+                references.update(node.ref for node in way.nodes)
+
+    ReferenceCounter().apply_file(str(path))
+
+    builder = WalkGraphBuilder(references)
+
+    class WayCollector(osmium.SimpleHandler):
+        def way(self, way) -> None:
+            if not is_walkable(dict(way.tags)):
+                return
+            nodes = [
+                (node.ref, node.location.lat, node.location.lon)
+                for node in way.nodes
+                if node.location.valid()
+            ]
+            builder.add_way(nodes)
+
+    WayCollector().apply_file(str(path), locations=True)
+    return builder.build(source_fingerprint=source_fingerprint(path))
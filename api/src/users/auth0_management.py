@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable
+
+from pymongo import UpdateOne
+
+from src.config import settings
+from src.db.models.pending_auth0_deletion import PendingAuth0Deletion
+from src.worker import RetryingWorker
+
+if TYPE_CHECKING:
+    from auth0.management import Auth0 as Auth0Mgmt
+
+logger = logging.getLogger(__name__)
+
+
+def management_configured() -> bool:
+    return bool(settings.AUTH0_DOMAIN and settings.AUTH0_MGMT_CLIENT_ID and settings.AUTH0_MGMT_CLIENT_SECRET)
+
+
+class ManagementTokenCache:
+    """Client-credentials token for the Management API, reused until shortly before expires_in."""
+
+    def __init__(self, *, refresh_margin_seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._clock = clock
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._token = None
+        self._expires_at = 0.0
+
+    def _fresh(self) -> bool:
+        return self._token is not None and self._clock() < self._expires_at - self.refresh_margin_seconds
+
+    async def get(self) -> str:
+        if self._fresh():
+            return self._token
+        async with self._lock:
+            if not self._fresh():
+                response = await asyncio.to_thread(_request_management_token)
+                self._token = response["access_token"]
+                self._expires_at = self._clock() + float(response.get("expires_in") or 0)
+            return self._token
+
+
+# The auth0 SDK is imported on first use: most processes never delete an account.
+def _request_management_token() -> dict:
+    from auth0.authentication import GetToken
+
+    token = GetToken(
+        settings.AUTH0_DOMAIN,
+        settings.AUTH0_MGMT_CLIENT_ID,
+        client_secret=settings.AUTH0_MGMT_CLIENT_SECRET,
+    )
+    return token.client_credentials(f"https://{settings.AUTH0_DOMAIN}/api/v2/")
+
+
+def _management_client(access_token: str) -> Auth0Mgmt:
+    from auth0.management import Auth0 as Auth0Mgmt
+
+    try:
+        # auth0-python 5+ only takes keyword arguments.
+        return Auth0Mgmt(tenant_domain=settings.AUTH0_DOMAIN, token=access_token)
+    except TypeError:
+        return Auth0Mgmt(settings.AUTH0_DOMAIN, access_token)
+
+
+_token_cache = ManagementTokenCache(refresh_margin_seconds=settings.AUTH0_MGMT_TOKEN_REFRESH_MARGIN_SECONDS)
+
+
+async def delete_auth0_identity(auth0_id: str) -> None:
+    """Delete the Auth0 user; an identity that is already gone counts as deleted."""
+    access_token = await _token_cache.get()
+    try:
+        await asyncio.to_thread(_management_client(access_token).users.delete, auth0_id)
+    except Exception as exc:
+        status_code = getattr(exc, "status_code", None)
+        if status_code == 404:
+            return
+        if status_code == 401:
+            # Revoked or rotated early; the retry fetches a new one.
+            _token_cache.invalidate()
+        raise
+
+
+async def _delete_pending_identity(auth0_id: str) -> None:
+    try:
+        await delete_auth0_identity(auth0_id)
+    except Exception as exc:
+        await PendingAuth0Deletion.get_pymongo_collection().update_one(
+            {"auth0_id": auth0_id},
+            {"$inc": {"attempts": 1}, "$set": {"last_error": str(exc)[:500]}},
+        )
+        raise
+    await PendingAuth0Deletion.get_pymongo_collection().delete_one({"auth0_id": auth0_id})
+
+
+async def _log_abandoned_deletion(auth0_id: str, exc: Exception) -> None:
+    # The pending record stays, so the next startup tries again.
+    logger.error("Auth0 identity %s was not deleted; will retry after restart: %s", auth0_id, exc)
+
+
+_deletion_worker: RetryingWorker[str] = RetryingWorker(
+    name="auth0-deletion",
+    handler=_delete_pending_identity,
+    concurrency=settings.AUTH0_DELETION_WORKER_CONCURRENCY,
+    max_attempts=settings.AUTH0_DELETION_MAX_ATTEMPTS,
+    retry_base_seconds=settings.AUTH0_DELETION_RETRY_BASE_SECONDS,
+    on_give_up=_log_abandoned_deletion,
+)
+
+
+def _enqueue(auth0_id: str) -> None:
+    if not _deletion_worker.running:
+        _deletion_worker.start()
+    _deletion_worker.submit(auth0_id)
+
+
+async def schedule_auth0_deletions(auth0_ids: list[str]) -> None:
+    """Record the identities for deletion, then hand them to the background worker."""
+    if not auth0_ids:
+        return
+    if not management_configured():
+        logger.warning("Auth0 management is not configured; %s identities were left in Auth0", len(auth0_ids))
+        return
+    now = datetime.now(timezone.utc)
+    await PendingAuth0Deletion.get_pymongo_collection().bulk_write(
+        [
+            UpdateOne(
+                {"auth0_id": auth0_id},
+                {"$setOnInsert": {"auth0_id": auth0_id, "attempts": 0, "last_error": None, "created_at": now}},
+                upsert=True,
+            )
+            for auth0_id in auth0_ids
+        ],
+        ordered=False,
+    )
+    for auth0_id in auth0_ids:
+        _enqueue(auth0_id)
+
+
+async def schedule_auth0_deletion(auth0_id: str) -> None:
+    await schedule_auth0_deletions([auth0_id])
+
+
+async def start_auth0_deletion_worker() -> None:
+    """Requeue identities whose deletion had not finished before the last shutdown."""
+    if not management_configured():
+        return
+    try:
+        pending = await PendingAuth0Deletion.find_all().to_list()
+    except Exception as exc:
+        logger.warning("could not requeue pending Auth0 deletions: %s", exc)
+        return
+    for record in pending:
+        _enqueue(record.auth0_id)
+
+
+async def stop_auth0_deletion_worker() -> None:
+    await _deletion_worker.stop()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Annotated, Iterable
+
+from beanie.odm.operators.find.comparison import In
+from fastapi import Depends
+
+from src.cache import TtlLruCache
+from src.config import settings
+from src.db.models.user import User
+
+# Profile snapshots shared across requests; callers get copies, so the cached instances never
+# change. Writes invalidate their own entry; other processes see a change once the short TTL runs out.
+_profile_cache: TtlLruCache[str, User] = TtlLruCache(
+    max_entries=settings.USER_PROFILE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_PROFILE_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_user_profiles(*auth0_ids: str) -> None:
+    for auth0_id in auth0_ids:
+        _profile_cache.pop(auth0_id)
+
+
+async def fetch_user_profiles(auth0_ids: Iterable[str]) -> dict[str, User]:
+    """Users by auth0_id from the process cache, querying the misses in one round trip.
+
+    Each call returns its own copies, so a caller may modify (or save) what it gets back.
+    """
+    found: dict[str, User] = {}
+    missing: list[str] = []
+    for auth0_id in dict.fromkeys(auth0_ids):
+        user = _profile_cache.get(auth0_id)
+        if user is None:
+            missing.append(auth0_id)
+        else:
+            found[auth0_id] = user.model_copy(deep=True)
+    if missing:
+        for user in await User.find(In(User.auth0_id, missing)).to_list():
+            _profile_cache.put(user.auth0_id, user)
+            found[user.auth0_id] = user.model_copy(deep=True)
+    return found
+
+
+class UserProfileLoader:
+    """Per-request user lookups: each auth0_id is fetched at most once, and loads issued in
+    the same event-loop tick are batched into a single query. Callers within one request share
+    the same User instances.
+    """
+
+    def __init__(self) -> None:
+        self._results: dict[str, User | None] = {}
+        self._pending: dict[str, asyncio.Future[User | None]] = {}
+        self._queued: list[str] = []
+        # The loop only holds weak references to tasks; keep dispatches alive until they finish.
+        self._dispatches: set[asyncio.Task] = set()
+
+    def prime(self, user: User) -> None:
+        self._results[user.auth0_id] = user
+
+    async def load(self, auth0_id: str) -> User | None:
+        if auth0_id in self._results:
+            return self._results[auth0_id]
+        future = self._pending.get(auth0_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[auth0_id] = future
+            if not self._queued:
+                loop.call_soon(self._start_dispatch)
+            self._queued.append(auth0_id)
+        return await future
+
+    async def load_many(self, auth0_ids: Iterable[str]) -> dict[str, User]:
+        """Users that exist, keyed by auth0_id; unknown ids are left out."""
+        users = await asyncio.gather(*(self.load(auth0_id) for auth0_id in dict.fromkeys(auth0_ids)))
+        return {user.auth0_id: user for user in users if user is not None}
+
+    def _start_dispatch(self) -> None:
+        task = asyncio.ensure_future(self._dispatch())
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self) -> None:
+        batch, self._queued = self._queued, []
+        try:
+            users = await fetch_user_profiles(batch)
+        except Exception as exc:
+            for auth0_id in batch:
+                future = self._pending.pop(auth0_id)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for auth0_id in batch:
+            user = users.get(auth0_id)
+            self._results[auth0_id] = user
+            future = self._pending.pop(auth0_id)
+            if not future.done():
+                future.set_result(user)
+
+
+def get_user_loader() -> UserProfileLoader:
+    return UserProfileLoader()
+
+
+UserLoader = Annotated[UserProfileLoader, Depends(get_user_loader)]
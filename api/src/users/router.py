@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, status
 
 from src.auth.dependencies import AuthenticatedUser
+from src.users.loader import UserLoader
 from src.users.schemas import UserCreate, UserResponse, UserUpdate
-from src.users.service import create_or_update, get_by_auth0_id, update_me, delete_by_auth0_id
+from src.users.service import create_or_update, update_me, delete_by_auth0_id
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -21,9 +22,9 @@ def _to_response(user) -> UserResponse:
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(claims: AuthenticatedUser) -> UserResponse:
+async def get_me(claims: AuthenticatedUser, users: UserLoader) -> UserResponse:
     """Current user profile (requires Auth0 token)."""
-    user = await get_by_auth0_id(claims.user_id)
+    user = await users.load(claims.user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return _to_response(user)
@@ -1,53 +1,92 @@
+from datetime import datetime, timezone
+
+from pymongo.errors import ConfigurationError, OperationFailure
+
 from src.db.models.user import User
 from src.db.models.commute import Commute
 from src.db.models.match_suggestion import MatchSuggestion
 from src.db.models.chat_room import ChatRoom
 from src.db.models.chat_message import ChatMessage
+from src.users.auth0_management import schedule_auth0_deletion, schedule_auth0_deletions
+from src.users.loader import invalidate_user_profiles
 from src.users.schemas import UserCreate, UserUpdate
-from auth0.management import Auth0 as Auth0Mgmt
-from auth0.authentication import GetToken
-from src.config import settings
-
-
-async def _delete_user_data(auth0_id: str) -> None:
-    """Remove user from matches, chats, and delete their commute(s)."""
-    await Commute.find(Commute.user_auth0_id == auth0_id).delete()
-    await MatchSuggestion.find(MatchSuggestion.participants == auth0_id).delete()
-    rooms = await ChatRoom.find(ChatRoom.participants == auth0_id).to_list()
-    for room in rooms:
-        room.participants = [p for p in room.participants if p != auth0_id]
-        if not room.participants:
-            await ChatMessage.find(ChatMessage.chat_room_id == str(room.id)).delete()
-            await room.delete()
-        else:
-            await room.save()
-
-
-def _get_auth0_mgmt() -> Auth0Mgmt:
-    token = GetToken(
-        settings.AUTH0_DOMAIN,
-        settings.AUTH0_MGMT_CLIENT_ID,
-        client_secret=settings.AUTH0_MGMT_CLIENT_SECRET,
+
+# Returned by servers that cannot run transactions (standalone mongod).
+_ILLEGAL_OPERATION = 20
+
+
+async def _delete_users_data(auth0_ids: list[str], session=None) -> None:
+    """Remove users from matches and chats and delete their commutes, in a few bulk writes."""
+    await Commute.get_pymongo_collection().delete_many({"user_auth0_id": {"$in": auth0_ids}}, session=session)
+    await MatchSuggestion.get_pymongo_collection().delete_many({"participants": {"$in": auth0_ids}}, session=session)
+
+    leaving = set(auth0_ids)
+    rooms = ChatRoom.get_pymongo_collection().find(
+        {"participants": {"$in": auth0_ids}},
+        {"participants": 1},
+        session=session,
     )
-    mgmt_token = token.client_credentials(
-        f"https://{settings.AUTH0_DOMAIN}/api/v2/"
+    emptied_room_ids = [room["_id"] async for room in rooms if set(room["participants"]) <= leaving]
+    if emptied_room_ids:
+        await ChatMessage.get_pymongo_collection().delete_many(
+            {"chat_room_id": {"$in": [str(room_id) for room_id in emptied_room_ids]}},
+            session=session,
+        )
+        await ChatRoom.get_pymongo_collection().delete_many({"_id": {"$in": emptied_room_ids}}, session=session)
+    await ChatRoom.get_pymongo_collection().update_many(
+        {"participants": {"$in": auth0_ids}},
+        {"$pull": {"participants": {"$in": auth0_ids}}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        session=session,
     )
-    return Auth0Mgmt(settings.AUTH0_DOMAIN, mgmt_token["access_token"])
+    await User.get_pymongo_collection().delete_many({"auth0_id": {"$in": auth0_ids}}, session=session)
+    invalidate_user_profiles(*auth0_ids)
+
+
+async def _delete_users_cascade(auth0_ids: list[str]) -> None:
+    client = User.get_pymongo_collection().database.client
+    try:
+        async with client.start_session() as session:
+            await session.with_transaction(lambda session: _delete_users_data(auth0_ids, session=session))
+    except (ConfigurationError, OperationFailure) as exc:
+        if isinstance(exc, OperationFailure) and exc.code != _ILLEGAL_OPERATION:
+            raise
+        # Standalone servers have no transactions; every step is idempotent, so just run it.
+        await _delete_users_data(auth0_ids)
+
+
+async def delete_users_bulk(auth0_ids: list[str], *, batch_size: int = 500) -> int:
+    """Delete users and everything that references them (e.g. a GDPR batch). Returns users deleted."""
+    deleted = 0
+    unique_ids = list(dict.fromkeys(auth0_ids))
+    for start in range(0, len(unique_ids), max(1, batch_size)):
+        batch = unique_ids[start : start + batch_size]
+        existing = [
+            document["auth0_id"]
+            async for document in User.get_pymongo_collection().find(
+                {"auth0_id": {"$in": batch}}, {"auth0_id": 1}
+            )
+        ]
+        if not existing:
+            continue
+        # Recorded first so a crash part-way through cannot orphan Auth0 identities.
+        await schedule_auth0_deletions(existing)
+        await _delete_users_cascade(existing)
+        deleted += len(existing)
+    return deleted
+
 
 async def delete_by_auth0_id(auth0_id: str) -> User | None:
     user = await get_by_auth0_id(auth0_id)
     if not user:
         return None
 
-    await _delete_user_data(auth0_id)
-    await user.delete()
-    try:
-        mgmt = _get_auth0_mgmt()
-        mgmt.users.delete(auth0_id)
-    except Exception:
-        pass
+    # Recorded first so a crash part-way through cannot orphan the Auth0 identity; a background
+    # worker removes it so the request does not wait on Auth0.
+    await schedule_auth0_deletion(auth0_id)
+    await _delete_users_cascade([auth0_id])
     return user
 
+
 async def get_by_auth0_id(auth0_id: str) -> User | None:
     return await User.find_one(User.auth0_id == auth0_id)
 
@@ -60,6 +99,7 @@ async def create_or_update(auth0_id: str, payload: UserCreate) -> User:
         existing.gender = payload.gender
         existing.interests = payload.interests
         await existing.save()
+        invalidate_user_profiles(auth0_id)
         return existing
     user = User(
         auth0_id=auth0_id,
@@ -69,6 +109,7 @@ async def create_or_update(auth0_id: str, payload: UserCreate) -> User:
         interests=payload.interests,
     )
     await user.insert()
+    invalidate_user_profiles(auth0_id)
     return user
 
 
@@ -85,4 +126,5 @@ async def update_me(auth0_id: str, payload: UserUpdate) -> User | None:
     if payload.interests is not None:
         user.interests = payload.interests
     await user.save()
+    invalidate_user_profiles(auth0_id)
     return user
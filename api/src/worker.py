@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RetryingWorker(Generic[T]):
+    """In-process job queue drained by a fixed number of tasks.
+
+    A job whose handler raises is re-queued after retry_base_seconds * 2**(attempt - 1);
+    after max_attempts it is handed to on_give_up instead.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        handler: Callable[[T], Awaitable[None]],
+        concurrency: int,
+        max_attempts: int,
+        retry_base_seconds: float,
+        on_give_up: Callable[[T, Exception], Awaitable[None]] | None = None,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.on_give_up = on_give_up
+        self._queue: asyncio.Queue[tuple[T, int]] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._run(), name=f"{self.name}-{index}")
+            for index in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        tasks = [*self._workers, *self._retries]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._retries.clear()
+        self._queue = None
+
+    def submit(self, job: T) -> None:
+        if self._queue is None:
+            raise RuntimeError(f"{self.name} worker is not running")
+        self._queue.put_nowait((job, 1))
+
+    async def join(self) -> None:
+        """Wait until the queue is empty and no retries are pending."""
+        while self._queue is not None:
+            await self._queue.join()
+            if not self._retries:
+                return
+            await asyncio.gather(*list(self._retries), return_exceptions=True)
+
+    async def _retry_later(self, job: T, attempt: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        if self._queue is not None:
+            self._queue.put_nowait((job, attempt))
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            job, attempt = await queue.get()
+            try:
+                await self.handler(job)
+            except Exception as exc:
+                if attempt >= self.max_attempts:
+                    logger.warning("%s job %r failed after %s attempts: %s", self.name, job, attempt, exc)
+                    if self.on_give_up is not None:
+                        try:
+                            await self.on_give_up(job, exc)
+                        except Exception as give_up_exc:
+                            logger.warning("%s give-up handler failed: %s", self.name, give_up_exc)
+                else:
+                    delay = self.retry_base_seconds * (2 ** (attempt - 1))
+                    retry = asyncio.create_task(self._retry_later(job, attempt + 1, delay))
+                    self._retries.add(retry)
+                    retry.add_done_callback(self._retries.discard)
+            finally:
+                queue.task_done()
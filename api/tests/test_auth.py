@@ -0,0 +1,47 @@
+import asyncio
+
+from auth0_api_python.cache import InMemoryCache
+
+from src.auth.token_cache import JwksRefresher, VerifiedTokenCache
+
+
+def test_verified_token_cache_expires_at_token_exp() -> None:
+    now = [1000.0]
+    cache = VerifiedTokenCache(max_entries=10, max_ttl_seconds=300, clock=lambda: now[0])
+    claims = {"sub": "auth0|a", "exp": 1060}
+
+    cache.put("Bearer token-a", claims)
+    assert cache.get("Bearer token-a") == claims
+    assert cache.get("Bearer token-b") is None
+
+    now[0] = 1060
+    assert cache.get("Bearer token-a") is None
+    assert len(cache) == 0
+
+
+def test_verified_token_cache_skips_dpop_and_expired_tokens() -> None:
+    cache = VerifiedTokenCache(max_entries=10, max_ttl_seconds=300, clock=lambda: 1000.0)
+
+    cache.put("DPoP token-a", {"sub": "auth0|a", "exp": 2000})
+    cache.put("Bearer token-b", {"sub": "auth0|b", "exp": 999})
+    cache.put("Bearer token-c", {"sub": "auth0|c"})
+
+    assert len(cache) == 0
+    assert cache.get("DPoP token-a") is None
+
+
+def test_jwks_refresher_warms_sdk_cache() -> None:
+    documents = {
+        "https://tenant.test/.well-known/openid-configuration": {"jwks_uri": "https://tenant.test/jwks.json"},
+        "https://tenant.test/jwks.json": {"keys": [{"kid": "k1"}]},
+    }
+
+    async def fetch(url: str) -> dict:
+        return documents[url]
+
+    cache = InMemoryCache(max_entries=4)
+    refresher = JwksRefresher(domain="tenant.test", cache=cache, interval_seconds=60, custom_fetch=fetch)
+    asyncio.run(refresher.refresh_once())
+
+    assert cache.get("https://tenant.test/") == documents["https://tenant.test/.well-known/openid-configuration"]
+    assert cache.get("https://tenant.test/jwks.json") == {"keys": [{"kid": "k1"}]}
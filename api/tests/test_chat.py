@@ -0,0 +1,364 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.auth.dependencies import get_token_claims
+from src.auth.schemas import TokenClaims
+from src.cache import TtlLruCache
+from src.chat.dryness import CONTINUATION_STATS, ConversationSample, assess_dryness
+from src.chat.introductions import (
+    INTRO_DEAD_LETTERS,
+    _post_introduction_with_retries,
+    drain_dead_letters,
+    introduction_cache_key,
+)
+from src.gemini.gemini import QUESTIONS_FALLBACK
+from src.main import app
+
+
+@pytest.fixture
+def client():
+    with patch("src.main.init_db", new_callable=AsyncMock):
+        with TestClient(app) as c:
+            yield c
+
+
+@pytest.fixture(autouse=True)
+def override_auth():
+    app.dependency_overrides[get_token_claims] = lambda: TokenClaims(user_id="test-auth0-id")
+    yield
+    app.dependency_overrides.clear()
+
+
+def _sse_events(raw: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in raw.strip().split("\n\n"):
+        event = "message"
+        data = None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def test_introduction_cache_key_ignores_order_and_whitespace() -> None:
+    alice = {"name": "Alice", "occupation": "Engineer", "interests": ["Hiking", "coffee"]}
+    bob = {"name": "Bob", "occupation": "Designer", "interests": ["photography"]}
+    alice_variant = {"name": " Alice ", "occupation": "Engineer", "interests": ["coffee ", "hiking"]}
+
+    assert introduction_cache_key([alice, bob]) == introduction_cache_key([bob, alice_variant])
+
+
+def test_introduction_cache_key_changes_with_profile() -> None:
+    alice = {"name": "Alice", "occupation": "Engineer", "interests": ["hiking"]}
+    bob = {"name": "Bob", "occupation": "Designer", "interests": ["photography"]}
+    bob_changed = {"name": "Bob", "occupation": "Designer", "interests": ["cooking"]}
+
+    assert introduction_cache_key([alice, bob]) != introduction_cache_key([alice, bob_changed])
+
+
+def test_ttl_lru_cache_evicts_least_recently_used() -> None:
+    cache = TtlLruCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "intro a")
+    cache.put("b", "intro b")
+    assert cache.get("a") == "intro a"
+    cache.put("c", "intro c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "intro a"
+    assert cache.get("c") == "intro c"
+
+
+def test_ttl_lru_cache_expires_entries() -> None:
+    cache = TtlLruCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "intro a", ttl_seconds=0)
+
+    assert cache.get("a") is None
+
+
+def test_stream_questions_without_messages_returns_fallback(client) -> None:
+    response = client.post("/api/chat/questions/stream", json={"messages": []})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+    assert events[0] == ("message", {"text": QUESTIONS_FALLBACK})
+    assert events[-1] == ("done", {"text": QUESTIONS_FALLBACK, "message": None})
+
+
+@patch("src.chat.router.get_cached_introduction", new_callable=AsyncMock)
+def test_stream_introduction_serves_cached_text(mock_cached, client) -> None:
+    mock_cached.return_value = "Alice, meet Bob!"
+    users = [
+        {"name": "Alice", "occupation": "Engineer", "interests": ["hiking"]},
+        {"name": "Bob", "occupation": "Designer", "interests": ["hiking"]},
+    ]
+
+    response = client.post("/api/chat/introduction/stream", json={"users": users})
+
+    assert response.status_code == 200
+    events = _sse_events(response.text)
+    assert events == [
+        ("message", {"text": "Alice, meet Bob!"}),
+        ("done", {"text": "Alice, meet Bob!", "message": None}),
+    ]
+
+
+@patch("src.chat.router._require_room", new_callable=AsyncMock)
+@patch("src.chat.router.post_system_message", new_callable=AsyncMock)
+@patch("src.chat.router.store_introduction", new_callable=AsyncMock)
+@patch("src.chat.router.get_cached_introduction", new_callable=AsyncMock, return_value=None)
+def test_stream_introduction_failure_mid_stream_is_not_cached_or_posted(
+    mock_cached, mock_store, mock_post, mock_room, client
+) -> None:
+    async def broken_stream(users):
+        yield "Alice, meet"
+        raise RuntimeError("connection reset")
+
+    users = [
+        {"name": "Alice", "occupation": "Engineer", "interests": ["hiking"]},
+        {"name": "Bob", "occupation": "Designer", "interests": ["hiking"]},
+    ]
+    with patch("src.chat.router.GeminiClient") as gemini:
+        gemini.return_value.stream_initial_introduction = broken_stream
+        response = client.post("/api/chat/introduction/stream", json={"users": users, "room_id": "room-1"})
+
+    events = _sse_events(response.text)
+    assert events[0] == ("message", {"text": "Alice, meet"})
+    assert events[-1] == ("error", {"detail": "Generation failed: connection reset"})
+    mock_store.assert_not_awaited()
+    mock_post.assert_not_awaited()
+
+
+@patch("src.chat.router._require_room", new_callable=AsyncMock)
+@patch("src.chat.router.claim_room_introduction", new_callable=AsyncMock, return_value=None)
+@patch("src.chat.router.post_system_message", new_callable=AsyncMock)
+@patch("src.chat.router.get_cached_introduction", new_callable=AsyncMock)
+def test_stream_introduction_does_not_repost_after_batch(
+    mock_cached, mock_post, mock_claim, mock_room, client
+) -> None:
+    # The matching cycle already claimed the room and posted its introduction.
+    mock_cached.return_value = "Alice, meet Bob!"
+    users = [
+        {"name": "Alice", "occupation": "Engineer", "interests": ["hiking"]},
+        {"name": "Bob", "occupation": "Designer", "interests": ["hiking"]},
+    ]
+
+    response = client.post("/api/chat/introduction/stream", json={"users": users, "room_id": "room-1"})
+
+    events = _sse_events(response.text)
+    assert events[-1] == ("done", {"text": "Alice, meet Bob!", "message": None})
+    mock_claim.assert_awaited_once_with("room-1")
+    mock_post.assert_not_awaited()
+
+
+def test_stream_introduction_requires_two_users(client) -> None:
+    response = client.post(
+        "/api/chat/introduction/stream",
+        json={"users": [{"name": "Alice", "occupation": "Engineer", "interests": []}]},
+    )
+    assert response.status_code == 400
+
+
+def _conversation(now: datetime, gaps_seconds: list[int], bodies: list[str], senders: list[str]):
+    timestamps = []
+    current = now
+    for gap in reversed(gaps_seconds):
+        timestamps.append(current)
+        current -= timedelta(seconds=gap)
+    timestamps.append(current)
+    timestamps.reverse()
+    return [
+        ConversationSample(sender=sender, body=body, created_at=created_at)
+        for sender, body, created_at in zip(senders, bodies, timestamps, strict=True)
+    ]
+
+
+def test_dryness_flowing_conversation_is_not_stalled() -> None:
+    now = datetime.now(timezone.utc)
+    samples = _conversation(
+        now - timedelta(seconds=20),
+        [30, 25, 40],
+        [
+            "Hey! Are you also on the 8am Red Line?",
+            "Yes, every day. Do you usually sit in the front car?",
+            "Always the front, it is quieter there in the mornings.",
+            "Nice, I will look for you tomorrow then!",
+        ],
+        ["a", "b", "a", "b"],
+    )
+
+    verdict = assess_dryness(samples, now=now)
+    assert not verdict.stalled
+    assert verdict.reasons == ()
+
+
+def test_dryness_flags_idle_short_and_one_sided_chats() -> None:
+    now = datetime.now(timezone.utc)
+    idle = _conversation(
+        now - timedelta(minutes=10),
+        [30],
+        ["Hi there, excited to commute together!", "Same here, see you Monday morning."],
+        ["a", "b"],
+    )
+    short = _conversation(now, [10, 10], ["ok", "lol", "yeah"], ["a", "b", "a"])
+    one_sided = _conversation(
+        now,
+        [20, 20],
+        ["Hello, nice to meet you!", "Are you taking the bus tomorrow?", "Let me know when you can!"],
+        ["a", "a", "a"],
+    )
+
+    assert assess_dryness(idle, now=now).reasons == ("idle",)
+    assert "short_replies" in assess_dryness(short, now=now).reasons
+    assert "one_sided" in assess_dryness(one_sided, now=now).reasons
+
+
+@patch("src.chat.router.GeminiClient")
+def test_continuation_skips_gemini_when_flowing(mock_gemini, client) -> None:
+    now = datetime.now(timezone.utc)
+    before = CONTINUATION_STATS.snapshot()
+    messages = [
+        {
+            "role": "user",
+            "name": name,
+            "content": content,
+            "created_at": (now - timedelta(seconds=offset)).isoformat(),
+        }
+        for name, content, offset in [
+            ("Alice", "Do you want to grab coffee before the train?", 60),
+            ("Bob", "Definitely, the place by the station opens at seven.", 40),
+            ("Alice", "Perfect, I will meet you there at 7:15 then.", 20),
+        ]
+    ]
+
+    response = client.post("/api/chat/continuation", json={"messages": messages})
+
+    assert response.status_code == 200
+    assert response.json() == {"continuation": None}
+    mock_gemini.assert_not_called()
+    after = CONTINUATION_STATS.snapshot()
+    assert after["skipped"] == before["skipped"] + 1
+    assert after["forwarded"] == before["forwarded"]
+
+
+@patch("src.chat.router.GeminiClient")
+def test_continuation_forwards_to_gemini_without_timestamps(mock_gemini, client) -> None:
+    mock_gemini.return_value.get_chat_continuation.return_value = "Anyone tried the new bakery?"
+    messages = [
+        {"role": "user", "name": "Alice", "content": "Do you want to grab coffee before the train?"},
+        {"role": "user", "name": "Bob", "content": "Definitely, the place by the station opens at seven."},
+    ]
+
+    response = client.post("/api/chat/continuation", json={"messages": messages})
+
+    assert response.status_code == 200
+    assert response.json() == {"continuation": "Anyone tried the new bakery?"}
+    mock_gemini.return_value.get_chat_continuation.assert_called_once()
+
+
+@patch("src.chat.introductions.settings.INTRO_BATCH_RETRY_BASE_SECONDS", 0)
+@patch("src.chat.introductions.release_room_introduction", new_callable=AsyncMock)
+@patch("src.chat.introductions.claim_room_introduction", new_callable=AsyncMock)
+@patch("src.chat.introductions.post_system_message", new_callable=AsyncMock)
+@patch("src.chat.introductions.get_or_generate_introduction", new_callable=AsyncMock)
+def test_batch_introduction_retries_then_dead_letters(mock_generate, mock_post, mock_claim, mock_release) -> None:
+    match = SimpleNamespace(id="match-1", chat_room_id="room-1", participants=["a", "b"])
+    users = [{"name": "A", "occupation": "x", "interests": []}, {"name": "B", "occupation": "y", "interests": []}]
+    drain_dead_letters()
+    claimed_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    mock_claim.return_value = claimed_at
+
+    mock_generate.side_effect = [RuntimeError("quota"), "Hello A and B!"]
+    outcome = asyncio.run(
+        _post_introduction_with_retries(match, users, semaphore=asyncio.Semaphore(1), max_attempts=3)
+    )
+    assert outcome == "posted"
+    mock_post.assert_awaited_once_with("room-1", "Hello A and B!")
+    assert not INTRO_DEAD_LETTERS
+
+    mock_generate.side_effect = RuntimeError("quota")
+    outcome = asyncio.run(
+        _post_introduction_with_retries(match, users, semaphore=asyncio.Semaphore(1), max_attempts=2)
+    )
+    assert outcome == "failed"
+    letters = drain_dead_letters()
+    assert [(letter.match_id, letter.attempts) for letter in letters] == [("match-1", 2)]
+
+
+@patch("src.chat.introductions.settings.INTRO_BATCH_RETRY_BASE_SECONDS", 0)
+@patch("src.chat.introductions.release_room_introduction", new_callable=AsyncMock)
+@patch("src.chat.introductions.claim_room_introduction", new_callable=AsyncMock)
+@patch("src.chat.introductions.post_system_message", new_callable=AsyncMock)
+@patch("src.chat.introductions.get_or_generate_introduction", new_callable=AsyncMock)
+def test_introduction_posts_once_per_claimed_room(mock_generate, mock_post, mock_claim, mock_release) -> None:
+    match = SimpleNamespace(id="match-1", chat_room_id="room-1", participants=["a", "b"])
+    users = [{"name": "A", "occupation": "x", "interests": []}, {"name": "B", "occupation": "y", "interests": []}]
+    drain_dead_letters()
+    mock_generate.return_value = "Hello A and B!"
+    claimed_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    # Another run already holds the claim: nothing is posted.
+    mock_claim.return_value = None
+    outcome = asyncio.run(
+        _post_introduction_with_retries(match, users, semaphore=asyncio.Semaphore(1), max_attempts=2)
+    )
+    assert outcome == "skipped"
+    mock_post.assert_not_awaited()
+
+    # A failed post gives the claim back before retrying.
+    mock_claim.return_value = claimed_at
+    mock_post.side_effect = [RuntimeError("mongo down"), None]
+    outcome = asyncio.run(
+        _post_introduction_with_retries(match, users, semaphore=asyncio.Semaphore(1), max_attempts=2)
+    )
+    assert outcome == "posted"
+    mock_release.assert_awaited_once_with("room-1", claimed_at)
+    assert mock_post.await_count == 2
+
+
+def test_list_reads_use_the_list_read_preference() -> None:
+    from pymongo.read_preferences import ReadPreference
+
+    from src.db import mongodb
+
+    seen = {}
+
+    class FakeCollection:
+        def with_options(self, read_preference):
+            seen["read_preference"] = read_preference
+            return self
+
+        def find(self, query, **kwargs):
+            seen["query"], seen["kwargs"] = query, kwargs
+
+            async def iterate():
+                yield {"_id": 1}
+
+            return iterate()
+
+    model = SimpleNamespace(get_pymongo_collection=lambda: FakeCollection())
+    query = SimpleNamespace(
+        document_model=model,
+        get_filter_query=lambda: {"participants": "test-auth0-id"},
+        sort_expressions=[("created_at", -1)],
+        skip_number=0,
+        limit_number=1,
+    )
+    with patch.object(mongodb.settings, "MONGO_LIST_READ_PREFERENCE", "secondaryPreferred"), patch.object(
+        mongodb, "parse_obj", side_effect=lambda model, document: document
+    ):
+        result = asyncio.run(mongodb.find_for_list(query))
+
+    assert result == [{"_id": 1}]
+    assert seen["read_preference"] == ReadPreference.SECONDARY_PREFERRED
+    assert seen["query"] == {"participants": "test-auth0-id"}
+    assert seen["kwargs"] == {"sort": [("created_at", -1)], "skip": 0, "limit": 1}
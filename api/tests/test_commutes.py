@@ -0,0 +1,294 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.auth.dependencies import get_token_claims
+from src.auth.schemas import TokenClaims
+from src.commutes.schemas import CommuteBatchItem, CommuteBatchResponse, CommuteCreate
+from src.commutes.service import (
+    RouteJob,
+    _generate_pending_route,
+    create_or_replace_commute,
+    import_commutes_batch,
+    pause_matching,
+)
+from src.config import settings
+from src.db.models.commute import Commute, RouteAlternative, RouteSegment
+from src.main import app
+from src.routing.geometry import (
+    NormalizedRouteGeometry,
+    flatten_segment_coordinates,
+    segments_for_storage,
+    segments_from_storage,
+)
+from src.routing.polyline import decode_polyline, encode_polyline
+from src.routing.service import RouteGenerationError
+from src.worker import RetryingWorker
+
+GEOMETRY = NormalizedRouteGeometry(
+    route_segments=[{"type": "walk", "coordinates": [(42.35, -71.06), (42.36, -71.06)]}],
+    route_coordinates=[(42.35, -71.06), (42.36, -71.06)],
+    total_duration_minutes=14,
+)
+
+
+def _item(user_id: str, start_lat: float, start_minute: int = 480) -> CommuteBatchItem:
+    return CommuteBatchItem.model_validate(
+        {
+            "user_auth0_id": user_id,
+            "start": {"name": "Home", "lat": start_lat, "lng": -71.06},
+            "end": {"name": "Office", "lat": 42.3601, "lng": -71.0589},
+            "time_window": {"start_minute": start_minute, "end_minute": start_minute + 30},
+            "transport_mode": "walk",
+            "match_preference": "individual",
+            "group_size_pref": {"min": 2, "max": 2},
+        }
+    )
+
+
+def test_import_commutes_batch_dedupes_routes_and_reports_per_item() -> None:
+    async def fake_route(**kwargs):
+        if kwargs["start_lat"] > 42.4:
+            raise RouteGenerationError("no itinerary")
+        return GEOMETRY
+
+    route_mock = AsyncMock(side_effect=fake_route)
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock(return_value=SimpleNamespace(upserted_ids={0: "new-id"}))
+    items = [
+        _item("user-a", 42.35001),
+        _item("user-b", 42.35002, start_minute=485),
+        _item("user-c", 42.5),
+    ]
+
+    with (
+        patch("src.commutes.service.generate_route_for_commute", route_mock),
+        patch.object(Commute, "get_pymongo_collection", return_value=collection),
+        patch(
+            "src.commutes.service._commute_ids_by_user",
+            AsyncMock(return_value={"user-a": "id-a", "user-b": "id-b"}),
+        ),
+    ):
+        result = asyncio.run(import_commutes_batch(items))
+
+    assert route_mock.await_count == 2
+    assert result.routes_requested == 2
+    assert (result.created, result.updated, result.failed) == (1, 1, 1)
+    assert [item.status for item in result.results] == ["created", "updated", "failed"]
+    assert result.results[0].commute_id == "id-a"
+    assert "no itinerary" in result.results[2].error
+    operations = collection.bulk_write.await_args.args[0]
+    assert len(operations) == 2
+
+
+def test_import_commutes_batch_queues_routes_in_background_mode() -> None:
+    route_mock = AsyncMock(return_value=GEOMETRY)
+    enqueue = MagicMock()
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock(return_value=SimpleNamespace(upserted_ids={0: "new-id"}))
+
+    with (
+        patch.object(settings, "ROUTE_GENERATION_MODE", "background"),
+        patch("src.commutes.service.generate_route_for_commute", route_mock),
+        patch("src.commutes.service._enqueue_route_job", enqueue),
+        patch.object(Commute, "get_pymongo_collection", return_value=collection),
+        patch(
+            "src.commutes.service._commute_ids_by_user",
+            AsyncMock(return_value={"user-a": "id-a", "user-b": "id-b"}),
+        ),
+    ):
+        result = asyncio.run(import_commutes_batch([_item("user-a", 42.35), _item("user-b", 42.36)]))
+
+    route_mock.assert_not_awaited()
+    assert result.routes_requested == 0
+    assert (result.created, result.updated, result.failed) == (1, 1, 0)
+    written = [operation._doc["$set"] for operation in collection.bulk_write.await_args.args[0]]
+    assert {fields["route_status"] for fields in written} == {"pending"}
+    jobs = [call.args[0] for call in enqueue.call_args_list]
+    assert [(job.commute_id, job.route_request_id) for job in jobs] == [
+        ("id-a", written[0]["route_request_id"]),
+        ("id-b", written[1]["route_request_id"]),
+    ]
+
+
+def test_batch_import_rejects_other_users_commutes_unless_importer() -> None:
+    body = {"commutes": [_item("test-auth0-id", 42.35).model_dump(), _item("someone-else", 42.35).model_dump()]}
+    empty = CommuteBatchResponse(created=0, updated=0, failed=0, routes_requested=0, results=[])
+    app.dependency_overrides[get_token_claims] = lambda: TokenClaims(user_id="test-auth0-id")
+    try:
+        with (
+            patch("src.main.init_db", new_callable=AsyncMock),
+            patch("src.commutes.router.import_commutes_batch", AsyncMock(return_value=empty)) as import_mock,
+            TestClient(app) as client,
+        ):
+            forbidden = client.post("/api/commutes/batch", json=body)
+            own_only = client.post("/api/commutes/batch", json={"commutes": body["commutes"][:1]})
+            with patch.object(settings, "COMMUTE_BATCH_IMPORTER_IDS", ["test-auth0-id"]):
+                importer = client.post("/api/commutes/batch", json=body)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert forbidden.status_code == 403
+    assert own_only.status_code == 200
+    assert importer.status_code == 200
+    assert import_mock.await_count == 2
+
+
+def test_retrying_worker_retries_then_gives_up() -> None:
+    attempts: dict[str, int] = {}
+    given_up: list[str] = []
+
+    async def handler(job: str) -> None:
+        attempts[job] = attempts.get(job, 0) + 1
+        if job == "broken" or attempts[job] < 2:
+            raise RouteGenerationError("OTP unavailable")
+
+    async def on_give_up(job: str, exc: Exception) -> None:
+        given_up.append(job)
+
+    async def scenario() -> None:
+        worker = RetryingWorker(
+            name="test",
+            handler=handler,
+            concurrency=2,
+            max_attempts=3,
+            retry_base_seconds=0,
+            on_give_up=on_give_up,
+        )
+        worker.start()
+        worker.submit("flaky")
+        worker.submit("broken")
+        await worker.join()
+        await worker.stop()
+
+    asyncio.run(scenario())
+
+    assert attempts == {"flaky": 2, "broken": 3}
+    assert given_up == ["broken"]
+
+
+def test_background_route_mode_saves_commute_as_pending() -> None:
+    inserted: list[SimpleNamespace] = []
+
+    class FakeCommute(SimpleNamespace):
+        async def insert(self):
+            inserted.append(self)
+            return self
+
+    payload = _item("user-a", 42.35).model_dump(exclude={"user_auth0_id"})
+    route_mock = AsyncMock()
+    with (
+        patch.object(settings, "ROUTE_GENERATION_MODE", "background"),
+        patch("src.commutes.service.get_my_commute", AsyncMock(return_value=None)),
+        patch("src.commutes.service.generate_route_for_commute", route_mock),
+        patch("src.commutes.service._enqueue_route_generation") as enqueue,
+        patch("src.commutes.service.Commute", FakeCommute),
+    ):
+        commute = asyncio.run(create_or_replace_commute("user-a", CommuteCreate.model_validate(payload)))
+
+    route_mock.assert_not_awaited()
+    enqueue.assert_called_once_with(commute)
+    assert inserted == [commute]
+    assert commute.route_status == "pending"
+    assert commute.route_segments == []
+
+
+def test_pending_route_is_written_only_for_its_own_route_request() -> None:
+    job = RouteJob(commute_id="507f1f77bcf86cd799439011", route_request_id="request-1")
+    pending = SimpleNamespace(
+        route_status="pending",
+        route_request_id="request-1",
+        start={"lat": 42.35, "lng": -71.06},
+        end={"lat": 42.36, "lng": -71.06},
+        time_window={"start_minute": 480},
+        transport_mode="walk",
+    )
+    edited = SimpleNamespace(**{**vars(pending), "route_request_id": "request-2"})
+    collection = MagicMock()
+    collection.update_one = AsyncMock(return_value=SimpleNamespace(matched_count=0))
+
+    with (
+        patch("src.commutes.service.generate_route_for_commute", AsyncMock(return_value=GEOMETRY)),
+        patch.object(Commute, "get_pymongo_collection", return_value=collection),
+        patch.object(Commute, "get", AsyncMock(side_effect=[pending, edited])),
+    ):
+        # Edited while OTP was planning: the stale route is dropped, not retried.
+        asyncio.run(_generate_pending_route(job))
+    route_filter = collection.update_one.await_args.args[0]
+    assert route_filter["route_request_id"] == "request-1"
+    assert "updated_at" not in route_filter
+
+    with (
+        patch("src.commutes.service.generate_route_for_commute", AsyncMock(return_value=GEOMETRY)),
+        patch.object(Commute, "get_pymongo_collection", return_value=collection),
+        patch.object(Commute, "get", AsyncMock(return_value=pending)),
+    ):
+        # Still this job's request, so the lost write is raised for the worker to retry.
+        with pytest.raises(RuntimeError, match="was not saved"):
+            asyncio.run(_generate_pending_route(job))
+
+
+def test_pause_matching_sets_only_status_fields() -> None:
+    commute = SimpleNamespace(set=AsyncMock(), save=AsyncMock())
+    with patch("src.commutes.service.get_my_commute", AsyncMock(return_value=commute)):
+        asyncio.run(pause_matching("user-a"))
+
+    commute.save.assert_not_awaited()
+    assert set(commute.set.await_args.args[0]) == {"status", "updated_at"}
+
+
+def test_route_segment_stores_legacy_coordinates_as_polyline() -> None:
+    walk = RouteSegment.model_validate(
+        {"type": "walk", "coordinates": [[42.35, -71.06], [42.3525, -71.0626]], "label": "Walk to Chinatown"}
+    )
+    ride = RouteSegment.model_validate({"type": "transit", "coordinates": [(42.3525, -71.0626), (42.3656, -71.0616)]})
+
+    assert "coordinates" not in walk.model_dump()
+    assert walk.polyline
+    assert walk.coordinates == [(42.35, -71.06), (42.3525, -71.0626)]
+    assert flatten_segment_coordinates([walk.coordinates, ride.coordinates]) == [
+        (42.35, -71.06),
+        (42.3525, -71.0626),
+        (42.3656, -71.0616),
+    ]
+
+
+def test_route_coordinates_decode_once_per_polyline() -> None:
+    alternative = RouteAlternative.model_validate(
+        {
+            "route_segments": [
+                {"type": "walk", "coordinates": [(42.35, -71.06), (42.3525, -71.0626)]},
+                {"type": "transit", "coordinates": [(42.3525, -71.0626), (42.3656, -71.0616)]},
+            ]
+        }
+    )
+
+    with patch("src.db.models.commute.decode_polyline", wraps=decode_polyline) as decode:
+        first = alternative.route_coordinates
+        assert alternative.route_coordinates is first
+        assert decode.call_count == 2
+
+        alternative.route_segments[1].polyline = encode_polyline([(42.3525, -71.0626), (42.37, -71.06)])
+        assert alternative.route_coordinates[-1] == (42.37, -71.06)
+        assert decode.call_count == 3
+
+
+def test_commute_reads_legacy_flat_route_as_one_segment() -> None:
+    data = Commute.upgrade_legacy_route(
+        {"transport_mode": "transit", "route_coordinates": [[42.35, -71.06], [42.36, -71.06]]}
+    )
+
+    assert "route_coordinates" not in data
+    segment = RouteSegment.model_validate(data["route_segments"][0])
+    assert segment.type == "transit"
+    assert segment.coordinates == [(42.35, -71.06), (42.36, -71.06)]
+
+
+def test_route_segments_storage_round_trip() -> None:
+    stored = segments_for_storage(GEOMETRY.route_segments)
+
+    assert "coordinates" not in stored[0]
+    assert segments_from_storage(stored) == GEOMETRY.route_segments
@@ -0,0 +1,77 @@
+"""
+Tests for /api/health routes. Dependency probes are replaced, so no MongoDB/OTP/Gemini is needed.
+"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.health import service
+from src.main import app
+
+
+@pytest.fixture
+def client():
+    with patch("src.main.init_db", new_callable=AsyncMock):
+        with TestClient(app) as c:
+            yield c
+
+
+def _probe(calls: list[str], name: str, *, fail: bool = False, delay: float = 0.0):
+    async def probe() -> None:
+        calls.append(name)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{name} down")
+
+    return probe
+
+
+def test_health_reports_startup_timings(client) -> None:
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert "ready_seconds" in response.json()["startup"]
+    assert client.get("/api/health/live").json()["status"] == "ok"
+
+
+def test_ready_is_503_only_when_a_required_dependency_fails(client) -> None:
+    calls: list[str] = []
+    probes = {"mongo": _probe(calls, "mongo"), "otp": _probe(calls, "otp", fail=True), "gemini": None}
+    probe = service.ReadinessProbe(cache_seconds=0, timeout_seconds=1, probes=lambda: probes)
+    with patch("src.health.router.readiness_probe", probe):
+        degraded = client.get("/api/health/ready")
+        assert degraded.status_code == 200
+        body = degraded.json()
+        assert body["status"] == "degraded"
+        assert body["checks"]["mongo"]["status"] == "ok"
+        assert body["checks"]["mongo"]["latency_ms"] is not None
+        assert body["checks"]["otp"]["detail"] == "RuntimeError: otp down"
+        assert body["checks"]["gemini"]["status"] == "skipped"
+
+        probes["mongo"] = _probe(calls, "mongo", delay=5)
+        unavailable = client.get("/api/health/ready")
+        assert unavailable.status_code == 503
+        assert unavailable.json()["checks"]["mongo"]["detail"] == "timed out after 1s"
+
+
+def test_readiness_result_is_cached_between_polls() -> None:
+    calls: list[str] = []
+    now = [0.0]
+    probe = service.ReadinessProbe(
+        cache_seconds=5,
+        timeout_seconds=1,
+        probes=lambda: {"mongo": _probe(calls, "mongo")},
+        clock=lambda: now[0],
+    )
+
+    async def run() -> None:
+        await asyncio.gather(probe.check(), probe.check(), probe.check())
+        now[0] = 4.0
+        await probe.check()
+        now[0] = 6.0
+        await probe.check()
+
+    asyncio.run(run())
+    assert calls == ["mongo", "mongo"]
@@ -1,7 +1,20 @@
+from dataclasses import replace
+from types import SimpleNamespace
 from typing import Literal
 
-from src.matching.algorithm import MatchingCommute, MatchingUser, run_matching_algorithm
-from src.matching.settings import load_matching_settings
+import pytest
+
+from src.matching.algorithm import (
+    MatchingCommute,
+    MatchingRoute,
+    MatchingSegment,
+    MatchingUser,
+    run_matching_algorithm,
+    transit_overlap_segment,
+)
+from src.matching.service import _participant_routes
+from src.matching.settings import MatchingSettingsProvider, load_matching_settings
+from src.routing.gtfs_index import TransitIndex, TransitInterval, _make_pattern
 
 MATCHING_SETTINGS = load_matching_settings()
 
@@ -10,6 +23,7 @@ def _run_with_yaml(
     users: list[MatchingUser],
     commutes: list[MatchingCommute],
     kind: Literal["individual", "group"],
+    **overrides,
 ):
     return run_matching_algorithm(
         users=users,
@@ -21,6 +35,7 @@ def _run_with_yaml(
         overlap_weight=MATCHING_SETTINGS.algorithm.overlap_weight,
         interest_weight=MATCHING_SETTINGS.algorithm.interest_weight,
         shared_meters_per_minute=MATCHING_SETTINGS.algorithm.shared_meters_per_minute,
+        **overrides,
     )
 
 
@@ -349,3 +364,139 @@ def test_verbose_large_population_matching_logs_results() -> None:
     assert 3 in group_size_distribution
     assert 4 in group_size_distribution
 
+
+
+_LINE_STOPS = [(42.3500, -71.0600), (42.3550, -71.0600), (42.3600, -71.0600), (42.3650, -71.0600)]
+
+
+def _transit_commute(auth0_id: str, ride: TransitInterval) -> MatchingCommute:
+    ride_points = list(ride.pattern.stop_points[ride.board_position : ride.alight_position + 1])
+    walk = [(ride_points[0][0] - 0.002, -71.0650), ride_points[0]]
+    return MatchingCommute(
+        user_auth0_id=auth0_id,
+        transport_mode="transit",
+        match_preference="individual",
+        group_size_min=2,
+        group_size_max=2,
+        gender_preference="any",
+        start_minute=8 * 60,
+        end_minute=9 * 60,
+        route_coordinates=walk + ride_points[1:],
+        segments=(
+            MatchingSegment(type="walk", coordinates=walk),
+            MatchingSegment(type="transit", coordinates=ride_points, interval=ride),
+        ),
+    )
+
+
+def test_transit_overlap_uses_shared_stops() -> None:
+    index = TransitIndex(
+        feed_version="test",
+        patterns=[
+            _make_pattern(0, "red", ["a", "b", "c", "d"], _LINE_STOPS),
+            _make_pattern(1, "orange", ["w", "x", "y", "z"], _LINE_STOPS),
+        ],
+        route_ids_by_name={},
+    )
+    red, orange = index.patterns
+    left = _transit_commute("u1", TransitInterval(red, 0, 2))
+    right = _transit_commute("u2", TransitInterval(red, 1, 3))
+
+    overlap = transit_overlap_segment(left.routes[0], right.routes[0], tolerance_meters=10)
+    assert overlap is not None
+    assert (overlap.meet_point.lat, overlap.split_point.lat) == (42.3550, 42.3600)
+    assert overlap.overlap_distance_meters == pytest.approx(
+        red.stop_offsets_meters[2] - red.stop_offsets_meters[1]
+    )
+
+    # A parallel line on the same street is not a shared ride.
+    parallel = _transit_commute("u3", TransitInterval(orange, 1, 3))
+    assert transit_overlap_segment(left.routes[0], parallel.routes[0], tolerance_meters=10) is None
+    users = [_build_user("u1", "women", ["music"]), _build_user("u3", "women", ["music"])]
+    assert _run_with_yaml(users, [left, parallel], "individual") == []
+
+
+def test_pair_is_scored_on_best_alternate_itinerary() -> None:
+    users = [_build_user("u1", "women", ["music"]), _build_user("u2", "women", ["music"])]
+    shared = [(37.7749, -122.4194), (37.7760, -122.4180), (37.7770, -122.4170), (37.7780, -122.4160)]
+    elsewhere = [(37.8044, -122.2712), (37.8055, -122.2700), (37.8064, -122.2691), (37.8072, -122.2680)]
+    left = _build_commute("u1", route=shared)
+    right = _build_commute("u2", route=elsewhere)
+    assert _run_with_yaml(users, [left, right], "individual") == []
+
+    right = replace(right, alternates=(MatchingRoute(route_coordinates=shared),))
+    matches = _run_with_yaml(users, [left, right], "individual")
+    assert len(matches) == 1
+    assert matches[0].scores.overlap_score == pytest.approx(1.0)
+    assert matches[0].route_indexes == {"u1": 0, "u2": 1}
+
+    # Capped to the main-route pairing, the alternate is never compared.
+    assert _run_with_yaml(users, [left, right], "individual", max_route_pairs=1) == []
+
+    commutes = [
+        SimpleNamespace(user_auth0_id="u1", route_departure_offset_minutes=0, route_alternates=[]),
+        SimpleNamespace(
+            user_auth0_id="u2",
+            route_departure_offset_minutes=0,
+            route_alternates=[SimpleNamespace(departure_offset_minutes=10)],
+        ),
+    ]
+    routes = _participant_routes(matches[0], commutes)
+    assert [(route.auth0_id, route.alternate_index, route.departure_offset_minutes) for route in routes] == [
+        ("u1", None, 0),
+        ("u2", 0, 10),
+    ]
+
+
+def test_group_uses_one_itinerary_per_member() -> None:
+    users = [_build_user(user_id, "women", ["music"]) for user_id in ("u1", "u2", "u3")]
+    route_a = [(37.7749, -122.4194), (37.7760, -122.4180), (37.7770, -122.4170), (37.7780, -122.4160)]
+    route_b = [(37.8044, -122.2712), (37.8055, -122.2700), (37.8064, -122.2691), (37.8072, -122.2680)]
+    route_c = [(lat + 0.05, lng) for lat, lng in route_a]
+
+    def commute(user_id: str, route, *alternates):
+        return replace(
+            _build_commute(user_id, "both", 3, 4, route=route),
+            alternates=tuple(MatchingRoute(route_coordinates=alternate) for alternate in alternates),
+        )
+
+    # u3 only shares a route with the others on its alternate.
+    matches = _run_with_yaml(
+        users,
+        [commute("u1", route_a), commute("u2", route_a), commute("u3", route_b, route_a)],
+        "group",
+    )
+    assert [match.route_indexes for match in matches] == [{"u1": 0, "u2": 0, "u3": 1}]
+
+    # Every pair overlaps on some pairing, but u1 would need route A with u2 and route B
+    # with u3 at the same time.
+    split = [commute("u1", route_a, route_b), commute("u2", route_a, route_c), commute("u3", route_b, route_c)]
+    assert len(_run_with_yaml(users, split, "individual")) >= 1
+    assert _run_with_yaml(users, split, "group") == []
+
+
+def test_settings_provider_swaps_in_edited_file_and_keeps_last_good(tmp_path) -> None:
+    import os
+
+    path = tmp_path / "config.yaml"
+    path.write_text("algorithm:\n  overlap_tolerance_meters: 100\n", encoding="utf-8")
+    provider = MatchingSettingsProvider(path, check_interval_seconds=0)
+    first = provider.current()
+    assert first.algorithm.overlap_tolerance_meters == 100.0
+    assert provider.current() is first
+
+    path.write_text("algorithm:\n  overlap_tolerance_meters: 180\n", encoding="utf-8")
+    os.utime(path, ns=(1, 2_000_000_000))
+    second = provider.current()
+    assert second.algorithm.overlap_tolerance_meters == 180.0
+    assert second.version != first.version
+
+    path.write_text("algorithm: [unclosed\n", encoding="utf-8")
+    os.utime(path, ns=(1, 3_000_000_000))
+    assert provider.current() is second
+
+    path.unlink()
+    assert provider.current() is second
+
+    path.write_text("algorithm:\n  overlap_tolerance_meters: 120\n", encoding="utf-8")
+    assert provider.current().algorithm.overlap_tolerance_meters == 120.0
@@ -0,0 +1,62 @@
+"""
+Tests for the Prometheus instrumentation served at /metrics.
+"""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from src.main import app
+from src.metrics import MongoCommandMetrics
+
+
+@pytest.fixture
+def client():
+    with patch("src.main.init_db", new_callable=AsyncMock):
+        with TestClient(app) as c:
+            yield c
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _route_count(route_suffix: str, status: str) -> float:
+    # FastAPI versions differ on whether the include prefix is part of the route's path.
+    return sum(
+        sample.value
+        for metric in REGISTRY.collect()
+        for sample in metric.samples
+        if sample.name == "flock_http_request_duration_seconds_count"
+        and sample.labels["route"].endswith(route_suffix)
+        and sample.labels["status"] == status
+    )
+
+
+def test_requests_are_counted_by_route_template(client) -> None:
+    live_before = _route_count("/health/live", "200")
+    unmatched_before = _route_count("unmatched", "404")
+
+    client.get("/api/health/live")
+    client.get("/api/no-such-path/123")
+
+    assert _route_count("/health/live", "200") == live_before + 1
+    assert _route_count("unmatched", "404") == unmatched_before + 1
+    body = client.get("/metrics").text
+    assert "flock_http_requests_in_flight" in body
+    assert "/api/no-such-path/123" not in body
+
+
+def test_mongo_listener_records_command_latency() -> None:
+    metric = "flock_mongo_command_duration_seconds_count"
+    before = _sample(metric, command="find", outcome="ok")
+    failed_before = _sample(metric, command="insert", outcome="failed")
+
+    listener = MongoCommandMetrics()
+    listener.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+    listener.failed(SimpleNamespace(command_name="insert", duration_micros=800))
+
+    assert _sample(metric, command="find", outcome="ok") == before + 1
+    assert _sample(metric, command="insert", outcome="failed") == failed_before + 1
@@ -0,0 +1,446 @@
+import asyncio
+import json
+import zipfile
+
+import httpx
+import pytest
+
+from src.routing.geometry import NormalizedRouteGeometry
+from src.routing.gtfs_index import build_transit_index, load_transit_index
+from src.routing.local_walk import _plan_on_graph
+from src.routing import otp_client
+from src.routing.otp_client import OtpCircuitOpenError, OtpClient, OtpClientError
+from src.routing.polyline import decode_polyline, decode_polyline_array, encode_polyline
+from src.routing.service import _normalize_route_response
+from src.routing.route_cache import get_cached_route, route_cache_key, store_route
+from src.routing.walk_graph import WalkGraph, build_walk_graph, is_walkable
+
+PLAN_DATA = {
+    "plan": {
+        "itineraries": [
+            {
+                "duration": 600,
+                "legs": [
+                    {
+                        "mode": "WALK",
+                        "duration": 600,
+                        "route": None,
+                        "legGeometry": {"points": "_p~iF~ps|U_ulLnnqC"},
+                    }
+                ],
+            }
+        ]
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_otp_endpoint_state():
+    registries = (
+        otp_client._DIALECT_BY_ENDPOINT,
+        otp_client._BREAKERS,
+        otp_client._METRICS,
+        otp_client._IN_FLIGHT,
+    )
+    for registry in registries:
+        registry.clear()
+    yield
+    for registry in registries:
+        registry.clear()
+
+
+def _otp_client(handler, **kwargs) -> OtpClient:
+    return OtpClient(
+        base_url="http://otp.test",
+        graphql_path="/otp/routers/default/index/graphql",
+        timeout_seconds=1.0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        **kwargs,
+    )
+
+
+def _plan(client: OtpClient) -> dict:
+    return asyncio.run(
+        client.plan_route(
+            from_lat=38.5,
+            from_lng=-120.2,
+            to_lat=40.7,
+            to_lng=-120.95,
+            departure_iso="2026-02-14T08:30-05:00",
+            transport_mode="walk",
+        )
+    )
+
+
+def test_otp_client_falls_back_to_v1_query() -> None:
+    queries: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        query = json.loads(request.content)["query"]
+        queries.append(query)
+        if "earliestDeparture" in query:
+            return httpx.Response(200, json={"errors": [{"message": "Unknown argument"}]})
+        return httpx.Response(200, json={"data": PLAN_DATA})
+
+    data = _plan(_otp_client(handler))
+
+    assert data == PLAN_DATA
+    assert len(queries) == 2
+
+
+def test_otp_client_remembers_working_dialect() -> None:
+    queries: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        query = json.loads(request.content)["query"]
+        queries.append(query)
+        if "earliestDeparture" in query:
+            return httpx.Response(200, json={"errors": [{"message": "Unknown argument"}]})
+        return httpx.Response(200, json={"data": PLAN_DATA})
+
+    client = _otp_client(handler)
+    _plan(client)
+    queries.clear()
+
+    assert _plan(client) == PLAN_DATA
+    assert len(queries) == 1
+    assert client.dialect == "v1"
+
+
+def test_otp_client_detects_dialect_from_schema() -> None:
+    schema = {
+        "__schema": {
+            "queryType": {
+                "fields": [
+                    {"name": "stops", "args": []},
+                    {"name": "plan", "args": [{"name": "date"}, {"name": "time"}, {"name": "from"}]},
+                ]
+            }
+        }
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"data": schema})
+
+    client = _otp_client(handler)
+
+    assert asyncio.run(client.detect_dialect()) == "v1"
+    assert client.dialect == "v1"
+
+
+def test_otp_client_plans_departure_offsets_in_one_request() -> None:
+    queries: list[str] = []
+    other_leg = {
+        "mode": "BUS",
+        "duration": 300,
+        "route": {"shortName": "1"},
+        "legGeometry": {"points": "_p~iF~ps|U_ulLnnqC"},
+    }
+    walk_itinerary = PLAN_DATA["plan"]["itineraries"][0]
+    bus_itinerary = {"duration": 300, "legs": [other_leg]}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        queries.append(json.loads(request.content)["query"])
+        return httpx.Response(
+            200,
+            json={
+                "data": {
+                    "plan": {"itineraries": [walk_itinerary, bus_itinerary]},
+                    "plan_1": {"itineraries": [walk_itinerary]},
+                }
+            },
+        )
+
+    client = _otp_client(handler)
+    client_data = asyncio.run(
+        client.plan_route(
+            from_lat=38.5,
+            from_lng=-120.2,
+            to_lat=40.7,
+            to_lng=-120.95,
+            departure_iso="2026-02-14T08:30-05:00",
+            transport_mode="transit",
+            departure_offsets_minutes=(0, 10),
+            num_itineraries=3,
+        )
+    )
+
+    assert len(queries) == 1
+    assert 'plan_1: plan(' in queries[0] and "08:40-05:00" in queries[0]
+    geometry = _normalize_route_response(client_data)
+    assert [segment["type"] for segment in geometry.route_segments] == ["walk"]
+    # The later departure repeats the walk itinerary, so only the bus one is an alternate.
+    assert [
+        [segment["transit_line"] for segment in alternate.route_segments] for alternate in geometry.alternates
+    ] == [["1"]]
+    assert geometry.alternates[0].departure_offset_minutes == 0
+
+    later_bus = _normalize_route_response(
+        {"plan": {"itineraries": [walk_itinerary]}, "plan_1": {"itineraries": [bus_itinerary]}},
+        (0, 10),
+    )
+    assert later_bus.departure_offset_minutes == 0
+    assert later_bus.alternates[0].departure_offset_minutes == 10
+
+
+def test_otp_client_wraps_http_errors() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503, text="graph not ready")
+
+    with pytest.raises(OtpClientError, match="status 503"):
+        _plan(_otp_client(handler))
+
+
+def test_otp_client_coalesces_identical_in_flight_requests() -> None:
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"data": PLAN_DATA})
+
+    client = _otp_client(handler)
+    otp_client._DIALECT_BY_ENDPOINT[client.endpoint] = "v1"
+
+    async def plan_twice():
+        kwargs = dict(
+            from_lat=38.5,
+            from_lng=-120.2,
+            to_lat=40.7,
+            to_lng=-120.95,
+            departure_iso="2026-02-14T08:30-05:00",
+            transport_mode="walk",
+        )
+        return await asyncio.gather(client.plan_route(**kwargs), client.plan_route(**kwargs))
+
+    first, second = asyncio.run(plan_twice())
+
+    assert first == second == PLAN_DATA
+    assert calls == 1
+    assert client.metrics.coalesced == 1
+
+
+def test_otp_client_cancelled_leader_does_not_cancel_coalesced_callers() -> None:
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"data": PLAN_DATA})
+
+    client = _otp_client(handler)
+    otp_client._DIALECT_BY_ENDPOINT[client.endpoint] = "v1"
+    kwargs = dict(
+        from_lat=38.5,
+        from_lng=-120.2,
+        to_lat=40.7,
+        to_lng=-120.95,
+        departure_iso="2026-02-14T08:30-05:00",
+        transport_mode="walk",
+    )
+
+    async def cancel_leader():
+        leader = asyncio.create_task(client.plan_route(**kwargs))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(client.plan_route(**kwargs))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(cancel_leader()) == PLAN_DATA
+    assert calls == 1
+
+
+def test_otp_circuit_breaker_opens_and_half_opens() -> None:
+    calls = 0
+    healthy = False
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if healthy:
+            return httpx.Response(200, json={"data": PLAN_DATA})
+        return httpx.Response(503, text="graph not ready")
+
+    client = _otp_client(handler, breaker_failure_threshold=2, breaker_reset_seconds=60)
+    for _ in range(2):
+        with pytest.raises(OtpClientError, match="status 503"):
+            _plan(client)
+
+    with pytest.raises(OtpCircuitOpenError):
+        _plan(client)
+    assert calls == 2
+    assert client.breaker.state == "open"
+    assert client.metrics.short_circuited == 1
+
+    client.breaker.reset_seconds = 0
+    healthy = True
+    assert _plan(client) == PLAN_DATA
+    assert client.breaker.state == "closed"
+    assert otp_client.otp_stats()[client.endpoint]["failures"] == 2
+
+
+def _key(start_lat: float, start_lng: float, start_minute: int, mode: str = "transit"):
+    return route_cache_key(
+        start_lat=start_lat,
+        start_lng=start_lng,
+        end_lat=42.3555,
+        end_lng=-71.0605,
+        start_minute=start_minute,
+        transport_mode=mode,
+    )
+
+
+def test_route_cache_key_snaps_nearby_endpoints_and_slots() -> None:
+    base = _key(42.34281, -71.12171, 8 * 60 + 2)
+
+    assert _key(42.34289, -71.12179, 8 * 60 + 14) == base
+    assert _key(42.34281, -71.12171, 8 * 60 + 16) != base
+    assert _key(42.35281, -71.12171, 8 * 60 + 2) != base
+    assert _key(42.34281, -71.12171, 8 * 60 + 2, mode="walk") != base
+
+
+def test_route_cache_serves_stored_geometry_from_memory() -> None:
+    key = _key(42.3005, -71.1137, 7 * 60)
+    geometry = NormalizedRouteGeometry(
+        route_segments=[{"type": "walk", "coordinates": [(42.3, -71.1), (42.31, -71.1)]}],
+        route_coordinates=[(42.3, -71.1), (42.31, -71.1)],
+        total_duration_minutes=12,
+    )
+
+    asyncio.run(store_route(key, geometry))
+
+    assert asyncio.run(get_cached_route(key)) == geometry
+
+
+def test_polyline_decodes_reference_example() -> None:
+    encoded = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+    assert decode_polyline(encoded) == [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert decode_polyline(encoded.encode("ascii")) == decode_polyline(encoded)
+    assert encode_polyline(decode_polyline(encoded)) == encoded
+
+
+def test_polyline_round_trips_and_rejects_truncated_input() -> None:
+    coordinates = [(42.36011, -71.05891), (42.35512, -71.06003), (42.34999, -71.10412), (42.3501, -71.1041)]
+    encoded = encode_polyline(coordinates)
+
+    assert decode_polyline(encoded) == coordinates
+    assert decode_polyline("") == []
+    with pytest.raises(ValueError):
+        decode_polyline(encoded[:-1])
+
+
+def test_polyline_array_matches_list_decoder() -> None:
+    pytest.importorskip("numpy")
+    coordinates = [(42.36011, -71.05891), (42.35512, -71.06003), (-33.5, 151.25)]
+
+    assert decode_polyline_array(encode_polyline(coordinates)).tolist() == [list(point) for point in coordinates]
+
+
+def _grid_walk_graph() -> WalkGraph:
+    # A short way north then east, and a long detour via node 5 that should lose.
+    return build_walk_graph(
+        [
+            [(1, 42.3500, -71.0600), (2, 42.3510, -71.0600), (3, 42.3520, -71.0600)],
+            [(3, 42.3520, -71.0600), (4, 42.3520, -71.0580)],
+            [(1, 42.3500, -71.0600), (5, 42.3450, -71.0550), (4, 42.3520, -71.0580)],
+        ]
+    )
+
+
+def test_walk_graph_compacts_ways_to_junctions() -> None:
+    graph = _grid_walk_graph()
+
+    assert graph.node_count == 3
+    assert graph.edge_count == 3
+    assert not is_walkable({"highway": "motorway"})
+    assert not is_walkable({"highway": "footway", "foot": "no"})
+    assert is_walkable({"highway": "service", "access": "private", "foot": "yes"})
+
+
+def test_walk_graph_round_trips_through_disk(tmp_path) -> None:
+    graph = _grid_walk_graph()
+    path = tmp_path / "walk_graph.bin"
+    graph.save(path)
+
+    loaded = WalkGraph.load(path)
+
+    assert loaded.node_count == graph.node_count
+    assert list(loaded.adj_edges) == list(graph.adj_edges)
+    assert list(loaded.shape_lat) == list(graph.shape_lat)
+
+
+def test_nearest_node_keeps_scanning_past_the_first_hit() -> None:
+    # The query sits near its cell's east edge: node 1 is one ring north but ~320m away,
+    # node 2 is two rings east and only ~180m away.
+    graph = build_walk_graph([[(1, 42.3539, -71.0601), (2, 42.3510, -71.0579)]])
+
+    assert graph.nearest_node(42.3510, -71.0601, max_meters=500) == 1
+    assert graph.nearest_node(42.3510, -71.0601, max_meters=150) is None
+
+
+def test_local_walk_route_takes_shortest_path() -> None:
+    geometry = _plan_on_graph(_grid_walk_graph(), (42.34995, -71.06005), (42.3521, -71.0579))
+
+    assert geometry is not None
+    assert geometry.route_coordinates == [
+        (42.34995, -71.06005),
+        (42.35, -71.06),
+        (42.351, -71.06),
+        (42.352, -71.06),
+        (42.352, -71.058),
+        (42.3521, -71.0579),
+    ]
+    assert geometry.route_segments[0]["type"] == "walk"
+    assert geometry.total_duration_minutes == geometry.route_segments[0]["duration_minutes"] == 5
+
+
+def _write_gtfs(path) -> None:
+    files = {
+        "stops.txt": "stop_id,stop_name,stop_lat,stop_lon\n"
+        "a,A,42.3500,-71.0600\nb,B,42.3550,-71.0600\nc,C,42.3600,-71.0600\nd,D,42.3650,-71.0600\n",
+        "routes.txt": "route_id,route_short_name,route_long_name,route_type\nR,,Red Line,1\n",
+        "trips.txt": "route_id,service_id,trip_id,direction_id,shape_id\n"
+        "R,wk,t1,0,s0\nR,wk,t2,0,s0\nR,wk,t3,1,s1\n",
+        "stop_times.txt": "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "t1,08:00:00,08:00:00,a,1\nt1,08:02:00,08:02:00,b,2\nt1,08:04:00,08:04:00,c,3\nt1,08:06:00,08:06:00,d,4\n"
+        "t2,09:00:00,09:00:00,a,1\nt2,09:06:00,09:06:00,d,2\n"
+        "t3,08:00:00,08:00:00,d,1\nt3,08:06:00,08:06:00,a,2\n",
+    }
+    with zipfile.ZipFile(path, "w") as feed:
+        for name, content in files.items():
+            feed.writestr(name, content)
+
+
+def test_transit_index_keeps_one_trip_per_direction_and_shape(tmp_path) -> None:
+    feed_path = tmp_path / "feed.zip"
+    _write_gtfs(feed_path)
+    index = build_transit_index(feed_path, feed_version="v1")
+
+    assert sorted(pattern.stop_ids for pattern in index.patterns) == [("a", "b", "c", "d"), ("d", "a")]
+    assert index.route_ids_for(None, "red line") == {"R"}
+
+    interval = index.resolve_leg(
+        [(42.3551, -71.0601), (42.3601, -71.0599)],
+        line_names=("Red Line",),
+        snap_meters=100,
+    )
+    assert interval is not None
+    assert interval.pattern.stop_ids[interval.board_position] == "b"
+    assert interval.pattern.stop_ids[interval.alight_position] == "c"
+    # Too far from any stop on the line.
+    assert index.resolve_leg([(42.40, -71.0), (42.41, -71.0)], line_names=("Red Line",), snap_meters=100) is None
+
+
+def test_transit_index_reuses_cache_for_same_feed_version(tmp_path) -> None:
+    feed_path = tmp_path / "feed.zip"
+    _write_gtfs(feed_path)
+    built = load_transit_index(feed_path, feed_version="v1", cache_dir=tmp_path / "cache")
+    feed_path.unlink()
+
+    cached = load_transit_index(feed_path, feed_version="v1", cache_dir=tmp_path / "cache")
+    assert [pattern.stop_ids for pattern in cached.patterns] == [pattern.stop_ids for pattern in built.patterns]
+    assert cached.patterns[0].stop_offsets_meters == pytest.approx(built.patterns[0].stop_offsets_meters)
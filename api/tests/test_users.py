@@ -2,7 +2,9 @@
 Tests for /api/users/me routes. Auth is overridden; service layer is mocked (no MongoDB).
 Run: cd api && venv/bin/pip install pytest && venv/bin/pytest tests/test_users.py -v
 """
+import asyncio
 from datetime import datetime, timezone
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
 
 import pytest
@@ -10,7 +12,9 @@ from fastapi.testclient import TestClient
 
 from src.auth.dependencies import get_token_claims
 from src.auth.schemas import TokenClaims
+from src.db.models.user import User
 from src.main import app
+from src.users import auth0_management
 
 
 @pytest.fixture
@@ -52,18 +56,18 @@ def _fake_user(**kwargs):
 # ----- GET /api/users/me -----
 
 
-@patch("src.users.router.get_by_auth0_id", new_callable=AsyncMock)
+@patch("src.users.loader.fetch_user_profiles", new_callable=AsyncMock)
 def test_get_me_not_found(mock_get, client):
-    mock_get.return_value = None
+    mock_get.return_value = {}
     response = client.get("/api/users/me")
     assert response.status_code == 404
     assert response.json()["detail"] == "User not found"
-    mock_get.assert_called_once_with("test-auth0-id")
+    mock_get.assert_called_once_with(["test-auth0-id"])
 
 
-@patch("src.users.router.get_by_auth0_id", new_callable=AsyncMock)
+@patch("src.users.loader.fetch_user_profiles", new_callable=AsyncMock)
 def test_get_me_success(mock_get, client):
-    mock_get.return_value = _fake_user(name="Nick", occupation="SecEng")
+    mock_get.return_value = {"test-auth0-id": _fake_user(name="Nick", occupation="SecEng")}
     response = client.get("/api/users/me")
     assert response.status_code == 200
     data = response.json()
@@ -146,3 +150,179 @@ def test_patch_me_success(mock_update, client):
     data = response.json()
     assert data["name"] == "Updated Name"
     assert data["occupation"] == "New Job"
+
+
+# ----- Auth0 management -----
+
+
+def test_management_token_is_reused_until_near_expiry(monkeypatch):
+    fetches = []
+
+    def request_token():
+        fetches.append(1)
+        return {"access_token": f"token-{len(fetches)}", "expires_in": 3600}
+
+    now = [0.0]
+    monkeypatch.setattr(auth0_management, "_request_management_token", request_token)
+    cache = auth0_management.ManagementTokenCache(refresh_margin_seconds=60, clock=lambda: now[0])
+
+    async def scenario():
+        tokens = [await cache.get(), await cache.get()]
+        now[0] = 3600 - 60 - 1
+        tokens.append(await cache.get())
+        assert len(fetches) == 1
+        # Inside the refresh margin the token is exchanged again.
+        now[0] = 3600 - 60 + 1
+        tokens.append(await cache.get())
+        return tokens
+
+    assert asyncio.run(scenario()) == ["token-1", "token-1", "token-1", "token-2"]
+    assert len(fetches) == 2
+
+
+def test_delete_auth0_identity_treats_missing_user_as_deleted(monkeypatch):
+    class MissingUser(Exception):
+        status_code = 404
+
+    def delete(auth0_id):
+        raise MissingUser()
+
+    monkeypatch.setattr(auth0_management._token_cache, "get", AsyncMock(return_value="token"))
+    monkeypatch.setattr(
+        auth0_management,
+        "_management_client",
+        lambda token: SimpleNamespace(users=SimpleNamespace(delete=delete)),
+    )
+    asyncio.run(auth0_management.delete_auth0_identity("auth0|gone"))
+
+
+# ----- Bulk deletion -----
+
+
+class _FakeCollection:
+    """Just enough of a pymongo collection for the deletion cascade."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+
+    @staticmethod
+    def _matches(document, query):
+        for field, condition in query.items():
+            value = document.get(field)
+            values = value if isinstance(value, list) else [value]
+            if not set(values) & set(condition["$in"]):
+                return False
+        return True
+
+    async def delete_many(self, query, session=None):
+        self.calls.append("delete_many")
+        self.documents[:] = [document for document in self.documents if not self._matches(document, query)]
+
+    async def update_many(self, query, update, session=None):
+        self.calls.append("update_many")
+        pulled = set(update["$pull"]["participants"]["$in"])
+        for document in self.documents:
+            if self._matches(document, query):
+                document["participants"] = [p for p in document["participants"] if p not in pulled]
+
+    def find(self, query, projection=None, session=None):
+        self.calls.append("find")
+        matches = [document for document in self.documents if self._matches(document, query)]
+
+        async def iterate():
+            for document in matches:
+                yield document
+
+        return iterate()
+
+
+def test_delete_users_data_cascades_in_bulk():
+    from src.users import service
+
+    collections = {
+        "User": _FakeCollection([{"auth0_id": "a"}, {"auth0_id": "b"}, {"auth0_id": "c"}]),
+        "Commute": _FakeCollection([{"user_auth0_id": "a"}, {"user_auth0_id": "c"}]),
+        "MatchSuggestion": _FakeCollection([{"participants": ["a", "c"]}, {"participants": ["c", "d"]}]),
+        "ChatRoom": _FakeCollection(
+            [{"_id": 1, "participants": ["a", "b"]}, {"_id": 2, "participants": ["a", "c"]}]
+        ),
+        "ChatMessage": _FakeCollection([{"chat_room_id": "1"}, {"chat_room_id": "2"}]),
+    }
+    patches = [
+        patch.object(getattr(service, name), "get_pymongo_collection", return_value=collection)
+        for name, collection in collections.items()
+    ]
+    for active in patches:
+        active.start()
+    try:
+        asyncio.run(service._delete_users_data(["a", "b"]))
+    finally:
+        for active in patches:
+            active.stop()
+
+    assert collections["User"].documents == [{"auth0_id": "c"}]
+    assert collections["Commute"].documents == [{"user_auth0_id": "c"}]
+    assert collections["MatchSuggestion"].documents == [{"participants": ["c", "d"]}]
+    # Room 1 only had deleted users, so it and its messages are gone; room 2 keeps "c".
+    assert collections["ChatRoom"].documents == [{"_id": 2, "participants": ["c"]}]
+    assert collections["ChatMessage"].documents == [{"chat_room_id": "2"}]
+    assert collections["ChatRoom"].calls == ["find", "delete_many", "update_many"]
+
+
+def test_profile_loader_batches_concurrent_loads_and_dedupes():
+    from src.users import loader
+
+    calls = []
+
+    async def fake_fetch(auth0_ids):
+        calls.append(list(auth0_ids))
+        return {auth0_id: _fake_user(auth0_id=auth0_id) for auth0_id in auth0_ids if auth0_id != "missing"}
+
+    async def run():
+        users = loader.UserProfileLoader()
+        first = await asyncio.gather(users.load("a"), users.load("b"), users.load("a"), users.load("missing"))
+        again = await users.load_many(["a", "b", "c"])
+        return first, again
+
+    with patch.object(loader, "fetch_user_profiles", side_effect=fake_fetch):
+        first, again = asyncio.run(run())
+
+    assert [user.auth0_id if user else None for user in first] == ["a", "b", "a", None]
+    assert sorted(again) == ["a", "b", "c"]
+    # One query for the first tick, then only the id not seen yet.
+    assert calls == [["a", "b", "missing"], ["c"]]
+
+
+def test_profile_cache_is_invalidated_on_update():
+    from src.users import loader, service
+
+    queries = []
+
+    class FakeQuery:
+        def __init__(self, user):
+            self.user = user
+
+        async def to_list(self):
+            queries.append(self.user.auth0_id)
+            return [self.user]
+
+    stored = User.model_construct(
+        auth0_id="cache-user", name="Before", occupation="Tester", gender="non-binary", interests=["Coffee"]
+    )
+    loader.invalidate_user_profiles("cache-user")
+    with patch.object(loader, "User") as user_model, patch.object(loader, "In"), patch.object(
+        service, "get_by_auth0_id", new=AsyncMock(return_value=stored)
+    ), patch.object(User, "save", new=AsyncMock()):
+        user_model.find.side_effect = lambda *_: FakeQuery(stored)
+        first = asyncio.run(loader.fetch_user_profiles(["cache-user"]))["cache-user"]
+        first.interests.append("Mutated")
+        second = asyncio.run(loader.fetch_user_profiles(["cache-user"]))["cache-user"]
+        assert queries == ["cache-user"]
+        # Each caller gets its own copy; the cached profile is untouched.
+        assert second is not first
+        assert second.interests == ["Coffee"]
+
+        asyncio.run(service.update_me("cache-user", service.UserUpdate(name="After")))
+        asyncio.run(loader.fetch_user_profiles(["cache-user"]))
+        assert queries == ["cache-user", "cache-user"]
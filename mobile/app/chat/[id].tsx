@@ -78,6 +78,7 @@ export default function ChatDetailScreen() {
         role: (m.is_system ? 'model' : 'user') as 'model' | 'user',
         name: m.is_system ? 'Flock' : m.sender_name,
         content: m.body,
+        created_at: m.created_at,
       }));
     } catch {
       messages = roomToApiMessages(room);
@@ -69,6 +69,8 @@ export interface ApiCommuteResponse {
   route_segments: ApiRouteSegment[];
   route_coordinates: [number, number][];
   otp_total_duration_minutes?: number | null;
+  route_status?: 'pending' | 'ready' | 'failed';
+  route_error?: string | null;
   created_at: string;
   updated_at: string;
 }
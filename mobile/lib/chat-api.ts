@@ -33,6 +33,8 @@ export interface MessageForApi {
   role: "user" | "model";
   name: string;
   content: string;
+  /** ISO timestamp; lets /api/chat/continuation answer locally instead of asking Gemini. */
+  created_at?: string;
 }
 
 /**